@@ -0,0 +1,96 @@
+'''
+Measures the per-request overhead the HTTP client adds on top of its session,
+at several logging levels. Requests are answered by an in-memory session, so
+the numbers reflect the cost of the client itself rather than the network.
+'''
+
+
+import argparse
+import json
+import logging
+import os
+import time
+import timeit
+
+import httpx
+
+import tda
+from tda.auth import TokenMetadata
+from tda.client import Client
+
+
+parser = argparse.ArgumentParser(
+        'Benchmarks the per-request overhead of Client at each log level.')
+
+parser.add_argument('--requests', type=int, default=20000,
+                    help='Requests to make per measurement')
+parser.add_argument('--candles', type=int, default=1000,
+                    help='Number of candles in each price history response')
+parser.add_argument('--repeat', type=int, default=5,
+                    help='Measurements per level, of which the best is kept')
+args = parser.parse_args()
+
+
+def price_history_body(candles):
+    return json.dumps({
+        'candles': [{
+            'open': 100.0 + i,
+            'high': 101.0 + i,
+            'low': 99.0 + i,
+            'close': 100.5 + i,
+            'volume': 1000 * i,
+            'datetime': 1600000000000 + 60000 * i,
+        } for i in range(candles)],
+        'symbol': 'AAPL',
+        'empty': False,
+    }).encode('utf-8')
+
+
+class InMemorySession:
+    '''
+    Returns a new response for each request, so that lazily decoded properties
+    such as ``text`` are not cached between requests.
+    '''
+
+    def __init__(self, body):
+        self.body = body
+        self.timeout = None
+
+    def get(self, url, params=None):
+        return httpx.Response(200, content=self.body)
+
+
+def per_request_micros(func):
+    seconds = min(timeit.repeat(func, number=args.requests, repeat=args.repeat))
+    return seconds / args.requests * 1e6
+
+
+def main():
+    session = InMemorySession(price_history_body(args.candles))
+    client = Client('API_KEY@AMER.OAUTHAP', session,
+                    token_metadata=TokenMetadata(int(time.time())))
+
+    baseline = per_request_micros(
+        lambda: session.get('https://api.tdameritrade.com/v1/marketdata/quotes',
+                            params={'symbol': 'AAPL'}))
+
+    loggers = (tda.auth.get_logger(), tda.client.base.get_logger())
+    handler = logging.StreamHandler(open(os.devnull, 'w'))
+    for logger in loggers:
+        logger.addHandler(handler)
+        logger.propagate = False
+
+    print('Response size:     {} bytes'.format(len(session.body)))
+    print('Session only:      {:.2f} us/request'.format(baseline))
+
+    for level in (logging.WARNING, logging.INFO, logging.DEBUG):
+        for logger in loggers:
+            logger.setLevel(level)
+
+        micros = per_request_micros(lambda: client.get_quote('AAPL'))
+        print('{:<8} overhead: {:.2f} us/request'.format(
+            logging.getLevelName(level), micros - baseline))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,93 @@
+'''
+Measures end-to-end stream client throughput and handler latency against a
+local fake streaming server. The server runs in a separate process on the same
+machine, so the numbers reflect the cost of the client itself rather than the
+network.
+'''
+
+
+import argparse
+import asyncio
+import time
+
+from tda.contrib.fake_streamer import FakeStreamerProcess
+
+
+parser = argparse.ArgumentParser(
+        'Benchmarks StreamClient against a local fake streaming server.')
+
+parser.add_argument('--rate', type=int, default=5000,
+                    help='Data frames sent by the server per second')
+parser.add_argument('--symbols', type=int, default=100,
+                    help='Number of symbols to subscribe to')
+parser.add_argument('--symbols-per-message', type=int, default=10,
+                    help='Maximum number of symbols in each frame')
+parser.add_argument('--duration', type=float, default=10.0,
+                    help='Seconds to measure for')
+parser.add_argument('--no-compression', action='store_true',
+                    help='Disable permessage-deflate compression')
+parser.add_argument('--background', action='store_true',
+                    help='Use background dispatch instead of handle_message()')
+args = parser.parse_args()
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return float('nan')
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+async def main():
+    streamer = FakeStreamerProcess(
+            messages_per_second=args.rate,
+            symbols_per_message=args.symbols_per_message,
+            compression=not args.no_compression)
+    streamer.start()
+    try:
+        stream_client = streamer.stream_client()
+
+        start = time.perf_counter()
+        await stream_client.login()
+        login_seconds = time.perf_counter() - start
+
+        latencies_ms = []
+        entries = [0]
+
+        def handler(msg):
+            latencies_ms.append(time.time() * 1000 - msg['timestamp'])
+            entries[0] += len(msg['content'])
+        stream_client.add_level_one_equity_handler(handler)
+
+        symbols = ['SYM{:05d}'.format(i) for i in range(args.symbols)]
+        start = time.perf_counter()
+        await stream_client.level_one_equity_subs(symbols)
+        subs_seconds = time.perf_counter() - start
+
+        start = time.perf_counter()
+        if args.background:
+            await stream_client.start_background_dispatch()
+            await asyncio.sleep(args.duration)
+            await stream_client.stop_background_dispatch()
+        else:
+            while time.perf_counter() - start < args.duration:
+                await stream_client.handle_message()
+        elapsed = time.perf_counter() - start
+    finally:
+        server_stats = streamer.stop()
+
+    latencies_ms.sort()
+    print('Login:             {:.1f} ms'.format(login_seconds * 1000))
+    print('Subscribe:         {:.1f} ms'.format(subs_seconds * 1000))
+    print('Frames sent:       {}'.format(server_stats['frames_sent']))
+    print('Messages handled:  {}'.format(len(latencies_ms)))
+    print('Messages/sec:      {:.0f}'.format(len(latencies_ms) / elapsed))
+    print('Symbol updates/sec: {:.0f}'.format(entries[0] / elapsed))
+    print('Latency p50:       {:.2f} ms'.format(
+        percentile(latencies_ms, 0.50)))
+    print('Latency p99:       {:.2f} ms'.format(
+        percentile(latencies_ms, 0.99)))
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
@@ -27,6 +27,7 @@ parser.add_argument('--api_key', type=str, required=True)
 args = parser.parse_args()
 
 client = tda.auth.client_from_token_file(args.token, args.api_key)
+client.set_rate_limiter(tda.ratelimit.RateLimiter())
 
 
 def report_candles(candles, call):
@@ -44,6 +44,8 @@ setuptools.setup(
             'coverage',
             'tox',
             'nose',
+            'numpy',
+            'orjson',
             'pytest',
             'pytz',
             'sphinx_rtd_theme',
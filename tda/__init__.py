@@ -3,6 +3,7 @@ from . import client
 from . import contrib
 from . import debug
 from . import orders
+from . import ratelimit
 from . import streaming
 
 from .version import version as __version__
@@ -157,6 +157,11 @@ class TokenMetadata:
     #      register for redactions. If we add anything sensitive to the token
     #      metadata, we'll need to update the redaction registration logic.
 
+    # 85 days is less than the documented 90 day expiration window of the
+    # token, but hopefully long enough to not trigger TDA's thresholds for
+    # excessive refresh token updates.
+    _DEFAULT_UPDATE_INTERVAL_SECONDS = 60 * 60 * 24 * 85
+
     def __init__(self, creation_timestamp, unwrapped_token_write_func=None):
         self.creation_timestamp = creation_timestamp
 
@@ -166,6 +171,20 @@ class TokenMetadata:
         # appropriate write function.
         self.unwrapped_token_write_func = unwrapped_token_write_func
 
+    @property
+    def creation_timestamp(self):
+        return self._creation_timestamp
+
+    @creation_timestamp.setter
+    def creation_timestamp(self, creation_timestamp):
+        self._creation_timestamp = creation_timestamp
+
+        # Kept as a plain attribute so clients can check it before every
+        # request without a method call
+        self.refresh_token_update_due_at = (
+            0 if creation_timestamp is None
+            else creation_timestamp + self._DEFAULT_UPDATE_INTERVAL_SECONDS)
+
     @classmethod
     def from_loaded_token(cls, token, unwrapped_token_write_func=None):
         '''
@@ -211,23 +230,25 @@ class TokenMetadata:
             'token': token,
         }
 
-    def ensure_refresh_token_update(
-            self, api_key, session, update_interval_seconds=None):
-        '''
-        If the refresh token is older than update_interval_seconds, update it by
-        issuing a call to the token refresh endpoint and return a new session
-        wrapped around the resulting token. Returns None if the refresh token
-        was not updated.
-        '''
+    def _refresh_token_update_due(self, now, update_interval_seconds):
         logger = get_logger()
 
         if update_interval_seconds is None:
-            # 85 days is less than the documented 90 day expiration window of
-            # the token, but hopefully long enough to not trigger TDA's
-            # thresholds for excessive refresh token updates.
-            update_interval_seconds = 60 * 60 * 24 * 85
+            update_interval_seconds = self._DEFAULT_UPDATE_INTERVAL_SECONDS
 
-        now = int(time.time())
+        # This is called before every request, so only log when an update is
+        # actually due, or when debug logging is enabled
+        if not (self.creation_timestamp is None
+                or now - self.creation_timestamp >
+                update_interval_seconds):
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(
+                    'Skipping refresh token update:\n'+
+                    ' - Current timestamp is %s\n'+
+                    ' - Token creation timestamp is %s\n'+
+                    ' - Update interval is %s seconds',
+                        now, self.creation_timestamp, update_interval_seconds)
+            return False
 
         logger.info(
             'Updating refresh token:\n'+
@@ -235,11 +256,45 @@ class TokenMetadata:
             ' - Token creation timestamp is %s\n'+
             ' - Update interval is %s seconds',
                 now, self.creation_timestamp, update_interval_seconds)
+        return True
 
-        if not (self.creation_timestamp is None
-                or now - self.creation_timestamp >
-                update_interval_seconds):
-            logger.info('Skipping refresh token update')
+    def _session_from_updated_token(
+            self, api_key, session, new_token, now, asyncio):
+        get_logger().info('Updated refresh token')
+
+        self.creation_timestamp = now
+
+        # Don't emit token details in debug logs
+        _register_token_redactions(new_token)
+
+        token_write_func = self.wrapped_token_write_func()
+        token_write_func(new_token)
+
+        # As when creating the client, asynchronous sessions require an async
+        # token update function
+        if asyncio:
+            async def oauth_client_update_token(t, *args, **kwargs):
+                token_write_func(t, *args, **kwargs)
+        else:
+            oauth_client_update_token = token_write_func
+
+        session_class = session.__class__
+        return session_class(
+            api_key,
+            token=new_token,
+            token_endpoint=TOKEN_ENDPOINT,
+            update_token=oauth_client_update_token)
+
+    def ensure_refresh_token_update(
+            self, api_key, session, update_interval_seconds=None):
+        '''
+        If the refresh token is older than update_interval_seconds, update it by
+        issuing a call to the token refresh endpoint and return a new session
+        wrapped around the resulting token. Returns None if the refresh token
+        was not updated.
+        '''
+        now = int(time.time())
+        if not self._refresh_token_update_due(now, update_interval_seconds):
             return None
 
         old_token = session.token
@@ -251,22 +306,34 @@ class TokenMetadata:
             refresh_token=old_token['refresh_token'],
             access_type='offline')
 
-        logger.info('Updated refresh token')
+        return self._session_from_updated_token(
+            api_key, session, new_token, now, asyncio=False)
 
-        self.creation_timestamp = now
+    async def ensure_refresh_token_update_async(
+            self, api_key, session, update_interval_seconds=None):
+        '''
+        Asynchronous version of :meth:`ensure_refresh_token_update`, which
+        fetches the new token using an ``AsyncOAuth2Client`` rather than
+        blocking the event loop.
+        '''
+        now = int(time.time())
+        if not self._refresh_token_update_due(now, update_interval_seconds):
+            return None
 
-        # Don't emit token details in debug logs
-        _register_token_redactions(new_token)
+        old_token = session.token
+        oauth = AsyncOAuth2Client(api_key)
 
-        token_write_func = self.wrapped_token_write_func()
-        token_write_func(new_token)
+        try:
+            new_token = await oauth.fetch_token(
+                TOKEN_ENDPOINT,
+                grant_type='refresh_token',
+                refresh_token=old_token['refresh_token'],
+                access_type='offline')
+        finally:
+            await oauth.aclose()
 
-        session_class = session.__class__
-        return session_class(
-            api_key,
-            token=new_token,
-            token_endpoint=TOKEN_ENDPOINT,
-            update_token=token_write_func)
+        return self._session_from_updated_token(
+            api_key, session, new_token, now, asyncio=True)
 
 
 # TODO: Raise an exception when passing both token_path and token_write_func
@@ -539,7 +606,7 @@ def client_from_access_functions(api_key, token_read_func,
 
     if asyncio:
         async def oauth_client_update_token(t, *args, **kwargs):
-            wrapped_token_write_func(t, *args, **kwargs)  # pragma: no cover
+            wrapped_token_write_func(t, *args, **kwargs)
         session_class = AsyncOAuth2Client
         client_class = AsyncClient
     else:
@@ -1,80 +1,67 @@
 from .base import BaseClient
-from ..debug import register_redactions_from_response
-from ..utils import LazyLog
+from .middleware import run_pipeline_async
 
-import json
+import asyncio
+import time
 
 
 class AsyncClient(BaseClient):
 
+    # In-flight refresh token update, if any
+    _refresh_token_update = None
+
     async def close_async_session(self):
         await self.session.aclose()
 
-    async def _get_request(self, path, params):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: GET to %s, params=%s',
-                req_num, dest, LazyLog(lambda: json.dumps(params, indent=4)))
-
-        resp = await self.session.get(dest, params=params)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
-
-    async def _post_request(self, path, data):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: POST to %s, json=%s',
-                req_num, dest, LazyLog(lambda: json.dumps(data, indent=4)))
-
-        resp = await self.session.post(dest, json=data)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
-
-    async def _put_request(self, path, data):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: PUT to %s, json=%s',
-                req_num, dest, LazyLog(lambda: json.dumps(data, indent=4)))
-
-        resp = await self.session.put(dest, json=data)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
-
-    async def _patch_request(self, path, data):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: PATCH to %s, json=%s',
-                req_num, dest, LazyLog(lambda: json.dumps(data, indent=4)))
-
-        resp = await self.session.patch(dest, json=data)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
-
-    async def _delete_request(self, path):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: DELETE to %s', req_num, dest)
-
-        resp = await self.session.delete(dest)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
+    async def ensure_updated_refresh_token_async(
+            self, update_interval_seconds=None):
+        '''
+        Asynchronous version of :meth:`ensure_updated_refresh_token`. The
+        token refresh call is made without blocking the event loop, and
+        concurrent calls wait for a single refresh rather than each making
+        their own. This is called automatically before requests once the
+        refresh token is due for an update.
+        '''
+        if not self.token_metadata:
+            return None
+
+        refresh = self._refresh_token_update
+        if refresh is None:
+            metadata = self.token_metadata
+
+            async def update():
+                try:
+                    new_session = \
+                        await metadata.ensure_refresh_token_update_async(
+                            self.api_key, self.session,
+                            update_interval_seconds)
+                    if new_session:
+                        self.session = new_session
+                    return new_session is not None
+                finally:
+                    self._refresh_token_update = None
+
+            refresh = self._refresh_token_update = asyncio.ensure_future(
+                update())
+
+        # Shielded so that a cancelled caller doesn't cancel the update for
+        # the others
+        return await asyncio.shield(refresh)
+
+    async def _request(self, request):
+        metadata = self.token_metadata
+        if metadata and time.time() > metadata.refresh_token_update_due_at:
+            await self.ensure_updated_refresh_token_async()
+
+        return await run_pipeline_async(
+            self.middleware, request, self._send_request, asyncio.sleep)
+
+    async def _send_request(self, request):
+        delay = self._rate_limit_delay(request.method, request.path)
+        if delay > 0:
+            await asyncio.sleep(delay)
+
+        req_num, kwargs = self._prepare_request(request)
+        send = getattr(self.session, request.method.lower())
+        resp = await send(request.url, **kwargs)
+        return self._finish_response(resp, req_num, request)
@@ -14,7 +14,9 @@ import time
 import warnings
 
 from tda.orders.generic import OrderBuilder
-from ..utils import EnumEnforcer
+from .middleware import Request
+from ..debug import register_redactions_from_response
+from ..utils import EnumEnforcer, LazyLog
 
 
 def get_logger():
@@ -49,6 +51,9 @@ class BaseClient(EnumEnforcer):
 
         self.token_metadata = token_metadata
 
+        self.rate_limiter = None
+        self.middleware = []
+
         # Set the default timeout configuration
         self.set_timeout(30.0)
 
@@ -58,9 +63,31 @@ class BaseClient(EnumEnforcer):
     _DATETIME = datetime.datetime
     _DATE = datetime.date
 
-    def _log_response(self, resp, req_num):
-        self.logger.debug('Req %s: GET response: %s, content=%s',
-            req_num, resp.status_code, resp.text)
+    def _log_request(self, request):
+        req_num = self._req_num()
+        # Called on every request, so don't build arguments which would be
+        # thrown away
+        if not self.logger.isEnabledFor(logging.DEBUG):
+            return req_num
+
+        if request.json is not None:
+            self.logger.debug('Req %s: %s to %s, json=%s',
+                req_num, request.method, request.url,
+                LazyLog(lambda: json.dumps(request.json, indent=4)))
+        elif request.params is not None:
+            self.logger.debug('Req %s: %s to %s, params=%s',
+                req_num, request.method, request.url,
+                LazyLog(lambda: json.dumps(request.params, indent=4)))
+        else:
+            self.logger.debug('Req %s: %s to %s',
+                req_num, request.method, request.url)
+        return req_num
+
+    def _log_response(self, resp, req_num, method):
+        # Decoding the body to text is expensive for large responses
+        if self.logger.isEnabledFor(logging.DEBUG):
+            self.logger.debug('Req %s: %s response: %s, content=%s',
+                req_num, method, resp.status_code, resp.text)
 
     def _req_num(self):
         self.request_number += 1
@@ -131,6 +158,66 @@ class BaseClient(EnumEnforcer):
                         examples.'''
         self.session.timeout = timeout
 
+    def set_rate_limiter(self, rate_limiter):
+        '''Sets a :class:`~tda.ratelimit.RateLimiter` which paces all HTTP
+        calls made by this client. Requests wait for their turn before being
+        sent rather than being rejected by the API. Pass ``None`` to disable
+        rate limiting, which is the default.'''
+        self.rate_limiter = rate_limiter
+
+    def _rate_limit_delay(self, method, path):
+        if self.rate_limiter is None:
+            return 0
+        return self.rate_limiter.reserve(method, path)
+
+    def add_middleware(self, middleware):
+        '''Adds a :class:`~tda.client.middleware.Middleware` to the end of this
+        client's request pipeline. Middleware added earlier sees each request
+        first and each response last. See :ref:`middleware`.'''
+        self.middleware.append(middleware)
+
+    def remove_middleware(self, middleware):
+        '''Removes middleware added by :meth:`add_middleware`.'''
+        self.middleware.remove(middleware)
+
+    # The synchronous and asynchronous clients share everything about sending
+    # a request except the I/O itself
+
+    def _prepare_request(self, request):
+        '''Logs the request and returns its number along with the keyword
+        arguments to pass to the session.'''
+        req_num = self._log_request(request)
+
+        kwargs = {}
+        if request.params is not None:
+            kwargs['params'] = request.params
+        if request.json is not None:
+            kwargs['json'] = request.json
+        return req_num, kwargs
+
+    def _finish_response(self, resp, req_num, request):
+        self._log_response(resp, req_num, request.method)
+        register_redactions_from_response(resp)
+        return resp
+
+    # Each verb builds a Request and passes it to _request(), which is
+    # implemented by the synchronous and asynchronous clients
+
+    def _get_request(self, path, params):
+        return self._request(Request('GET', path, params=params))
+
+    def _post_request(self, path, data):
+        return self._request(Request('POST', path, json=data))
+
+    def _put_request(self, path, data):
+        return self._request(Request('PUT', path, json=data))
+
+    def _patch_request(self, path, data):
+        return self._request(Request('PATCH', path, json=data))
+
+    def _delete_request(self, path):
+        return self._request(Request('DELETE', path))
+
     ##########################################################################
     # Orders
 
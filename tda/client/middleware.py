@@ -0,0 +1,168 @@
+'''
+Middleware for the HTTP clients. Every request made by a
+:class:`~tda.client.Client` or :class:`~tda.client.AsyncClient` passes through
+the client's middleware, in the order it was added, before being sent, and
+each response passes back through it in reverse order.
+
+Middleware is written once and works with both clients. Rather than calling
+the next stage of the pipeline directly, which would require separate
+synchronous and asynchronous versions, :meth:`Middleware.handle_request` is a
+generator which yields instructions and is resumed with their results:
+
+* Yielding a :class:`Request` sends it on to the rest of the pipeline, and
+  resumes the generator with the response. Exceptions raised while sending
+  are thrown into the generator.
+* Yielding a :class:`Delay` pauses the request, and resumes the generator with
+  ``None`` once the delay has passed. The calling thread sleeps for
+  :class:`~tda.client.Client`, while only the calling task sleeps for
+  :class:`~tda.client.AsyncClient`.
+
+The value returned by the generator becomes the response to the request. A
+generator may yield any number of requests, for instance to retry, or none at
+all, for instance to answer from a cache.
+'''
+
+
+API_ROOT = 'https://api.tdameritrade.com'
+
+
+class Request:
+    '''
+    A request to the API, as seen by middleware. Middleware may modify the
+    request before yielding it, or yield a different one.
+
+    :param method: HTTP method, such as ``'GET'``.
+    :param path: Path of the endpoint, such as ``'/v1/marketdata/quotes'``.
+    :param params: Query parameters, or ``None``.
+    :param json: JSON body, or ``None``.
+    '''
+
+    __slots__ = ('method', 'path', 'params', 'json')
+
+    def __init__(self, method, path, *, params=None, json=None):
+        self.method = method
+        self.path = path
+        self.params = params
+        self.json = json
+
+    @property
+    def url(self):
+        '''
+        Full URL of the request.
+        '''
+        return API_ROOT + self.path
+
+    def __repr__(self):
+        return 'Request({!r}, {!r}, params={!r}, json={!r})'.format(
+            self.method, self.path, self.params, self.json)
+
+
+class Delay:
+    '''
+    Instruction to pause a request for ``seconds`` seconds. See the module
+    documentation.
+    '''
+
+    __slots__ = ('seconds',)
+
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def __repr__(self):
+        return 'Delay({!r})'.format(self.seconds)
+
+
+class Middleware:
+    '''
+    Base class for middleware. Subclasses override :meth:`handle_request`.
+    '''
+
+    def handle_request(self, request):
+        '''
+        Generator which handles a single request and returns its response. The
+        default implementation passes the request through unchanged.
+        '''
+        response = yield request
+        return response
+
+
+def _start(middleware, request):
+    flow = middleware.handle_request(request)
+    if not hasattr(flow, 'send') or not hasattr(flow, 'throw'):
+        raise ValueError(
+            'handle_request() of {!r} must be a generator'.format(middleware))
+    return flow
+
+
+def _check_request(middleware, instruction):
+    if not isinstance(instruction, Request):
+        raise ValueError(
+            '{!r} yielded {!r}, expected a Request or Delay'.format(
+                middleware, instruction))
+
+
+def run_pipeline(middleware, request, send, sleep):
+    '''
+    Passes ``request`` through ``middleware`` and then to ``send``, returning
+    the response. Used by :class:`~tda.client.Client`.
+
+    :param send: Function which sends a :class:`Request` and returns the
+                 response.
+    :param sleep: Function which blocks for the given number of seconds.
+    '''
+    def dispatch(index, request):
+        if index == len(middleware):
+            return send(request)
+
+        flow = _start(middleware[index], request)
+        try:
+            instruction = next(flow)
+            while True:
+                if isinstance(instruction, Delay):
+                    sleep(instruction.seconds)
+                    instruction = flow.send(None)
+                    continue
+                _check_request(middleware[index], instruction)
+
+                try:
+                    response = dispatch(index + 1, instruction)
+                except Exception as e:
+                    instruction = flow.throw(e)
+                else:
+                    instruction = flow.send(response)
+        except StopIteration as e:
+            return e.value
+
+    return dispatch(0, request)
+
+
+async def run_pipeline_async(middleware, request, send, sleep):
+    '''
+    Asynchronous counterpart of :func:`run_pipeline`, used by
+    :class:`~tda.client.AsyncClient`. ``send`` and ``sleep`` are coroutine
+    functions.
+    '''
+    async def dispatch(index, request):
+        if index == len(middleware):
+            return await send(request)
+
+        flow = _start(middleware[index], request)
+        try:
+            instruction = next(flow)
+            while True:
+                if isinstance(instruction, Delay):
+                    await sleep(instruction.seconds)
+                    instruction = flow.send(None)
+                    continue
+                _check_request(middleware[index], instruction)
+
+                try:
+                    response = await dispatch(index + 1, instruction)
+                except Exception as e:
+                    instruction = flow.throw(e)
+                else:
+                    instruction = flow.send(response)
+        except StopIteration as e:
+            return e.value
+
+    return await dispatch(0, request)
@@ -1,76 +1,24 @@
 from .base import BaseClient
-from ..utils import LazyLog
-from ..debug import register_redactions_from_response
+from .middleware import run_pipeline
 
-import json
+import time
 
 
 class Client(BaseClient):
-    def _get_request(self, path, params):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: GET to %s, params=%s',
-                req_num, dest, LazyLog(lambda: json.dumps(params, indent=4)))
-
-        resp = self.session.get(dest, params=params)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
-
-    def _post_request(self, path, data):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: POST to %s, json=%s',
-            req_num, dest, LazyLog(lambda: json.dumps(data, indent=4)))
-
-        resp = self.session.post(dest, json=data)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
-
-    def _put_request(self, path, data):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: PUT to %s, json=%s',
-            req_num, dest, LazyLog(lambda: json.dumps(data, indent=4)))
-
-        resp = self.session.put(dest, json=data)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
-
-    def _patch_request(self, path, data):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: PATCH to %s, json=%s',
-                req_num, dest, LazyLog(lambda: json.dumps(data, indent=4)))
-
-        resp = self.session.patch(dest, json=data)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
-
-    def _delete_request(self, path):
-        self.ensure_updated_refresh_token()
-
-        dest = 'https://api.tdameritrade.com' + path
-
-        req_num = self._req_num()
-        self.logger.debug('Req %s: DELETE to %s'.format(req_num, dest))
-
-        resp = self.session.delete(dest)
-        self._log_response(resp, req_num)
-        register_redactions_from_response(resp)
-        return resp
+    def _request(self, request):
+        metadata = self.token_metadata
+        if metadata and time.time() > metadata.refresh_token_update_due_at:
+            self.ensure_updated_refresh_token()
+
+        return run_pipeline(
+            self.middleware, request, self._send_request, time.sleep)
+
+    def _send_request(self, request):
+        delay = self._rate_limit_delay(request.method, request.path)
+        if delay > 0:
+            time.sleep(delay)
+
+        req_num, kwargs = self._prepare_request(request)
+        send = getattr(self.session, request.method.lower())
+        resp = send(request.url, **kwargs)
+        return self._finish_response(resp, req_num, request)
@@ -1 +1 @@
-from . import orders, util
+from . import bars, book, orders, recording, snapshots, util
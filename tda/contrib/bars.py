@@ -0,0 +1,324 @@
+'''
+Aggregating time of sale prints into open, high, low, close, and volume bars.
+'''
+
+from array import array
+from collections import namedtuple
+from enum import Enum
+
+from tda.streaming import StreamClient
+
+
+_TIMESALE_SERVICES = {
+    'TIMESALE_EQUITY': 'add_timesale_equity_handler',
+    'TIMESALE_FUTURES': 'add_timesale_futures_handler',
+    'TIMESALE_OPTIONS': 'add_timesale_options_handler',
+}
+
+# Fields read by BarAggregator.handle_message
+_TIMESALE_FIELDS = [
+    StreamClient.TimesaleFields.SYMBOL,
+    StreamClient.TimesaleFields.TRADE_TIME,
+    StreamClient.TimesaleFields.LAST_PRICE,
+    StreamClient.TimesaleFields.LAST_SIZE,
+]
+
+
+#: A completed bar. Times are in milliseconds since epoch. For time bars,
+#: ``start_time`` and ``end_time`` are the boundaries of the bar's period, with
+#: ``end_time`` exclusive. For tick and volume bars, they are the trade times of
+#: the first and last prints in the bar.
+Bar = namedtuple('Bar', [
+    'symbol', 'start_time', 'end_time', 'open', 'high', 'low', 'close',
+    'volume', 'trade_count'])
+
+
+class BarType(Enum):
+    '''
+    How bars are delimited.
+    '''
+
+    #: Bars cover a fixed period of ``size`` seconds
+    TIME = 'TIME'
+
+    #: Bars contain ``size`` prints
+    TICK = 'TICK'
+
+    #: Bars contain at least ``size`` shares or contracts. The print which
+    #: reaches the size is included in the bar in full, so bars may exceed it.
+    VOLUME = 'VOLUME'
+
+
+class BarHistory:
+    '''
+    The most recently completed bars for a single symbol, stored in a ring of
+    preallocated arrays. Once the ring is full, each new bar overwrites the
+    oldest one. Index ``0`` is the oldest bar held and ``-1`` the most recent.
+    '''
+
+    def __init__(self, symbol, capacity):
+        self.symbol = symbol
+        self.capacity = capacity
+
+        self._start_times = array('q', [0]) * capacity
+        self._end_times = array('q', [0]) * capacity
+        self._opens = array('d', [0.0]) * capacity
+        self._highs = array('d', [0.0]) * capacity
+        self._lows = array('d', [0.0]) * capacity
+        self._closes = array('d', [0.0]) * capacity
+        self._volumes = array('d', [0.0]) * capacity
+        self._trade_counts = array('q', [0]) * capacity
+
+        self._next = 0
+        self._len = 0
+
+    def __len__(self):
+        return self._len
+
+    def _slot(self, index):
+        if index < 0:
+            index += self._len
+        if not 0 <= index < self._len:
+            raise IndexError('bar index out of range')
+        return (self._next - self._len + index) % self.capacity
+
+    def __getitem__(self, index):
+        slot = self._slot(index)
+        return Bar(self.symbol,
+                   self._start_times[slot], self._end_times[slot],
+                   self._opens[slot], self._highs[slot], self._lows[slot],
+                   self._closes[slot], self._volumes[slot],
+                   self._trade_counts[slot])
+
+    def __iter__(self):
+        for index in range(self._len):
+            yield self[index]
+
+    def closes(self):
+        '''
+        Returns the close prices of all held bars as an ``array``, oldest
+        first.
+        '''
+        return self._ordered(self._closes)
+
+    def volumes(self):
+        '''
+        Returns the volumes of all held bars as an ``array``, oldest first.
+        '''
+        return self._ordered(self._volumes)
+
+    def _ordered(self, values):
+        start = (self._next - self._len) % self.capacity
+        end = start + self._len
+        if end <= self.capacity:
+            return values[start:end]
+        return values[start:] + values[:end - self.capacity]
+
+    def _append(self, bar):
+        slot = self._next
+        self._start_times[slot] = bar.start_time
+        self._end_times[slot] = bar.end_time
+        self._opens[slot] = bar.open
+        self._highs[slot] = bar.high
+        self._lows[slot] = bar.low
+        self._closes[slot] = bar.close
+        self._volumes[slot] = bar.volume
+        self._trade_counts[slot] = bar.trade_count
+
+        self._next = (slot + 1) % self.capacity
+        if self._len < self.capacity:
+            self._len += 1
+
+
+class _OpenBar:
+    '''
+    The bar currently being built for a single symbol.
+    '''
+
+    __slots__ = ('start_time', 'end_time', 'open', 'high', 'low', 'close',
+                 'volume', 'trade_count', 'history')
+
+    def __init__(self, history):
+        self.history = history
+        self.trade_count = 0
+
+    def start(self, start_time, end_time, price, size):
+        self.start_time = start_time
+        self.end_time = end_time
+        self.open = self.high = self.low = self.close = price
+        self.volume = size
+        self.trade_count = 1
+
+    def add(self, price, size):
+        if price > self.high:
+            self.high = price
+        elif price < self.low:
+            self.low = price
+        self.close = price
+        self.volume += size
+        self.trade_count += 1
+
+    def to_bar(self):
+        return Bar(self.history.symbol, self.start_time, self.end_time,
+                   self.open, self.high, self.low, self.close, self.volume,
+                   self.trade_count)
+
+
+class BarAggregator:
+    '''
+    Builds bars for every symbol received on the time of sale streams. Each
+    print updates the symbol's open bar in constant time. When a bar closes, it
+    is appended to the symbol's :class:`BarHistory` and passed to every handler
+    added with :meth:`add_bar_handler`.
+
+    Time bars close when the first print of a later period arrives, or when
+    :meth:`close_elapsed_bars` is called after their period ends. Periods with
+    no prints produce no bars.
+
+    :param bar_type: A :class:`BarType`.
+    :param size: Seconds per bar for time bars, prints per bar for tick bars,
+                 and shares or contracts per bar for volume bars.
+    :param history: Number of completed bars to keep for each symbol.
+    '''
+
+    def __init__(self, bar_type, size, *, history=1024):
+        bar_type = BarType(bar_type)
+        if size <= 0:
+            raise ValueError('size must be positive')
+        if history <= 0:
+            raise ValueError('history must be positive')
+
+        self._bar_type = bar_type
+        self._size = size
+        self._period_ms = int(size * 1000)
+        if bar_type == BarType.TIME and self._period_ms <= 0:
+            raise ValueError('time bars must be at least one millisecond')
+
+        self._history_capacity = history
+        self._bars = {}
+        self._handlers = []
+
+    def register(self, stream_client, services=None):
+        '''
+        Registers handlers on the stream client which feed prints to this
+        aggregator. Note you still need to subscribe to the streams themselves.
+
+        :param services: Time of sale services to aggregate, such as
+                         ``'TIMESALE_EQUITY'``. Defaults to all of them.
+        '''
+        if services is None:
+            services = list(_TIMESALE_SERVICES)
+
+        for service in services:
+            try:
+                method = _TIMESALE_SERVICES[service]
+            except KeyError:
+                raise ValueError(
+                    'unsupported service {}, must be one of {}'.format(
+                        service, ', '.join(_TIMESALE_SERVICES)))
+            getattr(stream_client, method)(
+                self.handle_message, fields=_TIMESALE_FIELDS)
+
+    def add_bar_handler(self, handler):
+        '''
+        Adds a function which is called with each :class:`Bar` as it closes.
+        Handlers are called synchronously from the stream handler, so they
+        should return quickly.
+        '''
+        self._handlers.append(handler)
+
+    def handle_message(self, msg):
+        '''
+        Applies a labeled time of sale message. Called by the handlers
+        installed by :meth:`register`, but can also be called directly from
+        your own handlers. Entries lacking the trade time, price, or size,
+        for instance because the subscription excluded those fields, are
+        skipped.
+        '''
+        service = msg['service']
+        add_print = self.add_print
+        for content in msg.get('content', ()):
+            try:
+                symbol = content['key']
+                trade_time = content['TRADE_TIME']
+                price = content['LAST_PRICE']
+                size = content['LAST_SIZE']
+            except KeyError:
+                continue
+            add_print(symbol, trade_time, price, size, service=service)
+
+    def add_print(self, symbol, trade_time, price, size, *,
+                  service='TIMESALE_EQUITY'):
+        '''
+        Applies a single print.
+
+        :param trade_time: Trade time in milliseconds since epoch.
+        '''
+        bar = self._bars.get((service, symbol))
+        if bar is None:
+            bar = self._bars[(service, symbol)] = _OpenBar(
+                BarHistory(symbol, self._history_capacity))
+
+        bar_type = self._bar_type
+        if bar_type == BarType.TIME:
+            if bar.trade_count and trade_time >= bar.end_time:
+                self._close(bar)
+            if not bar.trade_count:
+                start_time = trade_time - trade_time % self._period_ms
+                bar.start(start_time, start_time + self._period_ms,
+                          price, size)
+            else:
+                bar.add(price, size)
+            return
+
+        if bar.trade_count:
+            bar.add(price, size)
+            bar.end_time = trade_time
+        else:
+            bar.start(trade_time, trade_time, price, size)
+
+        if bar_type == BarType.TICK:
+            if bar.trade_count >= self._size:
+                self._close(bar)
+        elif bar.volume >= self._size:
+            self._close(bar)
+
+    def close_elapsed_bars(self, now_ms):
+        '''
+        Closes every open time bar whose period ended at or before ``now_ms``,
+        in milliseconds since epoch. Call this periodically to receive time
+        bars for quiet symbols without waiting for their next print. Does
+        nothing for tick and volume bars.
+        '''
+        if self._bar_type != BarType.TIME:
+            return
+        for bar in self._bars.values():
+            if bar.trade_count and bar.end_time <= now_ms:
+                self._close(bar)
+
+    def _close(self, bar):
+        completed = bar.to_bar()
+        bar.trade_count = 0
+        bar.history._append(completed)
+        for handler in self._handlers:
+            handler(completed)
+
+    def current(self, symbol, service='TIMESALE_EQUITY'):
+        '''
+        Returns the symbol's open bar as a :class:`Bar`, or ``None`` if no
+        prints have arrived since its last bar closed.
+        '''
+        bar = self._bars.get((service, symbol))
+        if bar is None or not bar.trade_count:
+            return None
+        return bar.to_bar()
+
+    def history(self, symbol, service='TIMESALE_EQUITY'):
+        '''
+        Returns the :class:`BarHistory` for the symbol, or ``None`` if no
+        prints have been received for it.
+        '''
+        bar = self._bars.get((service, symbol))
+        if bar is None:
+            return None
+        return bar.history
@@ -0,0 +1,252 @@
+from array import array
+from bisect import bisect_left
+
+
+_BOOK_SERVICES = {
+    'LISTED_BOOK': 'add_listed_book_handler',
+    'NASDAQ_BOOK': 'add_nasdaq_book_handler',
+    'OPTIONS_BOOK': 'add_options_book_handler',
+}
+
+
+class BookSide:
+    '''
+    One side of an order book. Price levels are kept sorted from best to worst,
+    so level ``0`` is always the best bid or ask. Prices, sizes, and order
+    counts are stored in parallel arrays which are updated in place as book
+    messages arrive.
+    '''
+
+    def __init__(self, is_bid):
+        # Bids are stored by negated price so that both sides sort ascending
+        # from the best level
+        self._sign = -1.0 if is_bid else 1.0
+        if is_bid:
+            self._price_key = 'BID_PRICE'
+            self._count_key = 'NUM_BIDS'
+            self._exchanges_key = 'BIDS'
+            self._exchange_size_key = 'BID_VOLUME'
+        else:
+            self._price_key = 'ASK_PRICE'
+            self._count_key = 'NUM_ASKS'
+            self._exchanges_key = 'ASKS'
+            self._exchange_size_key = 'ASK_VOLUME'
+
+        self._keys = array('d')
+        self._sizes = array('d')
+        self._counts = array('q')
+        self._exchanges = []
+
+    def __len__(self):
+        return len(self._keys)
+
+    def price(self, level):
+        '''
+        Price of the given level, where ``0`` is the best level.
+        '''
+        return self._keys[level] * self._sign
+
+    def size(self, level):
+        '''
+        Total size of the given level across all exchanges.
+        '''
+        return self._sizes[level]
+
+    def order_count(self, level):
+        '''
+        Number of orders at the given level.
+        '''
+        return self._counts[level]
+
+    def exchanges(self, level):
+        '''
+        Returns a ``dict`` from exchange name to size at the given level. The
+        returned ``dict`` is updated in place by later messages; copy it if you
+        need to hold on to its current contents.
+        '''
+        return self._exchanges[level]
+
+    def top(self):
+        '''
+        Returns the best ``(price, size)`` pair, or ``None`` if the side is
+        empty.
+        '''
+        if not self._keys:
+            return None
+        return self._keys[0] * self._sign, self._sizes[0]
+
+    def depth(self, levels):
+        '''
+        Returns a list of up to ``levels`` ``(price, size)`` pairs, starting
+        from the best level.
+        '''
+        sign = self._sign
+        return [(self._keys[i] * sign, self._sizes[i])
+                for i in range(min(levels, len(self._keys)))]
+
+    def cumulative_size(self, levels=None):
+        '''
+        Total size of the best ``levels`` levels, or of the entire side if
+        ``levels`` is ``None``.
+        '''
+        if levels is None:
+            return sum(self._sizes)
+        return sum(self._sizes[:levels])
+
+    def size_at(self, price):
+        '''
+        Total size at the given price, or zero if there is no such level.
+        '''
+        key = price * self._sign
+        index = bisect_left(self._keys, key)
+        if index < len(self._keys) and self._keys[index] == key:
+            return self._sizes[index]
+        return 0
+
+    def exchange_size(self, exchange, levels=None):
+        '''
+        Total size offered by a single exchange over the best ``levels``
+        levels, or over the entire side if ``levels`` is ``None``.
+        '''
+        exchanges = self._exchanges if levels is None \
+            else self._exchanges[:levels]
+        return sum(e.get(exchange, 0) for e in exchanges)
+
+    def _apply(self, levels):
+        '''
+        Updates the side to match the given list of labeled levels, touching
+        only the levels which were added, removed, or changed.
+        '''
+        keys, sizes, counts, exchanges = \
+            self._keys, self._sizes, self._counts, self._exchanges
+        sign = self._sign
+
+        new_keys = set(level[self._price_key] * sign for level in levels)
+
+        # Drop levels which are no longer in the book, back to front so
+        # indices remain valid
+        for index in range(len(keys) - 1, -1, -1):
+            if keys[index] not in new_keys:
+                del keys[index]
+                del sizes[index]
+                del counts[index]
+                del exchanges[index]
+
+        for level in levels:
+            key = level[self._price_key] * sign
+            index = bisect_left(keys, key)
+            if index == len(keys) or keys[index] != key:
+                keys.insert(index, key)
+                sizes.insert(index, 0)
+                counts.insert(index, 0)
+                exchanges.insert(index, {})
+
+            sizes[index] = level.get('TOTAL_VOLUME', 0)
+            counts[index] = level.get(self._count_key, 0)
+
+            level_exchanges = exchanges[index]
+            level_exchanges.clear()
+            for entry in level.get(self._exchanges_key, ()):
+                level_exchanges[entry['EXCHANGE']] = \
+                    entry.get(self._exchange_size_key, 0)
+
+
+class OrderBook:
+    '''
+    Level two order book for a single symbol. Each book message received from
+    the stream contains the full book, which is applied as a diff against the
+    previous state.
+    '''
+
+    def __init__(self, symbol):
+        #: Symbol of this book
+        self.symbol = symbol
+
+        #: Bid side, as a :class:`BookSide`
+        self.bids = BookSide(is_bid=True)
+
+        #: Ask side, as a :class:`BookSide`
+        self.asks = BookSide(is_bid=False)
+
+        #: Book time of the most recently applied message, in milliseconds
+        #: since epoch
+        self.book_time = None
+
+        #: Number of messages applied to this book
+        self.version = 0
+
+    def apply(self, content):
+        '''
+        Applies a single labeled content entry of a book message.
+        '''
+        self.book_time = content.get('BOOK_TIME', self.book_time)
+        self.bids._apply(content.get('BIDS', ()))
+        self.asks._apply(content.get('ASKS', ()))
+        self.version += 1
+
+    def top(self):
+        '''
+        Returns the best bid and ask as a pair of ``(price, size)`` pairs.
+        Either may be ``None`` if its side is empty.
+        '''
+        return self.bids.top(), self.asks.top()
+
+    def spread(self):
+        '''
+        Difference between the best ask and best bid prices, or ``None`` if
+        either side is empty.
+        '''
+        if not len(self.bids) or not len(self.asks):
+            return None
+        return self.asks.price(0) - self.bids.price(0)
+
+
+class OrderBooks:
+    '''
+    Maintains an :class:`OrderBook` for every symbol received on the level two
+    book streams.
+    '''
+
+    def __init__(self):
+        self._books = {}
+
+    def register(self, stream_client, services=None):
+        '''
+        Registers handlers on the stream client which keep the books up to
+        date. Note you still need to subscribe to the streams themselves.
+
+        :param services: Book services to track, such as ``'NASDAQ_BOOK'``.
+                         Defaults to all book services.
+        '''
+        if services is None:
+            services = list(_BOOK_SERVICES)
+
+        for service in services:
+            try:
+                method = _BOOK_SERVICES[service]
+            except KeyError:
+                raise ValueError(
+                    'unsupported service {}, must be one of {}'.format(
+                        service, ', '.join(_BOOK_SERVICES)))
+            getattr(stream_client, method)(self.handle_message)
+
+    def handle_message(self, msg):
+        '''
+        Applies a labeled book message. Called by the handlers installed by
+        :meth:`register`, but can also be called directly from your own
+        handlers.
+        '''
+        service = msg['service']
+        for content in msg.get('content', ()):
+            book_key = (service, content['key'])
+            book = self._books.get(book_key)
+            if book is None:
+                book = self._books[book_key] = OrderBook(content['key'])
+            book.apply(content)
+
+    def get(self, symbol, service='NASDAQ_BOOK'):
+        '''
+        Returns the :class:`OrderBook` for the symbol, or ``None`` if no book
+        messages have been received for it.
+        '''
+        return self._books.get((service, symbol))
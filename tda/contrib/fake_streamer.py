@@ -0,0 +1,494 @@
+'''
+A local stand-in for the TDA streaming server, for measuring the throughput of
+:class:`~tda.streaming.StreamClient` over a real socket without connecting to
+TDA.
+'''
+
+import asyncio
+import datetime
+import ipaddress
+import itertools
+import json
+import multiprocessing
+import os
+import random
+import ssl
+import tempfile
+import time
+
+import httpx
+import websockets
+import websockets.exceptions
+
+from tda.client import Client
+from tda.streaming import StreamClient
+
+
+def _self_signed_certificate(hostname):
+    '''
+    Returns a PEM-encoded self-signed certificate and private key for
+    ``hostname`` and the loopback address.
+    '''
+    from cryptography import x509
+    from cryptography.hazmat.primitives import hashes, serialization
+    from cryptography.hazmat.primitives.asymmetric import ec
+    from cryptography.x509.oid import NameOID
+
+    key = ec.generate_private_key(ec.SECP256R1())
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, hostname)])
+    now = datetime.datetime.now(datetime.timezone.utc)
+    cert = (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(now - datetime.timedelta(minutes=5))
+        .not_valid_after(now + datetime.timedelta(days=1))
+        .add_extension(x509.SubjectAlternativeName([
+            x509.DNSName(hostname),
+            x509.IPAddress(ipaddress.ip_address('127.0.0.1')),
+        ]), critical=False)
+        .sign(key, hashes.SHA256()))
+
+    cert_pem = cert.public_bytes(serialization.Encoding.PEM)
+    key_pem = key.private_bytes(
+        serialization.Encoding.PEM,
+        serialization.PrivateFormat.PKCS8,
+        serialization.NoEncryption())
+    return cert_pem, key_pem
+
+
+class _FakeHttpClient:
+    '''
+    Minimal HTTP client returning the fake streamer's user principals, which
+    is all that :meth:`~tda.streaming.StreamClient.login` needs.
+    '''
+    UserPrincipals = Client.UserPrincipals
+
+    def __init__(self, principals):
+        self._principals = principals
+
+    def get_user_principals(self, fields=None):
+        return httpx.Response(200, json=self._principals)
+
+
+def _principals(host, port):
+    expiration = (datetime.datetime.now(datetime.timezone.utc) +
+                  datetime.timedelta(days=1))
+    return {
+        'tokenExpirationTime': expiration.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'streamerInfo': {
+            'streamerSocketUrl': '{}:{}'.format(host, port),
+            'token': 'fake-token',
+            'tokenTimestamp': '2021-01-01T00:00:00+0000',
+            'userGroup': 'ACCT',
+            'accessLevel': 'ACCT',
+            'acl': 'fake-acl',
+            'appId': 'fake-app-id',
+        },
+        'streamerSubscriptionKeys': {
+            'keys': [{'key': 'fake-subscription-key'}],
+        },
+        'accounts': [{
+            'accountId': '1000',
+            'company': 'AMER',
+            'segment': 'AMER',
+            'accountCdDomainId': 'A000000000000000',
+        }],
+    }
+
+
+def _client_ssl_context(cert_pem):
+    context = ssl.create_default_context()
+    context.load_verify_locations(cadata=cert_pem.decode('ascii'))
+    return context
+
+
+def _stream_client(host, port, cert_pem, **kwargs):
+    return StreamClient(
+        _FakeHttpClient(_principals(host, port)),
+        ssl_context=_client_ssl_context(cert_pem), **kwargs)
+
+
+class _ConnectionState:
+    def __init__(self):
+        self.logged_in = False
+        self.qos_level = None
+
+        # Service name to a dict of subscribed symbols, in subscription order
+        self.subscriptions = {}
+
+        # Service name to the list of subscribed field numbers
+        self.fields = {}
+
+        # Position of the next frame within the round-robin over services and
+        # their symbols
+        self.service_index = 0
+        self.symbol_index = 0
+
+
+class FakeStreamer:
+    '''
+    Local websocket server which speaks enough of the streaming protocol to
+    exercise a stream client end to end: logging in, subscription commands,
+    quality of service, heartbeats, and data for every subscribed symbol.
+
+    Data frames are sent at a fixed rate to every logged-in connection,
+    cycling through subscribed services and symbols. Each frame's
+    ``timestamp`` is the time it was sent in milliseconds since the epoch, with
+    sub-millisecond precision, so handlers can measure end-to-end latency.
+    Field values are random and carry no meaning.
+
+    Connections use TLS with a self-signed certificate generated on start. Use
+    :meth:`stream_client` to create a client which trusts it:
+
+    .. code-block:: python
+
+      async with FakeStreamer(messages_per_second=10000) as streamer:
+          stream_client = streamer.stream_client()
+          await stream_client.login()
+          await stream_client.level_one_equity_subs(['GOOG', 'MSFT'])
+
+    :param messages_per_second: Data frames sent per second on each connection.
+    :param symbols_per_message: Maximum number of symbols in each frame.
+    :param compression: Whether to accept permessage-deflate compression.
+    :param heartbeat_interval_seconds: Interval between heartbeat
+                                       notifications.
+    :param host: Host name to listen on.
+    '''
+
+    def __init__(self, *, messages_per_second=1000, symbols_per_message=10,
+                 compression=True, heartbeat_interval_seconds=10.0,
+                 host='localhost'):
+        self._messages_per_second = messages_per_second
+        self._symbols_per_message = symbols_per_message
+        self._compression = compression
+        self._heartbeat_interval_seconds = heartbeat_interval_seconds
+        self._host = host
+
+        self._server = None
+        self._cert_pem = None
+        self._connections = set()
+
+        # Generating random values is slow enough to limit the frame rate, so
+        # cycle through a precomputed table instead
+        self._prices = itertools.cycle(
+            [round(random.uniform(10, 1000), 2) for _ in range(4096)])
+
+        #: Number of data frames sent across all connections
+        self.frames_sent = 0
+
+        #: Number of command requests received across all connections
+        self.requests_received = 0
+
+    async def start(self):
+        '''
+        Starts listening on a free port.
+        '''
+        self._cert_pem, key_pem = _self_signed_certificate(self._host)
+
+        # The ssl module only loads certificates from files
+        server_context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        with tempfile.TemporaryDirectory() as tmpdir:
+            cert_path = os.path.join(tmpdir, 'cert.pem')
+            key_path = os.path.join(tmpdir, 'key.pem')
+            with open(cert_path, 'wb') as f:
+                f.write(self._cert_pem)
+            with open(key_path, 'wb') as f:
+                f.write(key_pem)
+            server_context.load_cert_chain(cert_path, key_path)
+
+        self._server = await websockets.serve(
+            self._handle_connection, self._host, 0, ssl=server_context,
+            compression='deflate' if self._compression else None)
+
+    async def stop(self):
+        '''
+        Closes all connections and stops listening.
+        '''
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def drop_connections(self):
+        '''
+        Closes every open connection, as when the server drops a client.
+        '''
+        for websocket in list(self._connections):
+            await websocket.close()
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.stop()
+
+    @property
+    def port(self):
+        '''
+        Port the server is listening on.
+        '''
+        return self._server.sockets[0].getsockname()[1]
+
+    def principals(self):
+        '''
+        User principals pointing a stream client at this server.
+        '''
+        return _principals(self._host, self.port)
+
+    def client_ssl_context(self):
+        '''
+        SSL context which trusts this server's certificate.
+        '''
+        return _client_ssl_context(self._cert_pem)
+
+    def stream_client(self, **kwargs):
+        '''
+        Returns a :class:`~tda.streaming.StreamClient` which connects to this
+        server when logging in. Keyword arguments are passed to the
+        :class:`~tda.streaming.StreamClient` constructor.
+        '''
+        return _stream_client(self._host, self.port, self._cert_pem, **kwargs)
+
+    ##########################################################################
+    # Protocol
+
+    async def _handle_connection(self, websocket, path=None):
+        state = _ConnectionState()
+        self._connections.add(websocket)
+        tasks = [
+            asyncio.ensure_future(self._publish(websocket, state)),
+            asyncio.ensure_future(self._send_heartbeats(websocket)),
+        ]
+        try:
+            async for raw in websocket:
+                requests = json.loads(raw)['requests']
+                self.requests_received += len(requests)
+                await websocket.send(json.dumps({'response': [
+                    self._handle_request(state, request)
+                    for request in requests]}))
+        except websockets.exceptions.ConnectionClosed:
+            pass
+        finally:
+            self._connections.discard(websocket)
+            for task in tasks:
+                task.cancel()
+
+    def _handle_request(self, state, request):
+        service = request['service']
+        command = request['command']
+        parameters = request.get('parameters', {})
+
+        code, msg = 0, 'success'
+        if command == 'LOGIN':
+            state.logged_in = True
+        elif not state.logged_in:
+            code, msg = 3, 'Login required'
+        elif command == 'QOS':
+            state.qos_level = parameters.get('qoslevel')
+        elif command in ('SUBS', 'ADD', 'UNSUBS'):
+            self._update_subscription(state, service, command, parameters)
+        elif command != 'LOGOUT':
+            code, msg = 22, 'Unknown command {}'.format(command)
+
+        return {
+            'service': service,
+            'requestid': request['requestid'],
+            'command': command,
+            'timestamp': int(self._now_ms()),
+            'content': {'code': code, 'msg': msg},
+        }
+
+    @staticmethod
+    def _update_subscription(state, service, command, parameters):
+        keys = [key for key in parameters.get('keys', '').split(',') if key]
+        if command == 'SUBS':
+            state.subscriptions[service] = dict.fromkeys(keys)
+        elif command == 'ADD':
+            state.subscriptions.setdefault(service, {}).update(
+                dict.fromkeys(keys))
+        else:
+            subscribed = state.subscriptions.get(service, {})
+            for key in keys:
+                subscribed.pop(key, None)
+            if not subscribed:
+                state.subscriptions.pop(service, None)
+
+        if 'fields' in parameters:
+            state.fields[service] = [
+                field for field in parameters['fields'].split(',')
+                if field != '0']
+
+    async def _publish(self, websocket, state):
+        loop = asyncio.get_event_loop()
+        start = loop.time()
+        sent = 0
+        while True:
+            await asyncio.sleep(0.001)
+
+            # Frames are paced against the start time rather than by sleeping
+            # between frames, since sleeps are too coarse for high rates
+            if not state.logged_in or not state.subscriptions:
+                start = loop.time()
+                sent = 0
+                continue
+
+            due = int((loop.time() - start) * self._messages_per_second)
+            while sent < due:
+                await websocket.send(self._next_frame(state))
+                sent += 1
+                self.frames_sent += 1
+
+                # Sending rarely blocks, so yield now and then to let the
+                # server handle commands
+                if sent % 100 == 0:
+                    await asyncio.sleep(0)
+
+    async def _send_heartbeats(self, websocket):
+        while True:
+            await asyncio.sleep(self._heartbeat_interval_seconds)
+            await websocket.send(json.dumps({'notify': [
+                {'heartbeat': str(int(self._now_ms()))}]}))
+
+    def _next_frame(self, state):
+        services = list(state.subscriptions)
+        service = services[state.service_index % len(services)]
+        symbols = list(state.subscriptions[service])
+
+        first = state.symbol_index % len(symbols)
+        chunk = symbols[first:first + self._symbols_per_message]
+        if first + self._symbols_per_message >= len(symbols):
+            state.service_index += 1
+            state.symbol_index = 0
+        else:
+            state.symbol_index = first + self._symbols_per_message
+
+        fields = state.fields.get(service, [])
+        if service.endswith('_BOOK'):
+            content = [self._book_entry(symbol) for symbol in chunk]
+        else:
+            content = [self._entry(symbol, fields) for symbol in chunk]
+
+        return json.dumps({'data': [{
+            'service': service,
+            'timestamp': self._now_ms(),
+            'command': 'SUBS',
+            'content': content,
+        }]})
+
+    def _entry(self, symbol, fields):
+        prices = self._prices
+        entry = {'key': symbol}
+        for field in fields:
+            entry[field] = next(prices)
+        return entry
+
+    def _book_entry(self, symbol):
+        mid = next(self._prices)
+
+        def levels(sign):
+            return [{
+                '0': round(mid + sign * 0.01 * (i + 1), 2),
+                '1': 100,
+                '2': 1,
+                '3': [{'0': 'NSDQ', '1': 100, '2': 1}],
+            } for i in range(5)]
+
+        return {
+            'key': symbol,
+            '1': int(self._now_ms()),
+            '2': levels(-1),
+            '3': levels(1),
+        }
+
+    @staticmethod
+    def _now_ms():
+        return time.time() * 1000
+
+
+def _serve_in_process(conn, streamer_args):
+    async def serve():
+        streamer = FakeStreamer(**streamer_args)
+        async with streamer:
+            conn.send((streamer.port, streamer._cert_pem))
+
+            # Block on the pipe in a thread until the parent asks to stop
+            await asyncio.get_event_loop().run_in_executor(None, conn.recv)
+            conn.send({
+                'frames_sent': streamer.frames_sent,
+                'requests_received': streamer.requests_received,
+            })
+
+    asyncio.run(serve())
+
+
+class FakeStreamerProcess:
+    '''
+    Runs a :class:`FakeStreamer` in a separate process, so that generating
+    frames does not compete with the client under test for the event loop and
+    the interpreter lock. Takes the same arguments as :class:`FakeStreamer`:
+
+    .. code-block:: python
+
+      with FakeStreamerProcess(messages_per_second=10000) as streamer:
+          stream_client = streamer.stream_client()
+          # ... log in and subscribe as usual
+    '''
+
+    def __init__(self, **streamer_args):
+        self._streamer_args = streamer_args
+        self._host = streamer_args.get('host', 'localhost')
+        self._process = None
+        self._conn = None
+        self._port = None
+        self._cert_pem = None
+
+    def start(self):
+        '''
+        Starts the server process and waits until it is listening.
+        '''
+        self._conn, child_conn = multiprocessing.Pipe()
+        self._process = multiprocessing.Process(
+            target=_serve_in_process, args=(child_conn, self._streamer_args),
+            daemon=True)
+        self._process.start()
+        self._port, self._cert_pem = self._conn.recv()
+
+    def stop(self):
+        '''
+        Stops the server process. Returns a ``dict`` with the server's
+        ``frames_sent`` and ``requests_received`` counts.
+        '''
+        self._conn.send(None)
+        stats = self._conn.recv()
+
+        # Shutting down gracefully would wait for clients to complete the
+        # closing handshake, which they cannot do if their event loop is
+        # blocked on this call
+        self._process.terminate()
+        self._process.join()
+        self._conn.close()
+        return stats
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.stop()
+
+    @property
+    def port(self):
+        '''
+        Port the server is listening on.
+        '''
+        return self._port
+
+    def stream_client(self, **kwargs):
+        '''
+        See :meth:`FakeStreamer.stream_client`.
+        '''
+        return _stream_client(self._host, self._port, self._cert_pem, **kwargs)
@@ -0,0 +1,229 @@
+'''
+Recording raw stream frames to disk and replaying them through a
+:class:`~tda.streaming.StreamClient`.
+
+Frames are stored in a directory of append-only segment files. Each segment
+starts with a short magic header, followed by one record per frame: the
+receive time as a little-endian double, the payload length as a little-endian
+unsigned 32-bit integer, and the UTF-8 encoded frame.
+'''
+
+import asyncio
+import mmap
+import os
+import re
+import struct
+
+from tda.streaming import StreamFrameRecorder, UnexpectedResponse
+
+
+_SEGMENT_MAGIC = b'TDAFRM1\n'
+_RECORD_HEADER = struct.Struct('<dI')
+_SEGMENT_NAME = re.compile(r'^frames-(\d{6})\.log$')
+
+
+def _segment_paths(directory):
+    '''
+    Returns ``(index, path)`` pairs for every segment in the directory, in
+    order.
+    '''
+    segments = []
+    for name in os.listdir(directory):
+        match = _SEGMENT_NAME.match(name)
+        if match:
+            segments.append(
+                (int(match.group(1)), os.path.join(directory, name)))
+    return sorted(segments)
+
+
+class SegmentedFrameLog(StreamFrameRecorder):
+    '''
+    Records raw frames to a directory of segment files. Segments are rotated
+    once they exceed ``max_segment_bytes``. Recording into a directory which
+    already contains segments starts a new segment after the existing ones, so
+    earlier recordings are never modified.
+
+    Frames are buffered in memory and written out as the buffer fills, so call
+    :meth:`close` (or use the log as a context manager) when done recording.
+
+    :param directory: Directory to write segments to. Created if it does not
+                      exist.
+    :param max_segment_bytes: Approximate maximum size of each segment.
+    '''
+
+    def __init__(self, directory, *, max_segment_bytes=256 * 1024 * 1024):
+        self._directory = directory
+        self._max_segment_bytes = max_segment_bytes
+
+        os.makedirs(directory, exist_ok=True)
+        existing = _segment_paths(directory)
+        self._segment_index = existing[-1][0] if existing else 0
+
+        self._file = None
+        self._segment_bytes = 0
+        self._open_next_segment()
+
+    def _open_next_segment(self):
+        if self._file is not None:
+            self._file.close()
+
+        self._segment_index += 1
+        path = os.path.join(
+            self._directory, 'frames-{:06d}.log'.format(self._segment_index))
+        self._file = open(path, 'xb')
+        self._file.write(_SEGMENT_MAGIC)
+        self._segment_bytes = len(_SEGMENT_MAGIC)
+
+    def record_frame(self, raw, received_at):
+        if isinstance(raw, str):
+            raw = raw.encode('utf-8')
+
+        if self._segment_bytes >= self._max_segment_bytes:
+            self._open_next_segment()
+
+        self._file.write(_RECORD_HEADER.pack(received_at, len(raw)))
+        self._file.write(raw)
+        self._segment_bytes += _RECORD_HEADER.size + len(raw)
+
+    def flush(self):
+        '''
+        Writes out buffered frames.
+        '''
+        self._file.flush()
+
+    def close(self):
+        '''
+        Writes out buffered frames and closes the current segment.
+        '''
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class FrameLogReader:
+    '''
+    Iterates over ``(received_at, raw)`` pairs recorded by
+    :class:`SegmentedFrameLog`, in the order they were recorded. Segments are
+    memory-mapped rather than read into memory. A truncated record at the end
+    of a segment, as left behind by a crash, ends that segment.
+
+    :param decode: Whether to decode frames to ``str``. Pass ``False`` to
+                   receive the recorded bytes, which saves a copy when replaying
+                   through a decoder which parses bytes directly.
+    '''
+
+    def __init__(self, directory, *, decode=True):
+        self._directory = directory
+        self._decode = decode
+
+    def __iter__(self):
+        for _, path in _segment_paths(self._directory):
+            yield from self._read_segment(path, self._decode)
+
+    @staticmethod
+    def _read_segment(path, decode):
+        with open(path, 'rb') as f:
+            size = os.fstat(f.fileno()).st_size
+            if size <= len(_SEGMENT_MAGIC):
+                return
+
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                if data[:len(_SEGMENT_MAGIC)] != _SEGMENT_MAGIC:
+                    raise ValueError(
+                        '{} is not a frame log segment'.format(path))
+
+                unpack_header = _RECORD_HEADER.unpack_from
+                header_size = _RECORD_HEADER.size
+                offset = len(_SEGMENT_MAGIC)
+                while offset + header_size <= size:
+                    received_at, length = unpack_header(data, offset)
+                    start = offset + header_size
+                    end = start + length
+                    if end > size:
+                        break
+                    raw = data[start:end]
+                    yield received_at, raw.decode('utf-8') if decode else raw
+                    offset = end
+
+
+class ReplayFinished(Exception):
+    '''
+    Raised by :class:`ReplaySocket` once every frame has been replayed.
+    '''
+
+
+class ReplaySocket:
+    '''
+    Stands in for a stream websocket, returning recorded frames from
+    ``recv()``.
+
+    :param frames: Iterable of ``(received_at, raw)`` pairs, such as a
+                   :class:`FrameLogReader`.
+    :param speed: Replay speed relative to the recording. ``1.0`` replays at
+                  the recorded pace, ``10.0`` ten times faster, and ``None``
+                  as fast as possible.
+    '''
+
+    def __init__(self, frames, *, speed=1.0):
+        if speed is not None and speed <= 0:
+            raise ValueError('speed must be positive')
+
+        self._frames = iter(frames)
+        self._speed = speed
+        self._first_received_at = None
+        self._started_at = None
+
+    async def recv(self):
+        try:
+            received_at, raw = next(self._frames)
+        except StopIteration:
+            raise ReplayFinished()
+
+        if self._speed is not None:
+            loop = asyncio.get_event_loop()
+            if self._first_received_at is None:
+                self._first_received_at = received_at
+                self._started_at = loop.time()
+
+            due = self._started_at + (
+                received_at - self._first_received_at) / self._speed
+            delay = due - loop.time()
+            if delay > 0:
+                await asyncio.sleep(delay)
+
+        return raw
+
+    async def send(self, raw):
+        raise ValueError('cannot send commands to a replayed stream')
+
+
+async def replay(stream_client, directory, *, speed=1.0):
+    '''
+    Replays a recorded session through ``stream_client``, calling
+    :meth:`~tda.streaming.StreamClient.handle_message` until every frame has
+    been handled. Handlers must be registered beforehand. Responses to
+    commands, such as the login response, are skipped.
+
+    Frames are passed to the stream client's decoder as bytes, so a decoder
+    such as :class:`~tda.streaming.FastJsonStreamDecoder` can parse them
+    without first decoding them to strings.
+
+    :param directory: Directory written by :class:`SegmentedFrameLog`.
+    :param speed: See :class:`ReplaySocket`.
+    '''
+    stream_client.set_replay_source(
+        ReplaySocket(FrameLogReader(directory, decode=False), speed=speed))
+
+    while True:
+        try:
+            await stream_client.handle_message()
+        except ReplayFinished:
+            return
+        except UnexpectedResponse:
+            pass
@@ -0,0 +1,187 @@
+from collections import defaultdict
+
+from tda.streaming import StreamClient
+
+
+# Level one services and the field enums used to label their messages
+_LEVEL_ONE_FIELDS = {
+    'QUOTE': StreamClient.LevelOneEquityFields,
+    'OPTION': StreamClient.LevelOneOptionFields,
+    'LEVELONE_FUTURES': StreamClient.LevelOneFuturesFields,
+    'LEVELONE_FOREX': StreamClient.LevelOneForexFields,
+    'LEVELONE_FUTURES_OPTIONS': StreamClient.LevelOneFuturesOptionsFields,
+}
+
+_SERVICES_BY_FIELDS = dict(
+    (fields, service) for service, fields in _LEVEL_ONE_FIELDS.items())
+
+_REGISTER_METHODS = {
+    'QUOTE': 'add_level_one_equity_handler',
+    'OPTION': 'add_level_one_option_handler',
+    'LEVELONE_FUTURES': 'add_level_one_futures_handler',
+    'LEVELONE_FOREX': 'add_level_one_forex_handler',
+    'LEVELONE_FUTURES_OPTIONS': 'add_level_one_futures_options_handler',
+}
+
+
+class _SnapshotTable:
+    '''
+    Latest known values for every symbol of a single service. Each symbol's
+    values are stored in a list indexed by field number, with ``None`` for
+    fields which have not been received yet.
+    '''
+
+    def __init__(self, fields):
+        self.fields = fields
+        self.names = [None] * (max(f.value for f in fields) + 1)
+        for field in fields:
+            self.names[field.value] = field.name
+
+        # Labeled messages carry the symbol in the "key" field
+        self.names[fields.SYMBOL.value] = 'key'
+        self.indices = dict((field.name, field.value) for field in fields)
+        self.indices['key'] = fields.SYMBOL.value
+
+        self.rows = {}
+        self.versions = defaultdict(int)
+
+    def update(self, entry):
+        symbol = entry['key']
+        row = self.rows.get(symbol)
+        if row is None:
+            row = self.rows[symbol] = [None] * len(self.names)
+
+        indices = self.indices
+        for name, value in entry.items():
+            index = indices.get(name)
+            if index is not None:
+                row[index] = value
+
+        self.versions[symbol] += 1
+
+
+class QuoteSnapshots:
+    '''
+    Maintains the latest known quote for every symbol received on the level one
+    streams. Level one messages only contain the fields which changed since the
+    previous message, so this class merges each message into the last known
+    values for its symbol. Lookups are constant-time, allowing any number of
+    coroutines to share a single, up-to-date view of the market.
+
+    Every update increments a version counter, both for the store as a whole
+    and for the updated symbol, so consumers can cheaply check whether anything
+    changed since they last looked.
+
+    Snapshots are updated in place and are not thread safe. They are meant to
+    be read from the same event loop which handles stream messages.
+    '''
+
+    def __init__(self):
+        self._tables = {}
+        self._version = 0
+
+    def register(self, stream_client, services=None):
+        '''
+        Registers handlers on the stream client which keep this store up to
+        date. Note you still need to subscribe to the streams themselves.
+
+        :param services: Level one services to track, such as ``'QUOTE'`` or
+                         ``'LEVELONE_FUTURES'``. Defaults to all level one
+                         services.
+        '''
+        if services is None:
+            services = list(_REGISTER_METHODS)
+
+        for service in services:
+            try:
+                method = _REGISTER_METHODS[service]
+            except KeyError:
+                raise ValueError(
+                    'unsupported service {}, must be one of {}'.format(
+                        service, ', '.join(_REGISTER_METHODS)))
+            # Snapshots keep every field of the service
+            getattr(stream_client, method)(
+                self.handle_message, fields=list(_LEVEL_ONE_FIELDS[service]))
+
+    def handle_message(self, msg):
+        '''
+        Merges a labeled level one message into the store. Called by the
+        handlers installed by :meth:`register`, but can also be called directly
+        from your own handlers.
+        '''
+        service = msg['service']
+        table = self._tables.get(service)
+        if table is None:
+            table = self._tables[service] = _SnapshotTable(
+                _LEVEL_ONE_FIELDS[service])
+
+        for entry in msg.get('content', ()):
+            table.update(entry)
+            self._version += 1
+
+    @property
+    def version(self):
+        '''
+        Number of updates applied to the store so far.
+        '''
+        return self._version
+
+    def symbol_version(self, symbol, service='QUOTE'):
+        '''
+        Number of updates applied to the given symbol so far, or zero if it has
+        not been seen.
+        '''
+        table = self._tables.get(service)
+        if table is None:
+            return 0
+        return table.versions.get(symbol, 0)
+
+    def symbols(self, service='QUOTE'):
+        '''
+        Returns a list of symbols for which values have been received.
+        '''
+        table = self._tables.get(service)
+        if table is None:
+            return []
+        return list(table.rows)
+
+    def get(self, symbol, service='QUOTE'):
+        '''
+        Returns the latest known values for the symbol as a ``dict`` from field
+        name to value, in the same format as the content of a relabeled stream
+        message, with the symbol under ``'key'``. Fields which have not been
+        received are omitted. Returns ``None`` if the symbol has not been
+        seen.
+        '''
+        table = self._tables.get(service)
+        if table is None:
+            return None
+        row = table.rows.get(symbol)
+        if row is None:
+            return None
+
+        names = table.names
+        return dict((names[index], value)
+                    for index, value in enumerate(row)
+                    if value is not None and names[index] is not None)
+
+    def get_field(self, symbol, field):
+        '''
+        Returns the latest known value of a single field, or ``None`` if it has
+        not been received. The service is determined by the field's type.
+
+        :param field: A level one field, such as
+                      ``StreamClient.LevelOneEquityFields.BID_PRICE``.
+        '''
+        try:
+            service = _SERVICES_BY_FIELDS[type(field)]
+        except KeyError:
+            raise ValueError('{} is not a level one field'.format(field))
+
+        table = self._tables.get(service)
+        if table is None:
+            return None
+        row = table.rows.get(symbol)
+        if row is None:
+            return None
+        return row[field.value]
@@ -57,11 +57,19 @@ class LogRedactor:
         return msg
 
 
+# Redactions are only consulted when bug report logs are written out, so
+# responses aren't parsed for them unless bug report logging is enabled.
+_bug_report_logging_enabled = False
+
+
 def register_redactions_from_response(resp):
     '''
     Convenience method that calls ``register_redactions`` if resp represents a
-    successful response. Note this method assumes that resp has a JSON contents.
+    successful response. Does nothing unless bug report logging is enabled.
+    Note this method assumes that resp has a JSON contents.
     '''
+    if not _bug_report_logging_enabled:
+        return
     if resp.status_code == httpx.codes.OK:
         try:
             register_redactions(resp.json())
@@ -142,6 +150,9 @@ def _enable_bug_report_logging(output=sys.stderr, loggers=None):
         def emit(self, record):
             self.messages.append(self.format(record))
 
+    global _bug_report_logging_enabled
+    _bug_report_logging_enabled = True
+
     handler = RecordingHandler()
     handler.setFormatter(logging.Formatter(
         '[%(filename)s:%(lineno)s:%(funcName)s] %(message)s'))
@@ -0,0 +1,246 @@
+'''
+Client-side rate limiting for :class:`~tda.client.Client` and
+:class:`~tda.client.AsyncClient`. Requests are paced using token buckets, so
+that a client can run right at TDA's limits instead of firing requests as
+quickly as possible and backing off once it receives ``429`` responses.
+'''
+
+from enum import Enum
+
+import os
+import re
+import struct
+import threading
+import time
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover
+    fcntl = None
+
+
+class EndpointClass(Enum):
+    '''
+    Groups of endpoints which can be given separate budgets by a
+    :class:`RateLimiter`.
+    '''
+
+    #: Every request, regardless of endpoint
+    ALL = 'ALL'
+
+    #: Requests which place, replace, or cancel orders or saved orders
+    ORDERS = 'ORDERS'
+
+    #: Quotes, price history, option chains, market hours, movers, and
+    #: instrument searches
+    MARKET_DATA = 'MARKET_DATA'
+
+    #: All other requests, such as account and transaction information,
+    #: preferences, and watchlists
+    ACCOUNTS = 'ACCOUNTS'
+
+
+_ORDER_PATH = re.compile(r'^/v1/accounts/[^/]+/(saved)?orders(/|$)')
+
+
+def endpoint_class(method, path):
+    '''
+    Returns the :class:`EndpointClass` of a request, other than
+    :attr:`EndpointClass.ALL`.
+
+    :param method: HTTP method, such as ``'GET'``.
+    :param path: Request path, such as ``'/v1/marketdata/quotes'``.
+    '''
+    if method != 'GET' and _ORDER_PATH.match(path):
+        return EndpointClass.ORDERS
+    if path.startswith('/v1/marketdata') or path.startswith('/v1/instruments'):
+        return EndpointClass.MARKET_DATA
+    return EndpointClass.ACCOUNTS
+
+
+class TokenBucket:
+    '''
+    Token bucket shared by the threads and tasks of a single process. Tokens
+    are added continuously at ``rate`` tokens per ``period`` seconds, up to
+    ``capacity`` tokens.
+
+    Reservations are allowed to take the bucket below zero, in which case the
+    caller waits until the tokens it took would have been added. Waiting
+    callers are therefore served in the order they made their reservations,
+    and the bucket never admits more than ``capacity + rate`` requests in any
+    ``period``.
+
+    :param rate: Number of tokens added per ``period``.
+    :param period: Length of the period in seconds.
+    :param capacity: Maximum number of tokens which accumulate while the bucket
+                     is idle. The default of ``1`` spaces requests evenly.
+                     Larger values allow bursts of up to ``capacity`` requests
+                     after an idle period.
+    '''
+
+    def __init__(self, rate, period=60.0, *, capacity=1):
+        if rate <= 0:
+            raise ValueError('rate must be positive')
+        if period <= 0:
+            raise ValueError('period must be positive')
+        if capacity <= 0:
+            raise ValueError('capacity must be positive')
+
+        self.rate = rate
+        self.period = period
+        self.capacity = capacity
+        self._tokens_per_second = rate / period
+
+        self._lock = threading.Lock()
+        self._clock = time.monotonic
+        self._tokens = capacity
+        self._updated_at = None
+
+    def _take(self, tokens, available, updated_at, now):
+        '''
+        Returns the number of tokens left after taking ``tokens`` at ``now``,
+        given the bucket held ``available`` tokens at ``updated_at``.
+        '''
+        if updated_at is not None:
+            available = min(
+                self.capacity,
+                available + (now - updated_at) * self._tokens_per_second)
+        return available - tokens
+
+    def reserve(self, tokens=1):
+        '''
+        Takes ``tokens`` tokens from the bucket and returns the number of
+        seconds the caller must wait before making its request. Never blocks.
+        '''
+        with self._lock:
+            now = self._clock()
+            self._tokens = self._take(
+                tokens, self._tokens, self._updated_at, now)
+            self._updated_at = now
+            remaining = self._tokens
+
+        if remaining >= 0:
+            return 0.0
+        return -remaining / self._tokens_per_second
+
+
+class FileTokenBucket(TokenBucket):
+    '''
+    Token bucket shared by every process on a host which uses the same
+    ``path``. The bucket's state is stored in the file, which is locked while
+    each reservation is made, so the combined request rate of all processes
+    stays within the budget. The file is created if it does not exist.
+
+    Only available on platforms which support ``fcntl``. Takes the same
+    parameters as :class:`TokenBucket`, and all processes sharing a file
+    should use the same ones.
+
+    :param path: Path of the file holding the bucket's state.
+    '''
+
+    _STATE = struct.Struct('<dd')
+
+    def __init__(self, path, rate, period=60.0, *, capacity=1):
+        if fcntl is None:
+            raise ValueError('FileTokenBucket requires fcntl')
+        super().__init__(rate, period, capacity=capacity)
+
+        self.path = path
+        # Processes can't share a monotonic clock
+        self._clock = time.time
+        self._fd = None
+        self._pid = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['_lock']
+        state['_fd'] = None
+        state['_pid'] = None
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._lock = threading.Lock()
+
+    def _file(self):
+        # Locks are held by open file descriptions, which forked processes
+        # share with their parent, so each process opens its own
+        pid = os.getpid()
+        if self._pid != pid:
+            self._fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+            self._pid = pid
+        return self._fd
+
+    def close(self):
+        '''
+        Closes this process's handle on the state file.
+        '''
+        with self._lock:
+            if self._fd is not None and self._pid == os.getpid():
+                os.close(self._fd)
+            self._fd = None
+            self._pid = None
+
+    def reserve(self, tokens=1):
+        # The thread lock is needed because file locks don't exclude threads
+        # sharing a file description
+        with self._lock:
+            fd = self._file()
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            try:
+                now = self._clock()
+                state = os.pread(fd, self._STATE.size, 0)
+                if len(state) == self._STATE.size:
+                    available, updated_at = self._STATE.unpack(state)
+                else:
+                    available, updated_at = self.capacity, None
+
+                remaining = self._take(tokens, available, updated_at, now)
+                os.pwrite(fd, self._STATE.pack(remaining, now), 0)
+            finally:
+                fcntl.flock(fd, fcntl.LOCK_UN)
+
+        if remaining >= 0:
+            return 0.0
+        return -remaining / self._tokens_per_second
+
+
+class RateLimiter:
+    '''
+    Paces client requests using a token bucket per :class:`EndpointClass`.
+    Each request takes a token from the :attr:`~EndpointClass.ALL` bucket, if
+    any, and from the bucket of its own endpoint class, if any, and waits for
+    whichever is furthest behind. Install it using
+    :meth:`~tda.client.Client.set_rate_limiter`.
+
+    :param buckets: ``dict`` from :class:`EndpointClass` to bucket. Buckets may
+                    be :class:`TokenBucket` objects, :class:`FileTokenBucket`
+                    objects, or any object with a compatible ``reserve()``
+                    method. Defaults to TDA's documented limit of 120 requests
+                    per minute for all requests.
+    '''
+
+    def __init__(self, buckets=None):
+        if buckets is None:
+            buckets = {EndpointClass.ALL: TokenBucket(120, 60.0)}
+
+        self._buckets = {}
+        for endpoint, bucket in buckets.items():
+            self._buckets[EndpointClass(endpoint)] = bucket
+
+        self._all_bucket = self._buckets.get(EndpointClass.ALL)
+
+    def reserve(self, method, path):
+        '''
+        Reserves tokens for a request and returns the number of seconds to wait
+        before making it.
+        '''
+        delay = 0.0
+        if self._all_bucket is not None:
+            delay = self._all_bucket.reserve()
+
+        bucket = self._buckets.get(endpoint_class(method, path))
+        if bucket is not None:
+            delay = max(delay, bucket.reserve())
+
+        return delay
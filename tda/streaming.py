@@ -3,20 +3,36 @@ from collections import defaultdict, deque
 from enum import Enum
 
 import asyncio
-import copy
 import datetime
+import functools
 import httpx
 import inspect
 import json
 import logging
+import random
 import tda
+import time
 import urllib.parse
 
+import websockets.exceptions
 import websockets.legacy.client as ws_client
 from websockets.extensions.permessage_deflate import ClientPerMessageDeflateFactory
 
 from .utils import EnumEnforcer, LazyLog
 
+# NumPy is only required for columnar level one handlers
+try:
+    import numpy as np
+except ImportError:  # pragma: no cover
+    np = None
+
+# orjson is only used by FastJsonStreamDecoder, which falls back to the json
+# module when it is not installed
+try:
+    import orjson
+except ImportError:  # pragma: no cover
+    orjson = None
+
 
 class StreamJsonDecoder(ABC):
     @abstractmethod
@@ -27,16 +43,169 @@ class StreamJsonDecoder(ABC):
         '''
         raise NotImplementedError()
 
+    def decode_json_bytes(self, raw):
+        '''
+        Parse UTF-8 encoded JSON bytes into a proper object. Called instead of
+        :meth:`decode_json_string` for frames which are read as bytes, such as
+        binary frames and frames replayed from a recording. Raises
+        ``JSONDecodeError`` on parse failure.
+
+        By default, decodes the bytes and calls :meth:`decode_json_string`.
+        Override this to parse bytes directly.
+        '''
+        return self.decode_json_string(raw.decode('utf-8'))
+
 
 class NaiveJsonStreamDecoder(StreamJsonDecoder):
     def decode_json_string(self, raw):
         return json.loads(raw)
 
+    def decode_json_bytes(self, raw):
+        return json.loads(raw)
+
+
+class FastJsonStreamDecoder(StreamJsonDecoder):
+    '''
+    Decodes messages with `orjson <https://github.com/ijl/orjson>`__ when it
+    is installed, parsing bytes without first decoding them to a string. Falls
+    back to the standard ``json`` module when ``orjson`` is not installed, and
+    for messages which ``orjson`` rejects but the standard module accepts, such
+    as those containing ``NaN``.
+    '''
+
+    def decode_json_string(self, raw):
+        if orjson is not None:
+            try:
+                return orjson.loads(raw)
+            except orjson.JSONDecodeError:
+                pass
+        return json.loads(raw)
+
+    def decode_json_bytes(self, raw):
+        return self.decode_json_string(raw)
+
+
+class StreamFrameRecorder(ABC):
+    @abstractmethod
+    def record_frame(self, raw, received_at):
+        '''
+        Called with every raw frame read from the stream, before it is
+        decoded, along with the time it was received in seconds since the
+        epoch. Called on the event loop, so this should not block for long.
+        '''
+        raise NotImplementedError()
+
 
 def get_logger():
     return logging.getLogger(__name__)
 
 
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return 'MISSING'
+
+    def __bool__(self):
+        return False
+
+    def __reduce__(self):
+        return 'MISSING'
+
+
+#: Value of the fields of a :class:`StreamRow` which were not present in the
+#: message it was built from. Evaluates as false.
+MISSING = _Missing()
+
+
+def _rebuild_row(field_enum_type, values):
+    row_class = field_enum_type.row_class()
+    row = row_class.__new__(row_class)
+    for name, value in values.items():
+        setattr(row, name, value)
+    return row
+
+
+class StreamRow:
+    '''
+    Base class of the row classes generated from field enums by
+    :meth:`~_BaseFieldEnum.row_class`. Each row holds a single content entry
+    of a stream message in slots named after the fields, rather than in a
+    ``dict``. Fields absent from the entry read as :data:`MISSING`.
+
+    Besides the fields, rows have the ``key`` (usually the symbol), ``seq``,
+    ``delayed``, ``assetMainType``, and ``cusip`` attributes sent alongside
+    the fields by some services. Any other keys of the entry are kept in a
+    ``dict`` under ``extra``.
+    '''
+
+    __slots__ = ()
+
+    # Set on generated classes
+    _field_enum_type = None
+    _field_names = frozenset()
+    _setters = {}
+
+    @classmethod
+    def from_content(cls, content):
+        '''
+        Builds a row from an unlabeled content entry.
+        '''
+        row = cls.__new__(cls)
+        setters = cls._setters
+        extra = None
+        for key, value in content.items():
+            setter = setters.get(key)
+            if setter is not None:
+                setter(row, value)
+            else:
+                if extra is None:
+                    extra = {}
+                extra[key] = value
+        if extra is not None:
+            row.extra = extra
+        return row
+
+    def __getattr__(self, name):
+        # Only called for unset slots and unknown attributes
+        if name in type(self)._field_names:
+            return MISSING
+        raise AttributeError('{!r} object has no attribute {!r}'.format(
+            type(self).__name__, name))
+
+    def to_dict(self):
+        '''
+        Returns the fields present in this row as a ``dict``, keyed by name.
+        '''
+        values = {}
+        for name in type(self).__slots__:
+            value = getattr(self, name)
+            if value is not MISSING:
+                values[name] = value
+        return values
+
+    def __eq__(self, other):
+        if type(other) is not type(self):
+            return NotImplemented
+        return self.to_dict() == other.to_dict()
+
+    __hash__ = None
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, ', '.join(
+            '{}={!r}'.format(name, value)
+            for name, value in self.to_dict().items()))
+
+    def __reduce__(self):
+        # Generated classes can't be pickled by reference, so rebuild them
+        # from their field enum, as when sent to a process pool
+        return _rebuild_row, (type(self)._field_enum_type, self.to_dict())
+
+
+# Keys sent alongside the numbered fields of content entries
+_ROW_META_KEYS = ('key', 'seq', 'delayed', 'assetMainType', 'cusip')
+
+
 class _BaseFieldEnum(Enum):
     @classmethod
     def all_fields(cls):
@@ -54,11 +223,52 @@ class _BaseFieldEnum(Enum):
 
     @classmethod
     def relabel_message(cls, old_msg, new_msg):
-        # Make a copy of the items so we can modify the dict during iteration
-        for old_key, value in list(old_msg.items()):
-            if old_key in cls.key_mapping():
-                new_key = cls.key_mapping()[old_key]
-                new_msg[new_key] = new_msg.pop(old_key)
+        key_mapping = cls.key_mapping()
+
+        # Make a copy of the keys so we can modify the dict during iteration
+        for old_key in [key for key in old_msg if key in key_mapping]:
+            new_msg[key_mapping[old_key]] = new_msg.pop(old_key)
+
+    @classmethod
+    def row_class(cls):
+        '''
+        Returns a :class:`StreamRow` subclass with a slot for each field,
+        generated on first use.
+        '''
+        try:
+            return cls._row_class
+        except AttributeError:
+            pass
+
+        field_names = tuple(cls.__members__)
+        slots = _ROW_META_KEYS + ('extra',) + field_names
+        name = cls.__name__.replace('Fields', 'Row')
+        row_class = type(name, (StreamRow,), {
+            '__slots__': slots,
+            '__qualname__': name,
+            '__module__': __name__,
+            '_field_enum_type': cls,
+            '_field_names': frozenset(slots),
+        })
+
+        setters = dict(
+            (key, getattr(row_class, key).__set__) for key in _ROW_META_KEYS)
+        for field_name, enum in cls.__members__.items():
+            setters[str(enum.value)] = getattr(row_class, field_name).__set__
+        row_class._setters = setters
+
+        cls._row_class = row_class
+        return row_class
+
+    @classmethod
+    def relabel_content(cls, content):
+        '''
+        Returns a relabeled copy of a single content entry, built in one pass
+        over its keys. Keys which are not field numbers are kept as-is. Values
+        are not copied.
+        '''
+        get = cls.key_mapping().get
+        return {get(key, key): value for key, value in content.items()}
 
 
 class UnexpectedResponse(Exception):
@@ -80,25 +290,695 @@ class UnparsableMessage(Exception):
         self.json_parse_exception = json_parse_exception
 
 
+class InlineExecution:
+    '''
+    Calls handlers directly on the event loop. Awaitables returned by async
+    handlers are run as tasks tracked by the client. This is the default.
+    '''
+    accepts_async = True
+
+    def run(self, func, msg):
+        return func(msg)
+
+
+class ThreadPoolExecution:
+    '''
+    Calls synchronous handlers in a thread pool, keeping slow handlers from
+    blocking the event loop. Handlers may be called concurrently, so they must
+    be thread safe.
+
+    :param executor: A ``concurrent.futures.ThreadPoolExecutor``. Defaults to
+                     the event loop's default executor, which is shared by all
+                     handlers using this policy.
+    '''
+    accepts_async = False
+
+    def __init__(self, executor=None):
+        self._executor = executor
+
+    def run(self, func, msg):
+        return asyncio.get_event_loop().run_in_executor(
+            self._executor, func, msg)
+
+
+class ProcessPoolExecution:
+    '''
+    Calls synchronous handlers in a process pool, for CPU-heavy handlers which
+    would otherwise contend for the interpreter lock. The handler and each
+    message are pickled and sent to a worker process, so the handler must be
+    a module-level function. Messages are sent as plain ``dict`` and ``list``
+    objects, which pickle cheaply.
+
+    :param executor: A ``concurrent.futures.ProcessPoolExecutor``.
+    '''
+    accepts_async = False
+
+    def __init__(self, executor):
+        self._executor = executor
+
+    def run(self, func, msg):
+        return asyncio.get_event_loop().run_in_executor(
+            self._executor, func, msg)
+
+
+class TaskExecution:
+    '''
+    Runs async handlers as tracked tasks, at most ``max_concurrency`` of which
+    run at the same time. Further messages wait for a running handler to
+    finish.
+    '''
+    accepts_async = True
+
+    def __init__(self, max_concurrency):
+        if max_concurrency < 1:
+            raise ValueError('max_concurrency must be at least 1')
+        self._max_concurrency = max_concurrency
+
+        # Created on first use so that it binds to the running event loop
+        self._semaphore = None
+
+    def run(self, func, msg):
+        h = func(msg)
+        if inspect.isawaitable(h):
+            return self._limit(h)
+        return h
+
+    async def _limit(self, awaitable):
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self._max_concurrency)
+        async with self._semaphore:
+            return await awaitable
+
+
+_DEFAULT_EXECUTION = InlineExecution()
+
+
 class _Handler:
-    def __init__(self, func, field_enum_type):
+    def __init__(self, func, field_enum_type, execution=None):
+        if execution is None:
+            execution = _DEFAULT_EXECUTION
+        if (not execution.accepts_async
+                and inspect.iscoroutinefunction(func)):
+            raise ValueError(
+                '{} cannot run async handlers'.format(
+                    type(execution).__name__))
+
         self._func = func
         self._field_enum_type = field_enum_type
+        self._execution = execution
+
+    # Detached handlers are never awaited by the dispatcher. Their awaitables
+    # are run as tracked tasks instead.
+    detached = False
 
-    def __call__(self, *args, **kwargs):
-        return self._func(*args, **kwargs)
+    # Field numbers the handler declared it uses, or None if it uses all of
+    # them. See StreamClient._declared_fields().
+    fields = None
+
+    # Awaitables returned by blocking handlers are awaited by handle_message()
+    # before it returns, rather than run as tasks, to apply backpressure.
+    blocking = False
+
+    def __call__(self, msg):
+        return self._execution.run(self._func, msg)
+
+    def labeling_key(self):
+        '''
+        Handlers with equal labeling keys produce identical labeled messages,
+        so a message only needs to be labeled once for all of them.
+        '''
+        return (type(self), self._field_enum_type)
 
     def label_message(self, msg):
-        if 'content' in msg:
-            new_msg = copy.deepcopy(msg)
-            for idx in range(len(msg['content'])):
-                self._field_enum_type.relabel_message(msg['content'][idx],
-                                                      new_msg['content'][idx])
+        if msg.get('content'):
+            relabel_content = self._field_enum_type.relabel_content
+
+            new_msg = dict(msg)
+            new_msg['content'] = [
+                relabel_content(content) for content in msg['content']]
             return new_msg
         else:
             return msg
 
 
+class _ConflatingHandler(_Handler):
+    '''
+    Handler which is never called again while a previous call is still
+    running. Updates arriving in the meantime are held per symbol and
+    delivered together once the running call finishes. With ``merge``, held
+    updates for a symbol are merged field by field, which suits level one
+    streams. Otherwise a newer update replaces the held one.
+    '''
+    detached = True
+
+    def __init__(self, func, field_enum_type, execution=None, *, merge):
+        super().__init__(func, field_enum_type, execution)
+        self._merge = merge
+        self._busy = False
+        self._pending = {}
+        self._pending_msg = None
+
+        self.conflated_count = 0
+        self.dropped_count = 0
+
+    def labeling_key(self):
+        # Labeled messages are never modified, so they can be shared with
+        # plain handlers
+        return (_Handler, self._field_enum_type)
+
+    def __call__(self, msg):
+        if self._busy:
+            self._hold(msg)
+            return None
+
+        # Updates left over from a failed call are older than this message,
+        # so deliver them merged with it rather than after it
+        if self._pending:
+            self._hold(msg)
+            msg = self._take_pending()
+
+        h = self._execution.run(self._func, msg)
+        if not inspect.isawaitable(h):
+            return h
+
+        self._busy = True
+        return self._run_and_drain(h)
+
+    async def _run_and_drain(self, h):
+        try:
+            await h
+            while self._pending:
+                h = self._execution.run(self._func, self._take_pending())
+                if inspect.isawaitable(h):
+                    await h
+        finally:
+            self._busy = False
+
+    def _hold(self, msg):
+        self._pending_msg = msg
+        for entry in msg.get('content', ()):
+            key = entry.get('key')
+            held = self._pending.get(key)
+            if held is None:
+                # Labeled entries are shared between handlers, so merge into
+                # a copy
+                self._pending[key] = dict(entry) if self._merge else entry
+            elif self._merge:
+                held.update(entry)
+                self.conflated_count += 1
+            else:
+                self._pending[key] = entry
+                self.dropped_count += 1
+
+    def _take_pending(self):
+        msg = dict(self._pending_msg)
+        msg['content'] = list(self._pending.values())
+        self._pending = {}
+        return msg
+
+
+class MessageStream:
+    '''
+    Asynchronous iterator over the messages of a single service, returned by
+    :meth:`StreamClient.messages`. Messages are buffered until they are
+    consumed. Iteration ends once the stream is closed.
+    '''
+
+    def __init__(self, client, service, symbols, max_queue_size, overflow,
+                 merge):
+        self._client = client
+        self._service = service
+        self._symbols = None if symbols is None else frozenset(symbols)
+        self._max_queue_size = max_queue_size
+        self._overflow = overflow
+        self._merge = merge
+
+        self._messages = deque()
+        self._pending = {}
+        self._pending_msg = None
+        self._ready = asyncio.Event()
+        self._space = asyncio.Event()
+        self._handler = None
+        self._closed = False
+
+        #: Number of messages dropped because the buffer was full
+        self.dropped_count = 0
+
+        #: Number of updates merged into, or replacing, a buffered update for
+        #: the same symbol
+        self.conflated_count = 0
+
+    def _put(self, msg):
+        if self._closed:
+            return None
+
+        if self._symbols is not None:
+            content = [entry for entry in msg.get('content', ())
+                       if entry.get('key') in self._symbols]
+            if not content:
+                return None
+            # Labeled messages are shared between handlers, so filter a copy
+            msg = dict(msg)
+            msg['content'] = content
+
+        if self._overflow == StreamClient.MessageOverflow.CONFLATE:
+            self._hold(msg)
+            self._ready.set()
+            return None
+
+        if len(self._messages) >= self._max_queue_size:
+            if self._overflow == StreamClient.MessageOverflow.BLOCK:
+                return self._put_when_space(msg)
+            self._messages.popleft()
+            self.dropped_count += 1
+
+        self._messages.append(msg)
+        self._ready.set()
+        return None
+
+    async def _put_when_space(self, msg):
+        while (len(self._messages) >= self._max_queue_size
+               and not self._closed):
+            self._space.clear()
+            await self._space.wait()
+
+        if not self._closed:
+            self._messages.append(msg)
+            self._ready.set()
+
+    def _hold(self, msg):
+        self._pending_msg = msg
+        for entry in msg.get('content', ()):
+            key = entry.get('key')
+            held = self._pending.get(key)
+            if held is None:
+                self._pending[key] = dict(entry) if self._merge else entry
+            else:
+                if self._merge:
+                    held.update(entry)
+                else:
+                    self._pending[key] = entry
+                self.conflated_count += 1
+
+    def _take_pending(self):
+        msg = dict(self._pending_msg)
+        msg['content'] = list(self._pending.values())
+        self._pending = {}
+        return msg
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        while True:
+            if self._closed:
+                raise StopAsyncIteration
+
+            if self._pending:
+                return self._take_pending()
+            if self._messages:
+                msg = self._messages.popleft()
+                self._space.set()
+                return msg
+
+            self._ready.clear()
+            await self._ready.wait()
+
+    def close(self):
+        '''
+        Stops receiving messages and ends iteration. Buffered messages are
+        discarded.
+        '''
+        if self._closed:
+            return
+        self._closed = True
+
+        handlers = self._client._handlers[self._service]
+        if self._handler in handlers:
+            handlers.remove(self._handler)
+
+        self._messages.clear()
+        self._pending = {}
+        self._ready.set()
+        self._space.set()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class ColumnarBatch:
+    '''
+    A single level one data message in columnar form, as delivered to handlers
+    registered with ``columnar=True``. Row ``i`` of every array corresponds to
+    ``symbols[i]``.
+    '''
+
+    def __init__(self, service, timestamp, command, symbols, columns, masks):
+        #: Service name, such as ``QUOTE`` or ``LEVELONE_FUTURES``
+        self.service = service
+
+        #: Message timestamp in milliseconds since epoch
+        self.timestamp = timestamp
+
+        #: Stream command, usually ``SUBS``
+        self.command = command
+
+        #: Array of the symbols contained in this message
+        self.symbols = symbols
+
+        #: ``dict`` mapping each symbol to its row
+        self.symbol_index = {symbol: idx for idx, symbol in enumerate(symbols)}
+
+        #: ``dict`` mapping field enums to arrays of values. Only fields which
+        #: are present for at least one symbol have a column. Numeric fields
+        #: are ``float64`` arrays holding ``nan`` where the field is missing,
+        #: boolean fields are ``bool`` arrays holding ``False`` where missing,
+        #: and all others are ``object`` arrays holding ``None``.
+        self.columns = columns
+
+        #: ``dict`` mapping field enums to ``bool`` arrays which are ``True``
+        #: wherever the field was present in this message. Level one messages
+        #: only carry fields which changed since the previous update.
+        self.masks = masks
+
+    def __len__(self):
+        return len(self.symbols)
+
+    def row(self, symbol):
+        '''
+        Returns a ``dict`` of the fields present for ``symbol`` in this
+        message, keyed by field enum.
+        '''
+        idx = self.symbol_index[symbol]
+        return {field: column[idx] for field, column in self.columns.items()
+                if self.masks[field][idx]}
+
+
+class _ColumnarHandler(_Handler):
+    # Marks values absent from a row while columns are being collected
+    _MISSING = object()
+
+    def __init__(self, func, field_enum_type, execution=None):
+        if np is None:
+            raise ImportError(
+                'columnar handlers require numpy, which is not installed')
+        super().__init__(func, field_enum_type, execution)
+
+        self._members = dict(
+            (str(enum.value), enum) for enum in field_enum_type)
+
+    def label_message(self, msg):
+        content = msg.get('content') or []
+        num_rows = len(content)
+        missing = self._MISSING
+
+        # Transpose rows into per-field lists in a single pass
+        symbols = []
+        values = {}
+        for idx, entry in enumerate(content):
+            symbols.append(entry.get('key'))
+            for key, value in entry.items():
+                column = values.get(key)
+                if column is None:
+                    column = values[key] = [missing] * num_rows
+                column[idx] = value
+
+        columns = {}
+        masks = {}
+        for key, column in values.items():
+            field = self._members.get(key)
+            if field is None:
+                continue
+
+            mask = np.fromiter((value is not missing for value in column),
+                               dtype=bool, count=num_rows)
+            columns[field] = self._to_array(column, missing)
+            masks[field] = mask
+
+        return ColumnarBatch(
+            msg.get('service'), msg.get('timestamp'), msg.get('command'),
+            np.array(symbols, dtype=object), columns, masks)
+
+    @staticmethod
+    def _to_array(column, missing):
+        present = [value for value in column if value is not missing]
+        if all(type(value) is bool for value in present):
+            return np.array([value is not missing and value
+                             for value in column], dtype=bool)
+        if all(isinstance(value, (int, float)) and type(value) is not bool
+               for value in present):
+            return np.array([np.nan if value is missing else value
+                             for value in column], dtype=np.float64)
+        return np.array([None if value is missing else value
+                         for value in column], dtype=object)
+
+
+class _RowHandler(_Handler):
+    '''
+    Handler which receives content entries as :class:`StreamRow` objects.
+    '''
+
+    def label_message(self, msg):
+        if msg.get('content'):
+            from_content = self._field_enum_type.row_class().from_content
+
+            new_msg = dict(msg)
+            new_msg['content'] = [
+                from_content(content) for content in msg['content']]
+            return new_msg
+        else:
+            return msg
+
+
+def _level_one_handler(func, field_enum_type, columnar, conflate, execution,
+                       typed=False):
+    if columnar and conflate:
+        raise ValueError('columnar handlers cannot be conflated')
+    if typed and (columnar or conflate):
+        raise ValueError('typed handlers cannot be columnar or conflated')
+    if columnar:
+        return _ColumnarHandler(func, field_enum_type, execution)
+    if typed:
+        return _RowHandler(func, field_enum_type, execution)
+    if conflate:
+        return _ConflatingHandler(
+            func, field_enum_type, execution, merge=True)
+    return _Handler(func, field_enum_type, execution)
+
+
+class _Histogram:
+    '''
+    Histogram of durations with exponentially sized buckets. Bucket ``i``
+    holds values of less than ``2 ** i`` microseconds, so percentiles are
+    reported as the upper bound of their bucket, and are accurate to within a
+    factor of two.
+    '''
+
+    _NUM_BUCKETS = 40
+
+    def __init__(self):
+        self.buckets = [0] * self._NUM_BUCKETS
+        self.count = 0
+        self.total = 0.0
+        self.min = None
+        self.max = None
+
+    def record(self, seconds):
+        if seconds < 0:
+            seconds = 0.0
+        index = min(int(seconds * 1e6).bit_length(), self._NUM_BUCKETS - 1)
+        self.buckets[index] += 1
+        self.count += 1
+        self.total += seconds
+        if self.min is None or seconds < self.min:
+            self.min = seconds
+        if self.max is None or seconds > self.max:
+            self.max = seconds
+
+    def percentile(self, fraction):
+        threshold = fraction * self.count
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= threshold:
+                return min((2 ** index) / 1e6, self.max)
+        return self.max  # pragma: no cover
+
+    def snapshot(self):
+        if not self.count:
+            return {'count': 0}
+        return {
+            'count': self.count,
+            'mean': self.total / self.count,
+            'min': self.min,
+            'max': self.max,
+            'p50': self.percentile(0.5),
+            'p90': self.percentile(0.9),
+            'p99': self.percentile(0.99),
+        }
+
+
+class _ServiceStats:
+    _HISTOGRAMS = ('socket_wait', 'decode', 'label', 'handler',
+                   'server_latency')
+
+    def __init__(self):
+        self.messages = 0
+        self.bytes = 0
+        for name in self._HISTOGRAMS:
+            setattr(self, name, _Histogram())
+
+    def snapshot(self):
+        snapshot = {'messages': self.messages, 'bytes': self.bytes}
+        for name in self._HISTOGRAMS:
+            snapshot[name] = getattr(self, name).snapshot()
+        return snapshot
+
+
+class _Instrumentation:
+    '''
+    Timings and counters collected while instrumentation is enabled. See
+    :meth:`StreamClient.enable_instrumentation`.
+    '''
+
+    def __init__(self):
+        self.started_at = time.monotonic()
+        self.services = defaultdict(_ServiceStats)
+        self.max_overflow_depth = 0
+
+    def record_frame(self, msg, raw, socket_wait, decode):
+        # Frames are attributed to the service of their first entry. In
+        # practice, data frames only ever contain a single service.
+        if 'data' in msg and msg['data']:
+            service = msg['data'][0].get('service')
+        elif 'response' in msg and msg['response']:
+            service = msg['response'][0].get('service')
+        else:
+            service = 'NOTIFY'
+
+        stats = self.services[service]
+        # The legacy websockets client returns text frames as str
+        if isinstance(raw, str):
+            stats.bytes += len(raw.encode('utf-8'))
+        else:
+            stats.bytes += len(raw)
+        stats.socket_wait.record(socket_wait)
+        stats.decode.record(decode)
+
+        now_ms = time.time() * 1000
+        for d in msg.get('data', ()):
+            stats = self.services[d.get('service')]
+            stats.messages += 1
+            if 'timestamp' in d:
+                stats.server_latency.record((now_ms - d['timestamp']) / 1000)
+
+    def observe_overflow(self, depth):
+        if depth > self.max_overflow_depth:
+            self.max_overflow_depth = depth
+
+
+class _Watchdog:
+    '''
+    Times at which heartbeats and data were last received, and the thresholds
+    they are checked against. See :meth:`StreamClient.start_watchdog`.
+    '''
+
+    def __init__(self, heartbeat_timeout, data_timeout, service_timeouts,
+                 on_stall, reconnect):
+        self.heartbeat_timeout = heartbeat_timeout
+        self.data_timeout = data_timeout
+        self.service_timeouts = service_timeouts
+        self.on_stall = on_stall
+        self.reconnect = reconnect
+
+        self.symbol_times = defaultdict(dict)
+        self.reset()
+
+    def reset(self):
+        '''
+        Restarts all timers, as after (re)connecting.
+        '''
+        now = time.monotonic()
+        self.started_at = now
+        self.last_heartbeat = now
+        self.service_times = {}
+
+        # Stalls which were already reported, with None standing for
+        # heartbeats. Cleared when the stalled feed resumes.
+        self.stalled = set()
+
+    def observe(self, msg):
+        now = time.monotonic()
+        for d in msg.get('notify', ()):
+            if 'heartbeat' in d:
+                self.last_heartbeat = now
+                self.stalled.discard(None)
+
+        for d in msg.get('data', ()):
+            service = d.get('service')
+            self.service_times[service] = now
+            self.stalled.discard(service)
+
+            symbol_times = self.symbol_times[service]
+            for entry in d.get('content', ()):
+                key = entry.get('key')
+                if key is not None:
+                    symbol_times[key] = now
+
+    def service_age(self, service, now):
+        return now - self.service_times.get(service, self.started_at)
+
+    def new_stalls(self, services):
+        '''
+        Returns ``(service, age)`` pairs for feeds which exceeded their
+        threshold since the last check, with a service of ``None`` for
+        heartbeats, and marks them as reported.
+        '''
+        now = time.monotonic()
+        stalls = []
+
+        age = now - self.last_heartbeat
+        if (self.heartbeat_timeout is not None
+                and age > self.heartbeat_timeout):
+            stalls.append((None, age))
+
+        timeouts = dict.fromkeys(services, self.data_timeout)
+        timeouts.update(self.service_timeouts)
+        for service, timeout in timeouts.items():
+            if timeout is None:
+                continue
+            age = self.service_age(service, now)
+            if age > timeout:
+                stalls.append((service, age))
+
+        stalls = [stall for stall in stalls if stall[0] not in self.stalled]
+        self.stalled.update(service for service, _ in stalls)
+        return stalls
+
+
+class _CommandBatch:
+    def __init__(self, client):
+        self._client = client
+
+    async def __aenter__(self):
+        if self._client._batch is not None:
+            raise ValueError('batches cannot be nested')
+        self._client._batch = []
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        batch = self._client._batch
+        self._client._batch = None
+
+        if exc_type is None and batch:
+            await self._client._send_requests(
+                [request for request, _ in batch],
+                [on_success for _, on_success in batch])
+
+
 class StreamClient(EnumEnforcer):
 
     def __init__(self, client, *, account_id=None,
@@ -121,6 +1001,14 @@ class StreamClient(EnumEnforcer):
         self._request_id = 0
         self._handlers = defaultdict(list)
 
+        # Commands awaiting a response, keyed by request ID. Values are tuples
+        # of the future resolved by the response, the service, and the command.
+        self._pending_responses = {}
+
+        # While a batch is open, commands are collected here instead of being
+        # sent. See batch().
+        self._batch = None
+
         # When listening for responses, we sometimes encounter non-response
         # messages. Since this happens outside the context of the handler
         # dispatcher, we cannot handle these messages. However, we still need to
@@ -136,8 +1024,47 @@ class StreamClient(EnumEnforcer):
         # Initialize the JSON parser to be the naive parser which directly calls
         # ``json.loads``
         self.json_decoder = NaiveJsonStreamDecoder()
+        self._frame_recorder = None
+
+        # Timings and counters, collected only while instrumentation is
+        # enabled. See enable_instrumentation().
+        self._instrumentation = None
+
+        # Stall detection state. See start_watchdog().
+        self._watchdog = None
+        self._watchdog_task = None
+        self._watchdog_close_task = None
         self._lock = asyncio.Lock()
 
+        # Tasks running async handlers called from handle_message(), tracked
+        # so that their exceptions are reported. See
+        # set_handler_exception_callback().
+        self._handler_tasks = set()
+        self._handler_exception_callback = None
+
+        # Background dispatch state. See start_background_dispatch().
+        self._reader_task = None
+        self._dispatch_queues = {}
+        self._dispatcher_tasks = []
+        self._dispatch_max_queue_size = None
+        self._dispatch_error = None
+        self._dropped_message_counts = defaultdict(int)
+
+        # Reconnect state. Subscriptions and the QOS level are recorded as they
+        # succeed so that they can be replayed after reconnecting. See
+        # enable_auto_reconnect().
+        self._principals = None
+        self._websocket_connect_args = None
+        self._subscriptions = {}
+        self._qos_level = None
+        self._reconnect_policy = None
+        self._reconnect_metrics = {
+            'reconnects': 0,
+            'failed_attempts': 0,
+            'last_reconnect_seconds': None,
+            'total_reconnect_seconds': 0.0,
+        }
+
     def set_json_decoder(self, json_decoder):
         '''
         Sets a custom JSON decoder.
@@ -151,6 +1078,27 @@ class StreamClient(EnumEnforcer):
                              'tda.contrib.util.StreamJsonDecoder')
         self.json_decoder = json_decoder
 
+    def set_frame_recorder(self, recorder):
+        '''
+        Sets a recorder which is passed every raw frame read from the stream.
+        See :class:`StreamFrameRecorder` for details. Pass ``None`` to stop
+        recording.
+        '''
+        if recorder is not None and not isinstance(
+                recorder, StreamFrameRecorder):
+            raise ValueError('Frame recorder must be a subclass of ' +
+                             'tda.streaming.StreamFrameRecorder')
+        self._frame_recorder = recorder
+
+    def set_replay_source(self, source):
+        '''
+        Reads frames from ``source`` instead of the stream, for replaying
+        recorded sessions. The source must implement an async ``recv()``
+        method returning raw frames, as a websocket does. Handlers then receive
+        the replayed messages through :meth:`handle_message` as usual.
+        '''
+        self._socket = source
+
     def req_num(self):
         self.request_number += 1
         return self.request_number
@@ -176,19 +1124,50 @@ class StreamClient(EnumEnforcer):
             self.logger.debug(
                 'Receive %s: Returning message from overflow: %s',
                 self.req_num(), LazyLog(lambda: json.dumps(ret, indent=4)))
+            return ret
         else:
-            raw = await self._socket.recv()
-            try:
-                ret = self.json_decoder.decode_json_string(raw)
-            except json.decoder.JSONDecodeError as e:
-                msg = ('Failed to parse message. This often happens with ' +
-                       'unknown symbols or other error conditions. Full ' +
-                       'message text: ' + raw)
-                raise UnparsableMessage(raw, e, msg)
+            return await self._receive_from_socket()
 
-            self.logger.debug(
-                'Receive %s: Returning message from stream: %s',
-                self.req_num(), LazyLog(lambda: json.dumps(ret, indent=4)))
+    async def _receive_from_socket(self):
+        if self._socket is None:
+            raise ValueError(
+                'Socket not open. Did you forget to call login()?')
+
+        instrumentation = self._instrumentation
+        if instrumentation is not None:
+            wait_start = time.perf_counter()
+
+        raw = await self._socket.recv()
+        if self._frame_recorder is not None:
+            self._frame_recorder.record_frame(raw, time.time())
+
+        if instrumentation is not None:
+            decode_start = time.perf_counter()
+
+        try:
+            if isinstance(raw, str):
+                ret = self.json_decoder.decode_json_string(raw)
+            else:
+                ret = self.json_decoder.decode_json_bytes(raw)
+        except (json.decoder.JSONDecodeError, UnicodeDecodeError) as e:
+            text = raw if isinstance(raw, str) else raw.decode(
+                'utf-8', errors='replace')
+            msg = ('Failed to parse message. This often happens with ' +
+                   'unknown symbols or other error conditions. Full ' +
+                   'message text: ' + text)
+            raise UnparsableMessage(raw, e, msg)
+
+        if instrumentation is not None:
+            decode_end = time.perf_counter()
+            instrumentation.record_frame(
+                ret, raw, decode_start - wait_start, decode_end - decode_start)
+
+        if self._watchdog is not None:
+            self._watchdog.observe(ret)
+
+        self.logger.debug(
+            'Receive %s: Returning message from stream: %s',
+            self.req_num(), LazyLog(lambda: json.dumps(ret, indent=4)))
 
         return ret
 
@@ -230,13 +1209,11 @@ class StreamClient(EnumEnforcer):
         wss_url = 'wss://{}/ws'.format(
             principals['streamerInfo']['streamerSocketUrl'])
 
-        if 'extensions' not in websocket_connect_args:
-            websocket_connect_args['extensions'] = [
-                    ClientPerMessageDeflateFactory()
-            ]
-        else:
-            websocket_connect_args['extensions'].append(
-                    ClientPerMessageDeflateFactory())
+        # Build a new extensions list rather than appending to the caller's,
+        # since the same arguments are reused when reconnecting
+        websocket_connect_args['extensions'] = (
+            list(websocket_connect_args.get('extensions', [])) +
+            [ClientPerMessageDeflateFactory()])
 
         if self._ssl_context:
             websocket_connect_args['ssl'] = self._ssl_context
@@ -262,60 +1239,151 @@ class StreamClient(EnumEnforcer):
 
         return request, request_id
 
-    async def _await_response(self, request_id, service, command):
-        deferred_messages = []
+    async def _submit(self, request, on_success=None):
+        '''
+        Sends a command and waits for its response, or adds it to the open
+        batch. ``on_success`` is called once the command has succeeded.
+        '''
+        if self._batch is not None:
+            self._batch.append((request, on_success))
+        else:
+            await self._send_requests([request], [on_success])
 
-        # Context handler to ensure we always append the deferred messages,
-        # regardless of how we exit the await loop below
-        class WriteDeferredMessages:
-            def __init__(self, this_client):
-                self.this_client = this_client
+    async def _send_requests(self, requests, callbacks=None):
+        '''
+        Sends the requests in a single message and waits until all of them
+        have been answered. Other commands may be sent and answered while this
+        one is in flight, and data messages keep flowing meanwhile.
 
-            def __enter__(self):
-                return self
+        ``callbacks`` optionally holds, for each request, a function to call if
+        that request succeeds, or ``None``.
+        '''
+        request_ids = []
+        for request in requests:
+            request_id = int(request['requestid'])
+            future = asyncio.get_event_loop().create_future()
+            self._pending_responses[request_id] = (
+                future, request['service'], request['command'])
+            request_ids.append(request_id)
 
-            def __exit__(self, exc_type, exc_val, exc_tb):
-                self.this_client._overflow_items.extendleft(deferred_messages)
+        try:
+            await self._send({'requests': requests})
+        except BaseException:
+            for request_id in request_ids:
+                self._pending_responses.pop(request_id, None)
+            raise
 
-        with WriteDeferredMessages(self):
-            while True:
-                resp = await self._receive()
-
-                if 'response' not in resp:
-                    deferred_messages.append(resp)
-                    continue
-
-                # Validate request ID
-                resp_request_id = int(resp['response'][0]['requestid'])
-                if resp_request_id != request_id:
-                    raise UnexpectedResponse(
-                        resp, 'unexpected requestid: {}'.format(
-                            resp_request_id))
-
-                # Validate service
-                resp_service = resp['response'][0]['service']
-                if resp_service != service:
-                    raise UnexpectedResponse(
-                        resp, 'unexpected service: {}'.format(
-                            resp_service))
-
-                # Validate command
-                resp_command = resp['response'][0]['command']
-                if resp_command != command:
-                    raise UnexpectedResponse(
-                        resp, 'unexpected command: {}'.format(
-                            resp_command))
-
-                # Validate response code
-                resp_code = resp['response'][0]['content']['code']
-                if resp_code != 0:
-                    raise UnexpectedResponseCode(
-                        resp,
-                        'unexpected response code: {}, msg is \'{}\''.format(
-                            resp_code,
-                            resp['response'][0]['content']['msg']))
+        await self._await_responses(request_ids, callbacks)
 
-                break
+    async def _await_responses(self, request_ids, callbacks=None):
+        '''
+        Waits until a response has been received for each request ID and calls
+        the callbacks of the requests which succeeded. Raises the error for
+        the first request which failed, if any.
+        '''
+        futures = [self._pending_responses[request_id][0]
+                   for request_id in request_ids]
+
+        try:
+            for future in futures:
+                while not future.done():
+                    if (self._reader_task is not None and
+                            asyncio.current_task() is not self._reader_task):
+                        # The background reader owns the socket and resolves
+                        # the future when the response arrives
+                        await asyncio.wait([future])
+                    else:
+                        await self._read_until_done(future)
+        finally:
+            # Give up on requests whose responses we are no longer waiting for
+            for request_id, future in zip(request_ids, futures):
+                if not future.done():
+                    self._pending_responses.pop(request_id, None)
+                    future.cancel()
+
+        # Retrieve every exception so none are reported as unhandled
+        errors = [future.exception() for future in futures]
+
+        for error, callback in zip(errors, callbacks or ()):
+            if error is None and callback is not None:
+                callback()
+
+        for error in errors:
+            if error is not None:
+                raise error
+
+    async def _read_until_done(self, future):
+        '''
+        Reads one message from the socket on behalf of a command waiting for a
+        response. Data messages read along the way are deferred to the
+        overflow list so that handle_message() can deliver them.
+        '''
+        async with self._lock:
+            # Another command may have read our response while we waited
+            if future.done():
+                return
+            msg = await self._receive_from_socket()
+
+        if 'response' in msg:
+            self._resolve_responses(msg)
+        else:
+            self._overflow_items.appendleft(msg)
+            if self._instrumentation is not None:
+                self._instrumentation.observe_overflow(
+                    len(self._overflow_items))
+
+    def _resolve_responses(self, resp):
+        '''
+        Resolves the futures of all pending commands answered by ``resp``,
+        failing them if the response is not what the command expected. Raises
+        if ``resp`` answers a request which is not pending.
+        '''
+        for response in resp['response']:
+            # Validate request ID
+            resp_request_id = int(response['requestid'])
+            try:
+                future, service, command = self._pending_responses.pop(
+                    resp_request_id)
+            except KeyError:
+                raise UnexpectedResponse(
+                    resp, 'unexpected requestid: {}'.format(
+                        resp_request_id))
+            if future.done():
+                continue
+
+            # Validate service
+            resp_service = response['service']
+            if resp_service != service:
+                future.set_exception(UnexpectedResponse(
+                    resp, 'unexpected service: {}'.format(
+                        resp_service)))
+                continue
+
+            # Validate command
+            resp_command = response['command']
+            if resp_command != command:
+                future.set_exception(UnexpectedResponse(
+                    resp, 'unexpected command: {}'.format(
+                        resp_command)))
+                continue
+
+            # Validate response code
+            resp_code = response['content']['code']
+            if resp_code != 0:
+                future.set_exception(UnexpectedResponseCode(
+                    resp,
+                    'unexpected response code: {}, msg is \'{}\''.format(
+                        resp_code, response['content']['msg'])))
+                continue
+
+            future.set_result(response)
+
+    def _fail_pending_responses(self, error):
+        pending = self._pending_responses
+        self._pending_responses = {}
+        for future, _, _ in pending.values():
+            if not future.done():
+                future.set_exception(error)
 
     async def _service_op(self, symbols, service, command, field_type=None,
                           *, fields=None):
@@ -325,56 +1393,1068 @@ class StreamClient(EnumEnforcer):
 
         if field_type is not None:
             if fields is None:
-                fields = field_type.all_fields()
-
-            fields = sorted(self.convert_enum_iterable(fields, field_type))
-            parameters['fields'] = ','.join(str(f) for f in fields)
+                parameters['fields'] = self._declared_fields(
+                    service, field_type)
+            if parameters.get('fields') is None:
+                parameters['fields'] = self._fields_parameter(
+                    field_type, fields)
 
         request, request_id = self._make_request(
             service=service, command=command,
             parameters=parameters)
 
-        async with self._lock:
-            await self._send({'requests': [request]})
-            await self._await_response(request_id, service, command)
+        await self._submit(request, lambda: self._record_subscription(
+            service, command, parameters))
+
+    def _fields_parameter(self, field_type, fields):
+        if fields is None:
+            fields = field_type.all_fields()
+
+        fields = sorted(self.convert_enum_iterable(fields, field_type))
+        return ','.join(str(f) for f in fields)
+
+    def _add_handler(self, service, handler, fields):
+        if fields is not None:
+            fields = set(self.convert_enum_iterable(
+                fields, handler._field_enum_type))
+            fields.add(handler._field_enum_type.SYMBOL.value)
+            handler.fields = frozenset(fields)
+        self._handlers[service].append(handler)
+
+    def _declared_fields(self, service, field_type):
+        '''
+        Returns the fields parameter covering every field used by the
+        service's handlers, or ``None`` if none of them declared their fields.
+        Handlers which did not declare fields use all of them.
+        '''
+        handlers = self._handlers.get(service, ())
+        if not any(handler.fields is not None for handler in handlers):
+            return None
+        if any(handler.fields is None for handler in handlers):
+            return self._fields_parameter(field_type, None)
+
+        fields = set()
+        for handler in handlers:
+            fields.update(handler.fields)
+        return ','.join(str(f) for f in sorted(fields))
+
+    async def _submit_all(self, requests):
+        '''
+        Sends ``(request, on_success)`` pairs in a single message and waits for
+        their responses, or adds them to the open batch.
+        '''
+        if self._batch is not None:
+            self._batch.extend(requests)
+        elif requests:
+            await self._send_requests(
+                [request for request, _ in requests],
+                [on_success for _, on_success in requests])
+
+    def _record_subscription(self, service, command, parameters):
+        '''
+        Updates the record of active subscriptions after a successful command.
+        '''
+        keys = [key for key in parameters['keys'].split(',') if key]
+
+        if command == 'SUBS':
+            self._subscriptions[service] = {
+                'keys': dict.fromkeys(keys),
+                'fields': parameters.get('fields'),
+            }
+        elif command == 'ADD':
+            subscription = self._subscriptions.setdefault(
+                service, {'keys': {}, 'fields': None})
+            subscription['keys'].update(dict.fromkeys(keys))
+            if 'fields' in parameters:
+                subscription['fields'] = parameters['fields']
+        elif command == 'UNSUBS':
+            subscription = self._subscriptions.get(service)
+            if subscription is not None:
+                for key in keys:
+                    subscription['keys'].pop(key, None)
+                if not subscription['keys']:
+                    del self._subscriptions[service]
+
+    def _invoke_handlers(self, d, is_notify, blocking=None):
+        '''
+        Calls every handler registered for the service of ``d``. Returns the
+        awaitables produced by async handlers, leaving it to the caller to
+        decide how to await them. If ``blocking`` is a list, awaitables
+        produced by blocking handlers are appended to it instead.
+        '''
+        stats = None
+        if self._instrumentation is not None:
+            stats = self._instrumentation.services[d['service']]
+
+        awaitables = []
+        labeled_messages = {}
+        for handler in self._handlers[d['service']]:
+            if is_notify:
+                labeled_d = d
+            else:
+                labeled_d = self._label_for_handler(
+                    handler, d, labeled_messages, stats)
+
+            if stats is None:
+                h = handler(labeled_d)
+            else:
+                handler_start = time.perf_counter()
+                h = handler(labeled_d)
+                stats.handler.record(time.perf_counter() - handler_start)
+
+            # Check if h is an awaitable. This allows for both sync and async
+            # handlers
+            if inspect.isawaitable(h):
+                self._collect_awaitable(handler, h, awaitables, blocking)
+        return awaitables
+
+    @staticmethod
+    def _label_for_handler(handler, d, labeled_messages, stats):
+        '''
+        Returns ``d`` labeled for ``handler``. Handlers of the same service
+        share a single labeled copy of the message, cached in
+        ``labeled_messages``.
+        '''
+        key = handler.labeling_key()
+        labeled_d = labeled_messages.get(key)
+        if labeled_d is not None:
+            return labeled_d
+
+        if stats is None:
+            labeled_d = handler.label_message(d)
+        else:
+            label_start = time.perf_counter()
+            labeled_d = handler.label_message(d)
+            stats.label.record(time.perf_counter() - label_start)
+        labeled_messages[key] = labeled_d
+        return labeled_d
+
+    def _collect_awaitable(self, handler, h, awaitables, blocking):
+        '''
+        Routes an awaitable produced by ``handler`` according to its
+        execution policy. See :meth:`_invoke_handlers`.
+        '''
+        if handler.detached:
+            self._track_handler(h)
+        elif handler.blocking and blocking is not None:
+            blocking.append(h)
+        else:
+            awaitables.append(h)
 
     async def handle_message(self):
+        if self._reader_task is not None:
+            raise ValueError(
+                'cannot call handle_message() while background dispatch is ' +
+                'running')
+
         async with self._lock:
-            msg = await self._receive()
+            try:
+                msg = await self._receive()
+            except websockets.exceptions.ConnectionClosed as e:
+                self._connection_lost(e)
+                msg = None
+
+        # The connection dropped. Reconnect and let the caller come back for
+        # the next message.
+        if msg is None:
+            await self._reconnect()
+            return
 
         # response
         if 'response' in msg:
-            raise UnexpectedResponse(msg,
-                                     'unexpected response code during message handling: {}, msg is \'{}\''.format(
-                                         msg['response'][0]['content']['code'],
-                                         msg['response'][0]['content']['msg']))
+            self._handle_responses(msg)
+            return
+
+        # Awaitables of handlers which apply backpressure, such as message
+        # streams with a full buffer
+        blocking = []
+        self._dispatch_message(msg, blocking)
 
+        for h in blocking:
+            await h
+
+    def _handle_responses(self, msg):
+        '''
+        Resolves responses read by :meth:`handle_message`, raising if they
+        don't answer in-flight commands.
+        '''
+        # Responses to in-flight commands may be read here when a command is
+        # waiting for its response concurrently
+        if all(int(response['requestid']) in self._pending_responses
+               for response in msg['response']):
+            self._resolve_responses(msg)
+            return
+
+        raise UnexpectedResponse(msg,
+                                 'unexpected response code during message handling: {}, msg is \'{}\''.format(
+                                     msg['response'][0]['content']['code'],
+                                     msg['response'][0]['content']['msg']))
+
+    def _dispatch_message(self, msg, blocking):
+        '''
+        Calls the handlers of the data and notifications in ``msg``, tracking
+        the awaitables they produce, other than those of blocking handlers,
+        which are appended to ``blocking``.
+        '''
         # data
-        if 'data' in msg:
-            for d in msg['data']:
-                if d['service'] in self._handlers:
-                    for handler in self._handlers[d['service']]:
-                        labeled_d = handler.label_message(d)
-                        h = handler(labeled_d)
-
-                        # Check if h is an awaitable, if so schedule it
-                        # This allows for both sync and async handlers
-                        if inspect.isawaitable(h):
-                            asyncio.ensure_future(h)
+        for d in msg.get('data', ()):
+            if d['service'] in self._handlers:
+                for h in self._invoke_handlers(
+                        d, is_notify=False, blocking=blocking):
+                    self._track_handler(h)
 
         # notify
-        if 'notify' in msg:
-            for d in msg['notify']:
-                if 'heartbeat' in d:
-                    pass
+        for d in msg.get('notify', ()):
+            if 'heartbeat' not in d:
+                for h in self._invoke_handlers(
+                        d, is_notify=True, blocking=blocking):
+                    self._track_handler(h)
+
+    ##########################################################################
+    # Instrumentation
+
+    def enable_instrumentation(self):
+        '''
+        Starts collecting timings and counters for every message, discarding
+        any collected previously. Instrumentation is disabled by default and
+        costs next to nothing while disabled. See
+        :meth:`instrumentation_snapshot`.
+        '''
+        self._instrumentation = _Instrumentation()
+
+    def disable_instrumentation(self):
+        '''
+        Stops collecting timings and counters.
+        '''
+        self._instrumentation = None
+
+    def instrumentation_snapshot(self):
+        '''
+        Returns the timings and counters collected since instrumentation was
+        enabled, or ``None`` if it is disabled. The snapshot is a ``dict``
+        with the following keys:
+
+         * ``elapsed_seconds``: Time since instrumentation was enabled.
+         * ``services``: Statistics for each service, described below.
+         * ``overflow_queue_depth``: Number of data messages read while
+           waiting for command responses which have not been handled yet.
+         * ``max_overflow_queue_depth``: Largest overflow depth observed.
+         * ``dispatch_queue_depths``: Number of messages waiting in each
+           service's queue, while background dispatch is running.
+
+        Statistics for each service are a ``dict`` with the following keys:
+
+         * ``messages``: Number of data messages received.
+         * ``bytes``: Size of the frames which carried the service's messages.
+         * ``socket_wait``: Time spent waiting for frames from the socket,
+           including idle time.
+         * ``decode``: Time spent decoding frames from JSON.
+         * ``label``: Time spent relabeling messages for handlers.
+         * ``handler``: Time spent calling handlers. For async handlers and
+           handlers run in an executor, this only includes the time taken to
+           start them.
+         * ``server_latency``: Difference between the time messages were
+           received and their ``timestamp`` field. Note this depends on the
+           local clock being synchronized with TDA's.
+
+        Frame-level statistics (``bytes``, ``socket_wait`` and ``decode``) are
+        attributed to the service of the frame's first entry, with responses
+        counted under their command's service, and heartbeats under
+        ``NOTIFY``. Timings are summarized as a ``dict`` with ``count``,
+        ``mean``, ``min``, ``max``, ``p50``, ``p90``, and ``p99`` values in
+        seconds. Percentiles are approximate, and accurate to within a factor
+        of two.
+        '''
+        instrumentation = self._instrumentation
+        if instrumentation is None:
+            return None
+
+        return {
+            'elapsed_seconds': time.monotonic() - instrumentation.started_at,
+            'services': dict(
+                (service, stats.snapshot())
+                for service, stats in instrumentation.services.items()),
+            'overflow_queue_depth': len(self._overflow_items),
+            'max_overflow_queue_depth': instrumentation.max_overflow_depth,
+            'dispatch_queue_depths': dict(
+                (service, queue.qsize())
+                for service, queue in self._dispatch_queues.items()),
+        }
+
+    ##########################################################################
+    # Message iteration
+
+    class MessageOverflow(Enum):
+        '''
+        What a :class:`MessageStream` does with new messages when its buffer
+        is full.
+        '''
+
+        #: Wait for the consumer to make room. This slows down reading from
+        #: the stream, and holds up other services' handlers while waiting.
+        BLOCK = 'BLOCK'
+
+        #: Discard the oldest buffered message
+        DROP_OLDEST = 'DROP_OLDEST'
+
+        #: Buffer only the latest update for each symbol, and deliver all
+        #: buffered updates as a single message. The buffer never fills up.
+        CONFLATE = 'CONFLATE'
+
+    def messages(self, service, *, symbols=None, max_queue_size=1000,
+                 overflow=MessageOverflow.BLOCK):
+        '''
+        Returns a :class:`MessageStream` which yields the service's messages,
+        as an alternative to registering a handler:
+
+        .. code-block:: python
+
+          async with stream_client.messages('QUOTE') as quotes:
+              async for msg in quotes:
+                  # ... process the message
+
+        Messages are labeled as they would be for handlers, and are buffered
+        from the moment this method is called until the stream is closed. They
+        must be read with :meth:`handle_message` or background dispatch from a
+        different task than the one consuming them.
+
+        :param service: Name of the service, such as ``'QUOTE'``.
+        :param symbols: If set, only entries for these symbols are delivered,
+                        and messages without any are skipped.
+        :param max_queue_size: Maximum number of buffered messages.
+        :param overflow: A :class:`MessageOverflow` deciding what happens to
+                         new messages when the buffer is full. With
+                         ``CONFLATE``, updates for level one services are
+                         merged field by field, and other services keep only
+                         the latest update per symbol.
+        '''
+        try:
+            add_handler = getattr(self, self._HANDLER_METHODS[service])
+        except KeyError:
+            raise ValueError(
+                'unsupported service {}, must be one of {}'.format(
+                    service, ', '.join(self._HANDLER_METHODS)))
+        overflow = self.convert_enum(overflow, self.MessageOverflow)
+        if max_queue_size < 1:
+            raise ValueError('max_queue_size must be positive')
+
+        stream = MessageStream(
+            self, service, symbols, max_queue_size,
+            self.MessageOverflow(overflow),
+            merge=service in self._LEVEL_ONE_SERVICES)
+
+        add_handler(stream._put)
+        stream._handler = self._handlers[service][-1]
+        stream._handler.blocking = True
+        return stream
+
+    ##########################################################################
+    # Watchdog
+
+    async def start_watchdog(self, *, heartbeat_timeout_seconds=30.0,
+                             data_timeout_seconds=None, service_timeouts=None,
+                             check_interval_seconds=1.0, on_stall=None,
+                             reconnect=False):
+        '''
+        Starts a background task which detects stalled feeds: connections
+        which stopped sending heartbeats, and subscriptions which stopped
+        sending data, while the socket stays open. Each stall is reported
+        once, by logging a warning and calling ``on_stall``, and is reported
+        again only after the feed has resumed and stalled anew.
+
+        Feeds are timed from the moment frames are read from the socket, so
+        messages must still be read with :meth:`handle_message` or background
+        dispatch for the watchdog to see them.
+
+        :param heartbeat_timeout_seconds: Maximum time between heartbeats, or
+                                          ``None`` to not check heartbeats.
+        :param data_timeout_seconds: Maximum time between data messages for
+                                     every service with an active
+                                     subscription, or ``None`` to only check
+                                     the services in ``service_timeouts``.
+        :param service_timeouts: ``dict`` mapping service names to their
+                                 maximum time between data messages,
+                                 overriding ``data_timeout_seconds``. Map a
+                                 service to ``None`` to not check it, which is
+                                 useful for sparse services such as
+                                 ``ACCT_ACTIVITY``.
+        :param check_interval_seconds: How often to check the feeds.
+        :param on_stall: Function called with the service name, or ``None``
+                         for heartbeats, and the number of seconds since its
+                         last message. May be a coroutine function.
+        :param reconnect: If ``True``, closes the connection when a stall is
+                          detected. With :meth:`enable_auto_reconnect`, the
+                          client then reconnects and resubscribes; otherwise
+                          the closed connection is raised from
+                          :meth:`handle_message`. Note that closing waits for
+                          the server to acknowledge for up to the websocket's
+                          ``close_timeout``, which can be shortened with the
+                          ``websocket_connect_args`` of :meth:`login`.
+        '''
+        if self._watchdog_task is not None:
+            raise ValueError('watchdog is already running')
+
+        self._watchdog = _Watchdog(
+            heartbeat_timeout_seconds, data_timeout_seconds,
+            dict(service_timeouts or {}), on_stall, reconnect)
+        self._watchdog_task = asyncio.ensure_future(
+            self._run_watchdog(self._watchdog, check_interval_seconds))
+
+    async def stop_watchdog(self):
+        '''
+        Stops the watchdog started by :meth:`start_watchdog`.
+        '''
+        if self._watchdog_task is None:
+            return
+
+        self._watchdog_task.cancel()
+        await asyncio.gather(self._watchdog_task, return_exceptions=True)
+        self._watchdog_task = None
+        self._watchdog = None
+
+    def staleness(self, service=None, symbol=None):
+        '''
+        Returns the number of seconds since the watchdog last saw a message:
+
+         * With no arguments, since the last heartbeat.
+         * With a ``service``, since the last data message for that service.
+         * With a ``service`` and ``symbol``, since the last update for that
+           symbol, or ``None`` if no update has been received for it.
+
+        Timers start when the watchdog starts, and restart after reconnecting.
+        '''
+        watchdog = self._watchdog
+        if watchdog is None:
+            raise ValueError('watchdog is not running')
+
+        now = time.monotonic()
+        if service is None:
+            return now - watchdog.last_heartbeat
+        if symbol is None:
+            return watchdog.service_age(service, now)
+
+        received_at = watchdog.symbol_times.get(service, {}).get(symbol)
+        if received_at is None:
+            return None
+        return now - received_at
+
+    async def _run_watchdog(self, watchdog, check_interval_seconds):
+        while True:
+            await asyncio.sleep(check_interval_seconds)
+
+            for service, age in watchdog.new_stalls(self._subscriptions):
+                if service is None:
+                    self.logger.warning(
+                        'No stream heartbeat for %.1fs', age)
                 else:
-                    for handler in self._handlers[d['service']]:
-                        h = handler(d)
+                    self.logger.warning(
+                        'No %s stream data for %.1fs', service, age)
+
+                if watchdog.on_stall is not None:
+                    try:
+                        result = watchdog.on_stall(service, age)
+                        if inspect.isawaitable(result):
+                            await result
+                    except Exception as e:
+                        self.logger.error(
+                            'Watchdog callback raised an exception',
+                            exc_info=e)
+
+                if watchdog.reconnect:
+                    self._close_stalled_socket()
+
+    def _close_stalled_socket(self):
+        if self._socket is None:
+            return
+        if (self._watchdog_close_task is not None
+                and not self._watchdog_close_task.done()):
+            return
+
+        self.logger.warning('Closing stalled stream connection')
+        self._watchdog_close_task = asyncio.ensure_future(
+            self._socket.close())
+
+    ##########################################################################
+    # Handler execution
+
+    def set_handler_exception_callback(self, callback):
+        '''
+        Sets a function to be called with the exception raised by any handler
+        which does not run inline, such as async handlers and handlers run in
+        an executor. Without a callback, these exceptions are logged. Pass
+        ``None`` to restore the default.
+        '''
+        self._handler_exception_callback = callback
+
+    async def wait_for_handlers(self):
+        '''
+        Waits until every handler task started by :meth:`handle_message` has
+        finished.
+        '''
+        while self._handler_tasks:
+            await asyncio.wait(list(self._handler_tasks))
+
+    def conflation_counts(self):
+        '''
+        Returns a ``dict`` mapping service names to counts of updates held back
+        from conflating handlers while they were busy. ``conflated`` counts
+        updates merged into a held update for the same symbol, and ``dropped``
+        counts updates replaced by a newer one. Only services with conflating
+        handlers are included.
+        '''
+        counts = {}
+        for service, handlers in self._handlers.items():
+            for handler in handlers:
+                if isinstance(handler, _ConflatingHandler):
+                    service_counts = counts.setdefault(
+                        service, {'conflated': 0, 'dropped': 0})
+                    service_counts['conflated'] += handler.conflated_count
+                    service_counts['dropped'] += handler.dropped_count
+        return counts
+
+    def _track_handler(self, awaitable):
+        task = asyncio.ensure_future(awaitable)
+        self._handler_tasks.add(task)
+        task.add_done_callback(self._handler_done)
+
+    def _handler_done(self, task):
+        self._handler_tasks.discard(task)
+        if task.cancelled() or task.exception() is None:
+            return
+
+        exc = task.exception()
+        if self._handler_exception_callback is not None:
+            self._handler_exception_callback(exc)
+        else:
+            self.logger.error(
+                'Stream handler raised an exception', exc_info=exc)
+
+    ##########################################################################
+    # Batching
 
-                        # Check if h is an awaitable, if so schedule oit
-                        # This allows for both sync and async handlers
-                        if inspect.isawaitable(h):
-                            asyncio.ensure_future(h)
+    def batch(self):
+        '''
+        Returns an async context manager which collects subscription, add,
+        unsubscription, and quality of service commands and sends them as a
+        single message when the block exits:
+
+        .. code-block:: python
+
+          async with stream_client.batch():
+              await stream_client.quality_of_service(
+                  StreamClient.QOSLevel.EXPRESS)
+              await stream_client.level_one_equity_subs(['GOOG', 'MSFT'])
+              await stream_client.chart_equity_subs(['GOOG', 'MSFT'])
+
+        Inside the block, commands return immediately without waiting for a
+        response. Exiting the block waits until every command has been
+        answered, and raises the error of the first command which failed.
+        Commands which succeeded take effect regardless. If the block raises,
+        nothing is sent.
+
+        Note that all commands issued while the batch is open are collected,
+        including those issued from other coroutines. Batches cannot be
+        nested.
+        '''
+        return _CommandBatch(self)
+
+    ##########################################################################
+    # Subscription management
+
+    def active_subscriptions(self):
+        '''
+        Returns a ``dict`` mapping service names to their active subscription,
+        as recorded from the subscription commands which succeeded. Each
+        subscription is a ``dict`` with the subscribed symbols under ``keys``,
+        and the subscribed field numbers under ``fields``.
+        '''
+        subscriptions = {}
+        for service, subscription in self._subscriptions.items():
+            fields = subscription['fields']
+            subscriptions[service] = {
+                'keys': list(subscription['keys']),
+                'fields': None if fields is None else [
+                    int(field) for field in fields.split(',')],
+            }
+        return subscriptions
+
+    async def update_subscriptions(self, service, symbols, *, fields=None,
+                                   max_keys_per_request=500):
+        '''
+        Changes the subscription for ``service`` to exactly ``symbols``,
+        sending only the commands needed to get there from the active
+        subscription. Symbols which are already subscribed are not sent again:
+
+         * Symbols which are no longer wanted are unsubscribed.
+         * New symbols are added to the subscription.
+         * Changing the fields resubscribes to the full set, since only a
+           subscription can change them.
+
+        Commands are split so that none carries more than
+        ``max_keys_per_request`` symbols, with resubscriptions sent as a
+        subscription to the first chunk followed by additions of the rest, and
+        all of them are sent in a single message. When called inside
+        :meth:`batch`, the commands are added to the batch instead.
+
+        :param service: Name of the service, such as ``'QUOTE'`` or
+                        ``'CHART_EQUITY'``.
+        :param symbols: Symbols which should be subscribed. Pass an empty list
+                        to unsubscribe from every symbol.
+        :param fields: Iterable of the service's field enum representing the
+                       fields to subscribe to. If unset, subscribes to the
+                       fields used by the service's handlers if they declared
+                       them (see :ref:`handler_fields`), and otherwise keeps
+                       the fields of the active subscription, or requests all
+                       fields if there is none.
+        :param max_keys_per_request: Maximum number of symbols per command.
+        '''
+        field_type = self._SUBSCRIPTION_FIELD_TYPES.get(service)
+        if field_type is None:
+            raise ValueError(
+                'unsupported service {}, must be one of {}'.format(
+                    service, ', '.join(self._SUBSCRIPTION_FIELD_TYPES)))
+        if max_keys_per_request < 1:
+            raise ValueError('max_keys_per_request must be positive')
+
+        active = self._subscriptions.get(service)
+        fields_parameter = self._subscription_fields(
+            service, field_type, fields, active)
+        desired, added, removed = self._subscription_delta(active, symbols)
+        commands = self._subscription_commands(
+            active, fields_parameter, desired, added, removed)
+
+        await self._submit_all(self._subscription_requests(
+            service, commands, fields_parameter, max_keys_per_request))
+
+    def _subscription_fields(self, service, field_type, fields, active):
+        '''
+        Returns the fields parameter to use when updating the subscription to
+        ``service``. See :meth:`update_subscriptions`.
+        '''
+        if fields is not None:
+            fields = list(fields)
+            if field_type.SYMBOL not in fields:
+                fields.append(field_type.SYMBOL)
+            return self._fields_parameter(field_type, fields)
+
+        fields_parameter = self._declared_fields(service, field_type)
+        if fields_parameter is None and active is not None:
+            fields_parameter = active['fields']
+        if fields_parameter is None:
+            fields_parameter = self._fields_parameter(field_type, None)
+        return fields_parameter
+
+    @staticmethod
+    def _subscription_delta(active, symbols):
+        '''
+        Returns the desired symbols without duplicates, the symbols missing
+        from the active subscription, and the subscribed symbols which are no
+        longer desired, each in order.
+        '''
+        active_keys = active['keys'] if active is not None else {}
+        desired_keys = dict.fromkeys(symbols)
+        added = [key for key in desired_keys if key not in active_keys]
+        removed = [key for key in active_keys if key not in desired_keys]
+        return list(desired_keys), added, removed
+
+    @staticmethod
+    def _subscription_commands(active, fields_parameter, desired, added,
+                               removed):
+        '''
+        Chooses the commands which take the active subscription to the
+        desired one, as ``(command, keys)`` pairs.
+        '''
+        if not desired:
+            return [('UNSUBS', removed)]
+
+        # Only a subscription changes the fields, and it replaces the previous
+        # one, so it must include every desired symbol
+        if active is None or fields_parameter != active['fields']:
+            return [('SUBS', desired)]
+
+        return [('UNSUBS', removed), ('ADD', added)]
+
+    def _subscription_requests(self, service, commands, fields_parameter,
+                               max_keys_per_request):
+        '''
+        Builds ``(request, on_success)`` pairs for ``(command, keys)`` pairs,
+        splitting each command into chunks of at most
+        ``max_keys_per_request`` symbols. Chunks after the first of a
+        subscription are sent as additions, so they don't replace it.
+        '''
+        requests = []
+        for command, keys in commands:
+            for start in range(0, len(keys), max_keys_per_request):
+                chunk_command = command
+                if command == 'SUBS' and start:
+                    chunk_command = 'ADD'
+
+                parameters = {
+                    'keys': ','.join(keys[start:start + max_keys_per_request])}
+                if chunk_command != 'UNSUBS':
+                    parameters['fields'] = fields_parameter
+
+                request, _ = self._make_request(
+                    service=service, command=chunk_command,
+                    parameters=parameters)
+                requests.append((request, functools.partial(
+                    self._record_subscription, service, chunk_command,
+                    parameters)))
+        return requests
+
+    async def update_subscription_fields(self, *, max_keys_per_request=500):
+        '''
+        Resubscribes every active subscription whose fields differ from the
+        fields declared by the service's handlers. Call this after registering
+        handlers which declare fields while already subscribed, so that the
+        subscription covers the new handlers' fields. Services whose handlers
+        did not declare fields are left alone. See :ref:`handler_fields`.
+
+        :param max_keys_per_request: Maximum number of symbols per command.
+        '''
+        if max_keys_per_request < 1:
+            raise ValueError('max_keys_per_request must be positive')
+
+        requests = []
+        for service, subscription in self._subscriptions.items():
+            field_type = self._SUBSCRIPTION_FIELD_TYPES.get(service)
+            if field_type is None:
+                continue
+
+            fields = self._declared_fields(service, field_type)
+            if fields is None or fields == subscription['fields']:
+                continue
+
+            requests.extend(self._subscription_requests(
+                service, [('SUBS', list(subscription['keys']))], fields,
+                max_keys_per_request))
+
+        await self._submit_all(requests)
+
+    ##########################################################################
+    # Background dispatch
+
+    async def start_background_dispatch(self, *, max_queue_size=1000):
+        '''
+        Starts a background task which reads messages from the stream as fast
+        as they arrive and hands them off to per-service dispatcher tasks
+        through bounded queues. Slow handlers on one service then no longer
+        delay reading the socket or handling other services. Use this instead
+        of calling :meth:`handle_message` in a loop, which is disallowed while
+        background dispatch is running.
+
+        Unlike :meth:`handle_message`, dispatchers await async handlers before
+        moving on to the next message for that service, so messages for a
+        single service are handled in order. Note sync handlers still run on
+        the event loop and will delay everything else while they run.
+
+        :param max_queue_size: Maximum number of messages buffered per service.
+                               When a service's queue is full, its oldest
+                               message is dropped and counted in
+                               :meth:`dropped_message_counts`.
+        '''
+        if self._socket is None:
+            raise ValueError(
+                'Socket not open. Did you forget to call login()?')
+        if self._reader_task is not None:
+            raise ValueError('background dispatch is already running')
+
+        self._dispatch_max_queue_size = max_queue_size
+        self._dispatch_error = None
+        self._reader_task = asyncio.ensure_future(self._read_in_background())
+
+    async def stop_background_dispatch(self):
+        '''
+        Stops background dispatch started by
+        :meth:`start_background_dispatch`. Messages which were read but not yet
+        dispatched are retained and will be delivered by the next call to
+        :meth:`handle_message`.
+        '''
+        if self._reader_task is None:
+            return
+
+        tasks = [self._reader_task] + self._dispatcher_tasks
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        # Hand undispatched messages back to the overflow list, which is
+        # consumed from the right
+        for service, queue in self._dispatch_queues.items():
+            while not queue.empty():
+                is_notify, d = queue.get_nowait()
+                self._overflow_items.appendleft(
+                    {'notify' if is_notify else 'data': [d]})
+
+        self._reader_task = None
+        self._dispatch_queues = {}
+        self._dispatcher_tasks = []
+
+    async def wait_background_dispatch(self):
+        '''
+        Waits until background dispatch stops, which happens when reading from
+        the stream fails or a handler raises an exception. That exception is
+        re-raised here, and background dispatch is stopped.
+        '''
+        if self._reader_task is None:
+            raise ValueError('background dispatch is not running')
+
+        try:
+            await self._reader_task
+        except asyncio.CancelledError:
+            if self._dispatch_error is None:
+                raise
+            raise self._dispatch_error
+        finally:
+            await self.stop_background_dispatch()
+
+    def dropped_message_counts(self):
+        '''
+        Returns a ``dict`` mapping service names to the number of messages
+        dropped because that service's background dispatch queue was full.
+        '''
+        return dict(self._dropped_message_counts)
+
+    async def _read_in_background(self):
+        try:
+            while True:
+                msg = await self._receive_or_reconnect()
+                if msg is not None:
+                    self._enqueue_message(msg)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            # Wake up commands waiting on responses that will never come
+            self._fail_pending_responses(e)
+            raise
+
+    async def _receive_or_reconnect(self):
+        '''
+        Receives the next message for the background reader. If the
+        connection dropped and automatic reconnects are enabled, reconnects
+        and returns ``None`` instead.
+        '''
+        try:
+            return await self._receive()
+        except websockets.exceptions.ConnectionClosed as e:
+            self._connection_lost(e)
+
+        await self._reconnect()
+        return None
+
+    def _connection_lost(self, error):
+        '''
+        Re-raises ``error``, a closed connection, unless automatic reconnects
+        are enabled, in which case commands waiting on a response are failed
+        since their requests were lost with the connection.
+        '''
+        if self._reconnect_policy is None:
+            raise error
+        self._fail_pending_responses(error)
+
+    def _enqueue_message(self, msg):
+        '''
+        Resolves the responses in a message read by the background reader, or
+        queues its data and notifications for dispatch.
+        '''
+        if 'response' in msg:
+            try:
+                self._resolve_responses(msg)
+            except UnexpectedResponse as e:
+                self.logger.warning(
+                    'Ignoring response to unknown request: %s', e)
+            return
+
+        for d in msg.get('data', ()):
+            self._enqueue_for_dispatch(d, False)
+
+        for d in msg.get('notify', ()):
+            if 'heartbeat' not in d:
+                self._enqueue_for_dispatch(d, True)
+
+    def _enqueue_for_dispatch(self, d, is_notify):
+        service = d['service']
+        if not self._handlers.get(service):
+            return
+
+        queue = self._dispatch_queues.get(service)
+        if queue is None:
+            queue = asyncio.Queue(self._dispatch_max_queue_size)
+            self._dispatch_queues[service] = queue
+
+            task = asyncio.ensure_future(self._dispatch_from_queue(queue))
+            task.add_done_callback(self._dispatcher_done)
+            self._dispatcher_tasks.append(task)
+
+        if queue.full():
+            queue.get_nowait()
+            self._dropped_message_counts[service] += 1
+            self.logger.warning(
+                'Dispatch queue for %s is full, dropping oldest message',
+                service)
+
+        queue.put_nowait((is_notify, d))
+
+    async def _dispatch_from_queue(self, queue):
+        while True:
+            is_notify, d = await queue.get()
+            for h in self._invoke_handlers(d, is_notify):
+                await h
+
+            # Getting from a non-empty queue does not yield to the event loop,
+            # so yield explicitly to let the reader keep up with the socket
+            await asyncio.sleep(0)
+
+    def _dispatcher_done(self, task):
+        if task.cancelled():
+            return
+
+        # A handler raised. Record the exception and stop reading, which
+        # surfaces it in wait_background_dispatch().
+        self._dispatch_error = task.exception()
+        if self._reader_task is not None:
+            self._reader_task.cancel()
+
+    ##########################################################################
+    # Reconnecting
+
+    def enable_auto_reconnect(self, *, max_attempts=10,
+                              initial_delay_seconds=0.5,
+                              max_delay_seconds=30.0):
+        '''
+        Enables reconnecting automatically when the connection is dropped.
+        When :meth:`handle_message` or the background dispatch reader
+        encounters a closed connection, the client reconnects, logs in again
+        and replays all active subscriptions and the quality of service level
+        in a single batched request. The streamer credentials fetched by
+        :meth:`login` are reused for as long as they remain valid.
+
+        Subscription commands which were in flight when the connection dropped
+        raise an exception and are not replayed.
+
+        :param max_attempts: Number of consecutive reconnect attempts before
+                             giving up and raising the last error.
+        :param initial_delay_seconds: Upper bound of the random delay before
+                                      the second attempt. Doubles after each
+                                      failed attempt.
+        :param max_delay_seconds: Maximum upper bound of the random delay
+                                  between attempts.
+        '''
+        self._reconnect_policy = {
+            'max_attempts': max_attempts,
+            'initial_delay_seconds': initial_delay_seconds,
+            'max_delay_seconds': max_delay_seconds,
+        }
+
+    def disable_auto_reconnect(self):
+        '''
+        Disables reconnecting enabled by :meth:`enable_auto_reconnect`.
+        '''
+        self._reconnect_policy = None
+
+    def reconnect_metrics(self):
+        '''
+        Returns a ``dict`` describing reconnects performed so far:
+
+         * ``reconnects``: Number of successful reconnects
+         * ``failed_attempts``: Number of failed reconnect attempts
+         * ``last_reconnect_seconds``: Time from detecting the dropped
+           connection to having replayed all subscriptions, for the most recent
+           reconnect, or ``None``
+         * ``total_reconnect_seconds``: Sum of the above over all reconnects
+        '''
+        return dict(self._reconnect_metrics)
+
+    def _principals_still_valid(self):
+        if self._principals is None:
+            return False
+        try:
+            expiration = datetime.datetime.strptime(
+                self._principals['tokenExpirationTime'],
+                '%Y-%m-%dT%H:%M:%S%z')
+        except (KeyError, ValueError):
+            return False
+
+        # Leave a margin so the token doesn't expire during login
+        return expiration.timestamp() - time.time() > 60
+
+    async def _reconnect(self):
+        policy = self._reconnect_policy
+        start = time.monotonic()
+
+        attempt = 0
+        while True:
+            attempt += 1
+            try:
+                if self._socket is not None:
+                    await self._socket.close()
+
+                if self._principals_still_valid():
+                    principals = self._principals
+                else:
+                    principals = await self._fetch_principals()
+
+                await self._connect_and_login(principals)
+                await self._replay_subscriptions()
+                break
+            except (websockets.exceptions.WebSocketException, OSError,
+                    asyncio.TimeoutError, httpx.HTTPError, UnexpectedResponse,
+                    UnexpectedResponseCode) as e:
+                self._reconnect_metrics['failed_attempts'] += 1
+
+                # Don't reuse credentials which may be the cause of failure
+                self._principals = None
+
+                if attempt >= policy['max_attempts']:
+                    raise
+
+                # Exponential backoff with full jitter
+                max_delay = min(
+                    policy['max_delay_seconds'],
+                    policy['initial_delay_seconds'] * 2 ** (attempt - 1))
+                delay = random.uniform(0, max_delay)
+                self.logger.warning(
+                    'Reconnect attempt %s failed (%s), retrying in %.2fs',
+                    attempt, e, delay)
+                await asyncio.sleep(delay)
+
+        if self._watchdog is not None:
+            self._watchdog.reset()
+
+        elapsed = time.monotonic() - start
+        self._reconnect_metrics['reconnects'] += 1
+        self._reconnect_metrics['last_reconnect_seconds'] = elapsed
+        self._reconnect_metrics['total_reconnect_seconds'] += elapsed
+        self.logger.info('Reconnected after %s attempts in %.3fs',
+                         attempt, elapsed)
+
+    async def _replay_subscriptions(self):
+        requests = []
+
+        def add_request(service, command, parameters):
+            request, _ = self._make_request(
+                service=service, command=command, parameters=parameters)
+            requests.append(request)
+
+        if self._qos_level is not None:
+            add_request('ADMIN', 'QOS', {'qoslevel': self._qos_level})
+
+        for service, subscription in self._subscriptions.items():
+            # The account activity key is issued per login
+            if service == 'ACCT_ACTIVITY':
+                keys = [self._stream_key]
+            else:
+                keys = list(subscription['keys'])
+
+            parameters = {'keys': ','.join(keys)}
+            if subscription['fields'] is not None:
+                parameters['fields'] = subscription['fields']
+            add_request(service, 'SUBS', parameters)
+
+        if not requests:
+            return
+
+        await self._send_requests(requests)
 
     ##########################################################################
     # LOGIN
@@ -402,7 +2482,12 @@ class StreamClient(EnumEnforcer):
         '''
 
         # Fetch required data and initialize the client
+        self._websocket_connect_args = (
+            dict(websocket_connect_args) if websocket_connect_args else {})
+
+        await self._connect_and_login(await self._fetch_principals())
 
+    async def _fetch_principals(self):
         # TODO: Figure out which of these are actually needed
         r = self._client.get_user_principals(fields=[
             self._client.UserPrincipals.Fields.STREAMER_CONNECTION_INFO,
@@ -412,11 +2497,15 @@ class StreamClient(EnumEnforcer):
         # asynchronous, so work around by awaiting the response if necessary
         if inspect.iscoroutine(r):
             r = await r
-        assert r.status_code == httpx.codes.OK, r.raise_for_status()
-        r = r.json()
+        if r.status_code != httpx.codes.OK:
+            raise UnexpectedResponseCode(
+                r, 'unexpected status fetching user principals: {}'.format(
+                    r.status_code))
+        return r.json()
 
+    async def _connect_and_login(self, r):
         await self._init_from_principals(
-                r, websocket_connect_args if websocket_connect_args else {})
+                r, dict(self._websocket_connect_args))
 
         # Build and send the request object
         token_ts = datetime.datetime.strptime(
@@ -443,12 +2532,12 @@ class StreamClient(EnumEnforcer):
             'version': '1.0'
         }
 
-        request, request_id = self._make_request(
+        request, _ = self._make_request(
             service='ADMIN', command='LOGIN',
             parameters=request_parameters)
-        async with self._lock:
-            await self._send({'requests': [request]})
-            await self._await_response(request_id, 'ADMIN', 'LOGIN')
+        await self._send_requests([request])
+
+        self._principals = r
 
     ##########################################################################
     # QOS
@@ -488,12 +2577,13 @@ class StreamClient(EnumEnforcer):
 
         qos_level = self.convert_enum(qos_level, self.QOSLevel)
 
-        request, request_id = self._make_request(
+        request, _ = self._make_request(
             service='ADMIN', command='QOS',
             parameters={'qoslevel': qos_level})
-        async with self._lock:
-            await self._send({'requests': [request]})
-            await self._await_response(request_id, 'ADMIN', 'QOS')
+
+        def record_qos_level():
+            self._qos_level = qos_level
+        await self._submit(request, record_qos_level)
 
     ##########################################################################
     # ACCT_ACTIVITY
@@ -547,13 +2637,13 @@ class StreamClient(EnumEnforcer):
         '''
         await self._service_op([self._stream_key], 'ACCT_ACTIVITY', 'UNSUBS')
 
-    def add_account_activity_handler(self, handler):
+    def add_account_activity_handler(self, handler, *, execution=None):
         '''
         Adds a handler to the account activity subscription. See
         :ref:`registering_handlers` for details.
         '''
-        self._handlers['ACCT_ACTIVITY'].append(_Handler(handler,
-                                                        self.AccountActivityFields))
+        self._handlers['ACCT_ACTIVITY'].append(
+            _Handler(handler, self.AccountActivityFields, execution))
 
     ##########################################################################
     # CHART_EQUITY
@@ -635,13 +2725,32 @@ class StreamClient(EnumEnforcer):
             symbols, 'CHART_EQUITY', 'ADD', self.ChartEquityFields,
             fields=self.ChartEquityFields.all_fields())
 
-    def add_chart_equity_handler(self, handler):
+    def add_chart_equity_handler(self, handler, *, conflate=False,
+                                 execution=None, typed=False):
         '''
         Adds a handler to the equity chart subscription. See
         :ref:`registering_handlers` for details.
+
+        :param conflate: If ``True``, the handler is not called again until
+                         its previous call finishes. Only the latest bar
+                         received in the meantime is kept for each symbol.
+                         See :ref:`conflation`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['CHART_EQUITY'].append(_Handler(handler,
-                                                       self.ChartEquityFields))
+        if typed and conflate:
+            raise ValueError('typed handlers cannot be conflated')
+
+        if conflate:
+            handler = _ConflatingHandler(
+                handler, self.ChartEquityFields, execution, merge=False)
+        elif typed:
+            handler = _RowHandler(handler, self.ChartEquityFields, execution)
+        else:
+            handler = _Handler(handler, self.ChartEquityFields, execution)
+        self._handlers['CHART_EQUITY'].append(handler)
 
     ##########################################################################
     # CHART_FUTURES
@@ -718,13 +2827,32 @@ class StreamClient(EnumEnforcer):
             symbols, 'CHART_FUTURES', 'ADD', self.ChartFuturesFields,
             fields=self.ChartFuturesFields.all_fields())
 
-    def add_chart_futures_handler(self, handler):
+    def add_chart_futures_handler(self, handler, *, conflate=False,
+                                  execution=None, typed=False):
         '''
         Adds a handler to the futures chart subscription. See
         :ref:`registering_handlers` for details.
+
+        :param conflate: If ``True``, the handler is not called again until
+                         its previous call finishes. Only the latest bar
+                         received in the meantime is kept for each symbol.
+                         See :ref:`conflation`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['CHART_FUTURES'].append(_Handler(handler,
-                                                        self.ChartFuturesFields))
+        if typed and conflate:
+            raise ValueError('typed handlers cannot be conflated')
+
+        if conflate:
+            handler = _ConflatingHandler(
+                handler, self.ChartFuturesFields, execution, merge=False)
+        elif typed:
+            handler = _RowHandler(handler, self.ChartFuturesFields, execution)
+        else:
+            handler = _Handler(handler, self.ChartFuturesFields, execution)
+        self._handlers['CHART_FUTURES'].append(handler)
 
     ##########################################################################
     # QUOTE
@@ -954,13 +3082,33 @@ class StreamClient(EnumEnforcer):
 
         await self._service_op(symbols, 'QUOTE', 'UNSUBS')
 
-    def add_level_one_equity_handler(self, handler):
+    def add_level_one_equity_handler(self, handler, *, columnar=False,
+                                     conflate=False, execution=None,
+                                     fields=None, typed=False):
         '''
         Register a function to handle level one equity quotes as they are sent.
         See :ref:`registering_handlers` for details.
+
+        :param columnar: If ``True``, the handler receives each message as
+                         a :class:`ColumnarBatch` instead of a ``dict``.
+                         Requires ``numpy``.
+
+        :param conflate: If ``True``, the handler is not called again until
+                         its previous call finishes. Quotes received in the
+                         meantime are merged per symbol and delivered as a
+                         single update. See :ref:`conflation`.
+
+        :param fields: Iterable of :class:`LevelOneEquityFields`
+                       representing the fields the handler uses.
+                       See :ref:`handler_fields`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['QUOTE'].append(_Handler(handler,
-                                                self.LevelOneEquityFields))
+        self._add_handler('QUOTE', _level_one_handler(
+            handler, self.LevelOneEquityFields, columnar, conflate,
+            execution, typed), fields)
 
     ##########################################################################
     # OPTION
@@ -1110,13 +3258,33 @@ class StreamClient(EnumEnforcer):
         '''
         await self._service_op(symbols, 'OPTION', 'UNSUBS')
 
-    def add_level_one_option_handler(self, handler):
+    def add_level_one_option_handler(self, handler, *, columnar=False,
+                                     conflate=False, execution=None,
+                                     fields=None, typed=False):
         '''
         Register a function to handle level one options quotes as they are sent.
         See :ref:`registering_handlers` for details.
+
+        :param columnar: If ``True``, the handler receives each message as
+                         a :class:`ColumnarBatch` instead of a ``dict``.
+                         Requires ``numpy``.
+
+        :param conflate: If ``True``, the handler is not called again until
+                         its previous call finishes. Quotes received in the
+                         meantime are merged per symbol and delivered as a
+                         single update. See :ref:`conflation`.
+
+        :param fields: Iterable of :class:`LevelOneOptionFields`
+                       representing the fields the handler uses.
+                       See :ref:`handler_fields`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['OPTION'].append(_Handler(handler,
-                                                 self.LevelOneOptionFields))
+        self._add_handler('OPTION', _level_one_handler(
+            handler, self.LevelOneOptionFields, columnar, conflate,
+            execution, typed), fields)
 
     ##########################################################################
     # LEVELONE_FUTURES
@@ -1281,13 +3449,33 @@ class StreamClient(EnumEnforcer):
 
         await self._service_op(symbols, 'LEVELONE_FUTURES', 'UNSUBS')
 
-    def add_level_one_futures_handler(self, handler):
+    def add_level_one_futures_handler(self, handler, *, columnar=False,
+                                      conflate=False, execution=None,
+                                      fields=None, typed=False):
         '''
         Register a function to handle level one futures quotes as they are sent.
         See :ref:`registering_handlers` for details.
+
+        :param columnar: If ``True``, the handler receives each message as
+                         a :class:`ColumnarBatch` instead of a ``dict``.
+                         Requires ``numpy``.
+
+        :param conflate: If ``True``, the handler is not called again until
+                         its previous call finishes. Quotes received in the
+                         meantime are merged per symbol and delivered as a
+                         single update. See :ref:`conflation`.
+
+        :param fields: Iterable of :class:`LevelOneFuturesFields`
+                       representing the fields the handler uses.
+                       See :ref:`handler_fields`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['LEVELONE_FUTURES'].append(
-            _Handler(handler, self.LevelOneFuturesFields))
+        self._add_handler('LEVELONE_FUTURES', _level_one_handler(
+            handler, self.LevelOneFuturesFields, columnar, conflate,
+            execution, typed), fields)
 
     ##########################################################################
     # LEVELONE_FOREX
@@ -1425,13 +3613,33 @@ class StreamClient(EnumEnforcer):
 
         await self._service_op(symbols, 'LEVELONE_FOREX', 'UNSUBS')
 
-    def add_level_one_forex_handler(self, handler):
+    def add_level_one_forex_handler(self, handler, *, columnar=False,
+                                    conflate=False, execution=None,
+                                    fields=None, typed=False):
         '''
         Register a function to handle level one forex quotes as they are sent.
         See :ref:`registering_handlers` for details.
+
+        :param columnar: If ``True``, the handler receives each message as
+                         a :class:`ColumnarBatch` instead of a ``dict``.
+                         Requires ``numpy``.
+
+        :param conflate: If ``True``, the handler is not called again until
+                         its previous call finishes. Quotes received in the
+                         meantime are merged per symbol and delivered as a
+                         single update. See :ref:`conflation`.
+
+        :param fields: Iterable of :class:`LevelOneForexFields`
+                       representing the fields the handler uses.
+                       See :ref:`handler_fields`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['LEVELONE_FOREX'].append(_Handler(handler,
-                                                         self.LevelOneForexFields))
+        self._add_handler('LEVELONE_FOREX', _level_one_handler(
+            handler, self.LevelOneForexFields, columnar, conflate,
+            execution, typed), fields)
 
     ##########################################################################
     # LEVELONE_FUTURES_OPTIONS
@@ -1588,13 +3796,33 @@ class StreamClient(EnumEnforcer):
 
         await self._service_op(symbols, 'LEVELONE_FUTURES_OPTIONS', 'UNSUBS')
 
-    def add_level_one_futures_options_handler(self, handler):
+    def add_level_one_futures_options_handler(self, handler, *, columnar=False,
+                                              conflate=False, execution=None,
+                                              fields=None, typed=False):
         '''
         Register a function to handle level one futures options quotes as they
         are sent. See :ref:`registering_handlers` for details.
+
+        :param columnar: If ``True``, the handler receives each message as
+                         a :class:`ColumnarBatch` instead of a ``dict``.
+                         Requires ``numpy``.
+
+        :param conflate: If ``True``, the handler is not called again until
+                         its previous call finishes. Quotes received in the
+                         meantime are merged per symbol and delivered as a
+                         single update. See :ref:`conflation`.
+
+        :param fields: Iterable of :class:`LevelOneFuturesOptionsFields`
+                       representing the fields the handler uses.
+                       See :ref:`handler_fields`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['LEVELONE_FUTURES_OPTIONS'].append(
-            _Handler(handler, self.LevelOneFuturesOptionsFields))
+        self._add_handler('LEVELONE_FUTURES_OPTIONS', _level_one_handler(
+            handler, self.LevelOneFuturesOptionsFields, columnar, conflate,
+            execution, typed), fields)
 
     ##########################################################################
     # TIMESALE
@@ -1648,13 +3876,23 @@ class StreamClient(EnumEnforcer):
 
         await self._service_op(symbols, 'TIMESALE_EQUITY', 'UNSUBS')
 
-    def add_timesale_equity_handler(self, handler):
+    def add_timesale_equity_handler(self, handler, *, execution=None,
+                                    fields=None, typed=False):
         '''
         Register a function to handle equity trade notifications as they happen
         See :ref:`registering_handlers` for details.
+
+        :param fields: Iterable of :class:`TimesaleFields`
+                       representing the fields the handler uses.
+                       See :ref:`handler_fields`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['TIMESALE_EQUITY'].append(_Handler(handler,
-                                                          self.TimesaleFields))
+        handler_type = _RowHandler if typed else _Handler
+        self._add_handler('TIMESALE_EQUITY', handler_type(
+            handler, self.TimesaleFields, execution), fields)
 
     async def timesale_futures_subs(self, symbols, *, fields=None):
         '''
@@ -1683,13 +3921,23 @@ class StreamClient(EnumEnforcer):
 
         await self._service_op(symbols, 'TIMESALE_FUTURES', 'UNSUBS')
 
-    def add_timesale_futures_handler(self, handler):
+    def add_timesale_futures_handler(self, handler, *, execution=None,
+                                     fields=None, typed=False):
         '''
         Register a function to handle futures trade notifications as they happen
         See :ref:`registering_handlers` for details.
+
+        :param fields: Iterable of :class:`TimesaleFields`
+                       representing the fields the handler uses.
+                       See :ref:`handler_fields`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['TIMESALE_FUTURES'].append(_Handler(handler,
-                                                           self.TimesaleFields))
+        handler_type = _RowHandler if typed else _Handler
+        self._add_handler('TIMESALE_FUTURES', handler_type(
+            handler, self.TimesaleFields, execution), fields)
 
     async def timesale_options_subs(self, symbols, *, fields=None):
         '''
@@ -1718,13 +3966,23 @@ class StreamClient(EnumEnforcer):
 
         await self._service_op(symbols, 'TIMESALE_OPTIONS', 'UNSUBS')
 
-    def add_timesale_options_handler(self, handler):
+    def add_timesale_options_handler(self, handler, *, execution=None,
+                                     fields=None, typed=False):
         '''
         Register a function to handle options trade notifications as they happen
         See :ref:`registering_handlers` for details.
+
+        :param fields: Iterable of :class:`TimesaleFields`
+                       representing the fields the handler uses.
+                       See :ref:`handler_fields`.
+
+        :param typed: If ``True``, content entries are delivered as
+                      :class:`StreamRow` objects instead of ``dict``
+                      objects. See :ref:`typed_rows`.
         '''
-        self._handlers['TIMESALE_OPTIONS'].append(_Handler(handler,
-                                                           self.TimesaleFields))
+        handler_type = _RowHandler if typed else _Handler
+        self._add_handler('TIMESALE_OPTIONS', handler_type(
+            handler, self.TimesaleFields, execution), fields)
 
     ##########################################################################
     # Common book utilities
@@ -1762,32 +4020,36 @@ class StreamClient(EnumEnforcer):
             # Relabel top-level fields
             new_msg = super().label_message(msg)
 
-            # Relabel bids
-            for content in new_msg['content']:
+            for content in new_msg.get('content', ()):
+                # Relabel bids, along with their per-exchange entries
                 if 'BIDS' in content:
-                    for bid in content['BIDS']:
-                        # Relabel top-level bids
-                        StreamClient.BidFields.relabel_message(bid, bid)
-
-                        # Relabel per-exchange bids
-                        for e_bid in bid['BIDS']:
-                            StreamClient.PerExchangeBidFields.relabel_message(
-                                e_bid, e_bid)
+                    content['BIDS'] = self._label_levels(
+                        content['BIDS'], StreamClient.BidFields,
+                        StreamClient.PerExchangeBidFields, 'BIDS')
 
-            # Relabel asks
-            for content in new_msg['content']:
+                # Relabel asks, along with their per-exchange entries
                 if 'ASKS' in content:
-                    for ask in content['ASKS']:
-                        # Relabel top-level asks
-                        StreamClient.AskFields.relabel_message(ask, ask)
-
-                        # Relabel per-exchange bids
-                        for e_ask in ask['ASKS']:
-                            StreamClient.PerExchangeAskFields.relabel_message(
-                                e_ask, e_ask)
+                    content['ASKS'] = self._label_levels(
+                        content['ASKS'], StreamClient.AskFields,
+                        StreamClient.PerExchangeAskFields, 'ASKS')
 
             return new_msg
 
+        @staticmethod
+        def _label_levels(levels, level_fields, exchange_fields,
+                          exchanges_key):
+            relabel_level = level_fields.relabel_content
+            relabel_exchange = exchange_fields.relabel_content
+
+            new_levels = []
+            for level in levels:
+                new_level = relabel_level(level)
+                if exchanges_key in new_level:
+                    new_level[exchanges_key] = [
+                        relabel_exchange(e) for e in new_level[exchanges_key]]
+                new_levels.append(new_level)
+            return new_levels
+
     ##########################################################################
     # LISTED_BOOK
 
@@ -1807,13 +4069,13 @@ class StreamClient(EnumEnforcer):
         '''
         await self._service_op(symbols, 'LISTED_BOOK', 'UNSUBS')
 
-    def add_listed_book_handler(self, handler):
+    def add_listed_book_handler(self, handler, *, execution=None):
         '''
         Register a function to handle level two NYSE book data as it is updated
         See :ref:`registering_handlers` for details.
         '''
         self._handlers['LISTED_BOOK'].append(
-            self._BookHandler(handler, self.BookFields))
+            self._BookHandler(handler, self.BookFields, execution))
 
     ##########################################################################
     # NASDAQ_BOOK
@@ -1834,13 +4096,13 @@ class StreamClient(EnumEnforcer):
         '''
         await self._service_op(symbols, 'NASDAQ_BOOK', 'UNSUBS')
 
-    def add_nasdaq_book_handler(self, handler):
+    def add_nasdaq_book_handler(self, handler, *, execution=None):
         '''
         Register a function to handle level two NASDAQ book data as it is
         updated See :ref:`registering_handlers` for details.
         '''
         self._handlers['NASDAQ_BOOK'].append(
-            self._BookHandler(handler, self.BookFields))
+            self._BookHandler(handler, self.BookFields, execution))
 
     ##########################################################################
     # OPTIONS_BOOK
@@ -1863,13 +4125,13 @@ class StreamClient(EnumEnforcer):
         '''
         await self._service_op(symbols, 'OPTIONS_BOOK', 'UNSUBS')
 
-    def add_options_book_handler(self, handler):
+    def add_options_book_handler(self, handler, *, execution=None):
         '''
         Register a function to handle level two options book data as it is
         updated See :ref:`registering_handlers` for details.
         '''
         self._handlers['OPTIONS_BOOK'].append(
-            self._BookHandler(handler, self.BookFields))
+            self._BookHandler(handler, self.BookFields, execution))
 
     ##########################################################################
     # NEWS_HEADLINE
@@ -1922,10 +4184,55 @@ class StreamClient(EnumEnforcer):
         '''
         await self._service_op(symbols, 'NEWS_HEADLINE', 'UNSUBS')
 
-    def add_news_headline_handler(self, handler):
+    def add_news_headline_handler(self, handler, *, execution=None):
         '''
         Register a function to handle news headlines as they are provided. See
         :ref:`registering_handlers` for details.
         '''
         self._handlers['NEWS_HEADLINE'].append(
-            self._BookHandler(handler, self.NewsHeadlineFields))
+            self._BookHandler(handler, self.NewsHeadlineFields, execution))
+
+    ##########################################################################
+    # Subscription management support
+
+    # Field enums of the services supported by update_subscriptions()
+    _SUBSCRIPTION_FIELD_TYPES = {
+        'CHART_EQUITY': ChartEquityFields,
+        'CHART_FUTURES': ChartFuturesFields,
+        'QUOTE': LevelOneEquityFields,
+        'OPTION': LevelOneOptionFields,
+        'LEVELONE_FUTURES': LevelOneFuturesFields,
+        'LEVELONE_FOREX': LevelOneForexFields,
+        'LEVELONE_FUTURES_OPTIONS': LevelOneFuturesOptionsFields,
+        'TIMESALE_EQUITY': TimesaleFields,
+        'TIMESALE_FUTURES': TimesaleFields,
+        'TIMESALE_OPTIONS': TimesaleFields,
+        'LISTED_BOOK': BookFields,
+        'NASDAQ_BOOK': BookFields,
+        'OPTIONS_BOOK': BookFields,
+        'NEWS_HEADLINE': NewsHeadlineFields,
+    }
+
+    # Services which only send the fields which changed
+    _LEVEL_ONE_SERVICES = {
+        'QUOTE', 'OPTION', 'LEVELONE_FUTURES', 'LEVELONE_FOREX',
+        'LEVELONE_FUTURES_OPTIONS'}
+
+    # Handler registration methods of the services supported by messages()
+    _HANDLER_METHODS = {
+        'ACCT_ACTIVITY': 'add_account_activity_handler',
+        'CHART_EQUITY': 'add_chart_equity_handler',
+        'CHART_FUTURES': 'add_chart_futures_handler',
+        'QUOTE': 'add_level_one_equity_handler',
+        'OPTION': 'add_level_one_option_handler',
+        'LEVELONE_FUTURES': 'add_level_one_futures_handler',
+        'LEVELONE_FOREX': 'add_level_one_forex_handler',
+        'LEVELONE_FUTURES_OPTIONS': 'add_level_one_futures_options_handler',
+        'TIMESALE_EQUITY': 'add_timesale_equity_handler',
+        'TIMESALE_FUTURES': 'add_timesale_futures_handler',
+        'TIMESALE_OPTIONS': 'add_timesale_options_handler',
+        'LISTED_BOOK': 'add_listed_book_handler',
+        'NASDAQ_BOOK': 'add_nasdaq_book_handler',
+        'OPTIONS_BOOK': 'add_options_book_handler',
+        'NEWS_HEADLINE': 'add_news_headline_handler',
+    }
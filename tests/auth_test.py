@@ -909,6 +909,34 @@ class TokenMetadataTest(unittest.TestCase):
         metadata = auth.TokenMetadata.from_loaded_token(token)
         self.assertEqual(metadata.creation_timestamp, None)
 
+    @no_duplicates
+    @patch('tda.auth.time.time', MagicMock(return_value=MOCK_NOW))
+    def test_refresh_token_update_not_due_silent_at_info(self):
+        metadata = auth.TokenMetadata(MOCK_NOW - 1)
+
+        # XXX: assertNoLogs is only available in 3.10+
+        with self.assertLogs('tda.auth', level='INFO') as log:
+            import logging
+            logging.getLogger('tda.auth').warning('dummy')
+
+            self.assertIsNone(
+                metadata.ensure_refresh_token_update(API_KEY, MagicMock()))
+
+            self.assertEqual(['WARNING:tda.auth:dummy'], log.output)
+
+    @no_duplicates
+    @patch('tda.auth.time.time', MagicMock(return_value=MOCK_NOW))
+    def test_refresh_token_update_not_due_logged_at_debug(self):
+        metadata = auth.TokenMetadata(MOCK_NOW - 1)
+
+        with self.assertLogs('tda.auth', level='DEBUG') as log:
+            self.assertIsNone(
+                metadata.ensure_refresh_token_update(API_KEY, MagicMock()))
+
+            self.assertEqual(1, len(log.output))
+            self.assertIn(
+                'DEBUG:tda.auth:Skipping refresh token update', log.output[0])
+
 
 class NormalizeAPIKeyTest(unittest.TestCase):
 
@@ -1,4 +1,5 @@
 import asyncio
+import asynctest
 import datetime
 import logging
 import os
@@ -8,6 +9,7 @@ import unittest
 from unittest.mock import ANY, MagicMock, Mock, patch
 
 from tda.client import AsyncClient, Client
+from tda.client.middleware import Delay, Middleware
 from tda.orders.generic import OrderBuilder
 
 from .utils import AsyncMagicMock, ResyncProxy, no_duplicates
@@ -85,6 +87,145 @@ class _TestClient:
         self.client.set_timeout(timeout)
         self.assertEqual(timeout, self.client.session.timeout)
 
+    def test_rate_limiter_reserves_before_request(self):
+        rate_limiter = MagicMock()
+        rate_limiter.reserve.return_value = 0
+        self.client.set_rate_limiter(rate_limiter)
+
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        rate_limiter.reserve.assert_called_once_with(
+            'GET', '/v1/accounts/{}/orders/{}'.format(ACCOUNT_ID, ORDER_ID))
+
+        rate_limiter.reserve.reset_mock()
+        self.client.cancel_order(ORDER_ID, ACCOUNT_ID)
+        rate_limiter.reserve.assert_called_once_with(
+            'DELETE', '/v1/accounts/{}/orders/{}'.format(ACCOUNT_ID, ORDER_ID))
+
+    def test_rate_limiter_unset(self):
+        rate_limiter = MagicMock()
+        self.client.set_rate_limiter(rate_limiter)
+        self.client.set_rate_limiter(None)
+
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        rate_limiter.reserve.assert_not_called()
+
+    def test_response_text_not_decoded_without_debug_logging(self):
+        self.client.logger.setLevel('INFO')
+        self.mock_session.get.return_value = Mock(spec=['status_code'])
+
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        self.mock_session.get.assert_called_once()
+
+    def test_middleware_modifies_request(self):
+        class AddParam(Middleware):
+            def handle_request(self, request):
+                request.params = dict(request.params, extra='value')
+                return (yield request)
+
+        self.client.add_middleware(AddParam())
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        self.mock_session.get.assert_called_once_with(
+            self.make_url('/v1/accounts/{accountId}/orders/{orderId}'),
+            params={'extra': 'value'})
+
+    def test_middleware_replaces_response(self):
+        class Cache(Middleware):
+            def handle_request(self, request):
+                return 'cached'
+                yield
+
+        self.client.add_middleware(Cache())
+        self.assertEqual('cached', self.client.get_order(ORDER_ID, ACCOUNT_ID))
+        self.mock_session.get.assert_not_called()
+
+    def test_middleware_retries(self):
+        self.mock_session.get.side_effect = [
+            MagicMock(status_code=429), MagicMock(status_code=200)]
+
+        class Retry(Middleware):
+            def handle_request(self, request):
+                while True:
+                    response = yield request
+                    if response.status_code != 429:
+                        return response
+                    yield Delay(0)
+
+        self.client.add_middleware(Retry())
+        resp = self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        self.assertEqual(200, resp.status_code)
+        self.assertEqual(2, self.mock_session.get.call_count)
+
+    def test_middleware_order(self):
+        calls = []
+
+        class Record(Middleware):
+            def __init__(self, name):
+                self.name = name
+
+            def handle_request(self, request):
+                calls.append(('request', self.name))
+                response = yield request
+                calls.append(('response', self.name))
+                return response
+
+        self.client.add_middleware(Record('outer'))
+        self.client.add_middleware(Record('inner'))
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        self.assertEqual([
+            ('request', 'outer'),
+            ('request', 'inner'),
+            ('response', 'inner'),
+            ('response', 'outer'),
+        ], calls)
+
+    def test_middleware_receives_exceptions(self):
+        self.mock_session.get.side_effect = ConnectionError('failed')
+
+        class Fallback(Middleware):
+            def handle_request(self, request):
+                try:
+                    return (yield request)
+                except ConnectionError:
+                    return 'fallback'
+
+        self.client.add_middleware(Fallback())
+        self.assertEqual(
+            'fallback', self.client.get_order(ORDER_ID, ACCOUNT_ID))
+
+    def test_middleware_exceptions_propagate(self):
+        self.mock_session.get.side_effect = ConnectionError('failed')
+
+        self.client.add_middleware(Middleware())
+        with self.assertRaisesRegex(ConnectionError, 'failed'):
+            self.client.get_order(ORDER_ID, ACCOUNT_ID)
+
+    def test_middleware_not_generator(self):
+        class NotGenerator(Middleware):
+            def handle_request(self, request):
+                return 'response'
+
+        self.client.add_middleware(NotGenerator())
+        with self.assertRaisesRegex(ValueError, 'must be a generator'):
+            self.client.get_order(ORDER_ID, ACCOUNT_ID)
+
+    def test_middleware_yields_unknown_instruction(self):
+        class YieldsPath(Middleware):
+            def handle_request(self, request):
+                return (yield request.path)
+
+        self.client.add_middleware(YieldsPath())
+        with self.assertRaisesRegex(
+                ValueError, 'expected a Request or Delay'):
+            self.client.get_order(ORDER_ID, ACCOUNT_ID)
+
+    def test_remove_middleware(self):
+        middleware = MagicMock()
+        self.client.add_middleware(middleware)
+        self.client.remove_middleware(middleware)
+
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        middleware.handle_request.assert_not_called()
+
 
     # get_order
 
@@ -2195,6 +2336,37 @@ class ClientTest(_TestClient, unittest.TestCase):
     client_class    = Client
     magicmock_class = MagicMock
 
+    @patch('tda.client.synchronous.time.sleep')
+    def test_rate_limiter_sleeps_for_delay(self, sleep):
+        rate_limiter = MagicMock()
+        rate_limiter.reserve.return_value = 1.5
+        self.client.set_rate_limiter(rate_limiter)
+
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        sleep.assert_called_once_with(1.5)
+        self.mock_session.get.assert_called_once()
+
+    @patch('tda.client.synchronous.time.sleep')
+    def test_rate_limiter_no_delay(self, sleep):
+        rate_limiter = MagicMock()
+        rate_limiter.reserve.return_value = 0
+        self.client.set_rate_limiter(rate_limiter)
+
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        sleep.assert_not_called()
+
+    @patch('tda.client.synchronous.time.sleep')
+    def test_middleware_delay(self, sleep):
+        class Wait(Middleware):
+            def handle_request(self, request):
+                yield Delay(2.5)
+                return (yield request)
+
+        self.client.add_middleware(Wait())
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        sleep.assert_called_once_with(2.5)
+        self.mock_session.get.assert_called_once()
+
 class AsyncClientTest(_TestClient, unittest.TestCase):
     """
     Subclass set to resync AsyncClient and use AsyncMagicMock
@@ -2204,3 +2376,27 @@ class AsyncClientTest(_TestClient, unittest.TestCase):
 
     def test_async_close(self):
         self.client.close_async_session()
+
+    @patch('tda.client.asynchronous.asyncio.sleep',
+           new_callable=asynctest.CoroutineMock)
+    def test_rate_limiter_sleeps_for_delay(self, sleep):
+        rate_limiter = MagicMock()
+        rate_limiter.reserve.return_value = 1.5
+        self.client.set_rate_limiter(rate_limiter)
+
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        sleep.assert_called_once_with(1.5)
+        self.mock_session.get.assert_called_once()
+
+    @patch('tda.client.asynchronous.asyncio.sleep',
+           new_callable=asynctest.CoroutineMock)
+    def test_middleware_delay(self, sleep):
+        class Wait(Middleware):
+            def handle_request(self, request):
+                yield Delay(2.5)
+                return (yield request)
+
+        self.client.add_middleware(Wait())
+        self.client.get_order(ORDER_ID, ACCOUNT_ID)
+        sleep.assert_called_once_with(2.5)
+        self.mock_session.get.assert_called_once()
@@ -0,0 +1,189 @@
+import unittest
+from unittest.mock import MagicMock
+
+from tda.contrib.bars import Bar, BarAggregator, BarHistory, BarType
+from tda.streaming import StreamClient
+
+
+def timesale_message(service, *content):
+    return {
+        'service': service,
+        'timestamp': 1590598398836,
+        'command': 'SUBS',
+        'content': list(content),
+    }
+
+
+def timesale_print(symbol, trade_time, price, size):
+    return {
+        'key': symbol,
+        'seq': 1,
+        'TRADE_TIME': trade_time,
+        'LAST_PRICE': price,
+        'LAST_SIZE': size,
+        'LAST_SEQUENCE': 1,
+    }
+
+
+class BarHistoryTest(unittest.TestCase):
+
+    def bar(self, i):
+        return Bar('GOOG', i, i + 1, i, i, i, float(i), 10.0, 1)
+
+    def test_empty(self):
+        history = BarHistory('GOOG', 3)
+        self.assertEqual(len(history), 0)
+        self.assertEqual(list(history), [])
+        self.assertEqual(list(history.closes()), [])
+        with self.assertRaises(IndexError):
+            history[-1]
+
+    def test_wraps_around(self):
+        history = BarHistory('GOOG', 3)
+        for i in range(5):
+            history._append(self.bar(i))
+
+        self.assertEqual(len(history), 3)
+        self.assertEqual(list(history), [self.bar(2), self.bar(3), self.bar(4)])
+        self.assertEqual(history[0], self.bar(2))
+        self.assertEqual(history[-1], self.bar(4))
+        self.assertEqual(list(history.closes()), [2.0, 3.0, 4.0])
+        self.assertEqual(list(history.volumes()), [10.0, 10.0, 10.0])
+        with self.assertRaises(IndexError):
+            history[3]
+
+
+class BarAggregatorTest(unittest.TestCase):
+
+    def aggregator(self, bar_type, size, **kwargs):
+        aggregator = BarAggregator(bar_type, size, **kwargs)
+        self.bars = []
+        aggregator.add_bar_handler(self.bars.append)
+        return aggregator
+
+    def test_invalid_arguments(self):
+        with self.assertRaisesRegex(ValueError, 'size must be positive'):
+            BarAggregator(BarType.TICK, 0)
+        with self.assertRaisesRegex(ValueError, 'history must be positive'):
+            BarAggregator(BarType.TICK, 10, history=0)
+        with self.assertRaisesRegex(ValueError, 'at least one millisecond'):
+            BarAggregator(BarType.TIME, 0.0001)
+        with self.assertRaises(ValueError):
+            BarAggregator('RANGE', 10)
+
+    def test_register_all_services(self):
+        aggregator = BarAggregator(BarType.TICK, 10)
+        client = MagicMock()
+        aggregator.register(client)
+
+        for method in (client.add_timesale_equity_handler,
+                       client.add_timesale_futures_handler,
+                       client.add_timesale_options_handler):
+            method.assert_called_once_with(
+                aggregator.handle_message, fields=[
+                    StreamClient.TimesaleFields.SYMBOL,
+                    StreamClient.TimesaleFields.TRADE_TIME,
+                    StreamClient.TimesaleFields.LAST_PRICE,
+                    StreamClient.TimesaleFields.LAST_SIZE])
+
+    def test_register_unsupported_service(self):
+        with self.assertRaisesRegex(ValueError, 'unsupported service'):
+            BarAggregator(BarType.TICK, 10).register(
+                MagicMock(), services=['QUOTE'])
+
+    def test_time_bars(self):
+        aggregator = self.aggregator(BarType.TIME, 60)
+        aggregator.handle_message(timesale_message(
+            'TIMESALE_EQUITY',
+            timesale_print('GOOG', 60000, 100.0, 10),
+            timesale_print('GOOG', 75000, 101.5, 20),
+            timesale_print('GOOG', 90000, 99.5, 5),
+            timesale_print('GOOG', 119999, 100.5, 15)))
+
+        self.assertEqual(self.bars, [])
+        self.assertEqual(aggregator.current('GOOG'), Bar(
+            'GOOG', 60000, 120000, 100.0, 101.5, 99.5, 100.5, 50, 4))
+
+        aggregator.add_print('GOOG', 185000, 102.0, 1)
+        self.assertEqual(self.bars, [
+            Bar('GOOG', 60000, 120000, 100.0, 101.5, 99.5, 100.5, 50, 4)])
+        self.assertEqual(aggregator.current('GOOG'), Bar(
+            'GOOG', 180000, 240000, 102.0, 102.0, 102.0, 102.0, 1, 1))
+        self.assertEqual(list(aggregator.history('GOOG')), self.bars)
+
+    def test_close_elapsed_bars(self):
+        aggregator = self.aggregator(BarType.TIME, 1)
+        aggregator.add_print('GOOG', 1500, 100.0, 10)
+        aggregator.add_print('MSFT', 2500, 200.0, 10)
+
+        aggregator.close_elapsed_bars(1999)
+        self.assertEqual(self.bars, [])
+
+        aggregator.close_elapsed_bars(2000)
+        self.assertEqual(self.bars, [
+            Bar('GOOG', 1000, 2000, 100.0, 100.0, 100.0, 100.0, 10, 1)])
+        self.assertIsNone(aggregator.current('GOOG'))
+        self.assertIsNotNone(aggregator.current('MSFT'))
+
+    def test_tick_bars(self):
+        aggregator = self.aggregator(BarType.TICK, 3)
+        for i, price in enumerate([10.0, 12.0, 11.0, 9.0]):
+            aggregator.add_print('GOOG', 1000 + i, price, 100)
+
+        self.assertEqual(self.bars, [
+            Bar('GOOG', 1000, 1002, 10.0, 12.0, 10.0, 11.0, 300, 3)])
+        self.assertEqual(aggregator.current('GOOG'), Bar(
+            'GOOG', 1003, 1003, 9.0, 9.0, 9.0, 9.0, 100, 1))
+
+        # Tick and volume bars only close on prints
+        aggregator.close_elapsed_bars(10 ** 15)
+        self.assertEqual(len(self.bars), 1)
+
+    def test_volume_bars(self):
+        aggregator = self.aggregator(BarType.VOLUME, 100)
+        aggregator.add_print('GOOG', 1000, 10.0, 60)
+        aggregator.add_print('GOOG', 1001, 10.5, 30)
+        aggregator.add_print('GOOG', 1002, 9.5, 50)
+        aggregator.add_print('GOOG', 1003, 9.0, 100)
+
+        self.assertEqual(self.bars, [
+            Bar('GOOG', 1000, 1002, 10.0, 10.5, 9.5, 9.5, 140, 3),
+            Bar('GOOG', 1003, 1003, 9.0, 9.0, 9.0, 9.0, 100, 1)])
+        self.assertIsNone(aggregator.current('GOOG'))
+
+    def test_symbols_and_services_are_separate(self):
+        aggregator = self.aggregator(BarType.TICK, 2)
+        aggregator.handle_message(timesale_message(
+            'TIMESALE_EQUITY',
+            timesale_print('GOOG', 1000, 100.0, 1),
+            timesale_print('MSFT', 1000, 200.0, 1)))
+        aggregator.handle_message(timesale_message(
+            'TIMESALE_FUTURES', timesale_print('GOOG', 1001, 300.0, 1)))
+
+        self.assertEqual(self.bars, [])
+        self.assertEqual(aggregator.current('GOOG').close, 100.0)
+        self.assertEqual(
+            aggregator.current('GOOG', service='TIMESALE_FUTURES').close,
+            300.0)
+        self.assertIsNone(aggregator.history('AAPL'))
+
+    def test_entries_missing_fields_are_skipped(self):
+        aggregator = self.aggregator(BarType.TICK, 10)
+        partial = timesale_print('GOOG', 1001, 101.0, 1)
+        del partial['LAST_SIZE']
+        aggregator.handle_message(timesale_message(
+            'TIMESALE_EQUITY',
+            timesale_print('GOOG', 1000, 100.0, 1),
+            partial,
+            {'key': 'GOOG', 'seq': 2}))
+
+        self.assertEqual(aggregator.current('GOOG'), Bar(
+            'GOOG', 1000, 1000, 100.0, 100.0, 100.0, 100.0, 1, 1))
+
+    def test_history_capacity(self):
+        aggregator = self.aggregator(BarType.TICK, 1, history=2)
+        for i in range(5):
+            aggregator.add_print('GOOG', i, float(i), 1)
+
+        self.assertEqual(len(self.bars), 5)
+        self.assertEqual(list(aggregator.history('GOOG').closes()), [3.0, 4.0])
@@ -0,0 +1,158 @@
+import unittest
+from unittest.mock import MagicMock
+
+from tda.contrib.book import OrderBook, OrderBooks
+
+
+def bid(price, size, *exchanges):
+    return {
+        'BID_PRICE': price,
+        'TOTAL_VOLUME': size,
+        'NUM_BIDS': len(exchanges),
+        'BIDS': [{'EXCHANGE': name, 'BID_VOLUME': volume, 'SEQUENCE': 1}
+                 for name, volume in exchanges],
+    }
+
+
+def ask(price, size, *exchanges):
+    return {
+        'ASK_PRICE': price,
+        'TOTAL_VOLUME': size,
+        'NUM_ASKS': len(exchanges),
+        'ASKS': [{'EXCHANGE': name, 'ASK_VOLUME': volume, 'SEQUENCE': 1}
+                 for name, volume in exchanges],
+    }
+
+
+def book_content(symbol, book_time, bids, asks):
+    return {
+        'key': symbol,
+        'BOOK_TIME': book_time,
+        'BIDS': bids,
+        'ASKS': asks,
+    }
+
+
+class OrderBookTest(unittest.TestCase):
+
+    def setUp(self):
+        self.book = OrderBook('MSFT')
+        self.book.apply(book_content('MSFT', 1000, [
+            bid(181.75, 545, ('NSDQ', 345), ('ARCX', 200)),
+            bid(181.77, 100, ('edgx', 100)),
+        ], [
+            ask(181.95, 100, ('NSDQ', 100)),
+            ask(181.90, 200, ('ARCX', 200)),
+            ask(182.00, 300, ('NSDQ', 100), ('edgx', 200)),
+        ]))
+
+    def test_levels_sorted_best_first(self):
+        self.assertEqual(len(self.book.bids), 2)
+        self.assertEqual(self.book.bids.price(0), 181.77)
+        self.assertEqual(self.book.bids.price(1), 181.75)
+
+        self.assertEqual(len(self.book.asks), 3)
+        self.assertEqual(self.book.asks.price(0), 181.90)
+        self.assertEqual(self.book.asks.price(1), 181.95)
+        self.assertEqual(self.book.asks.price(2), 182.00)
+
+        self.assertEqual(self.book.book_time, 1000)
+        self.assertEqual(self.book.version, 1)
+
+    def test_top_and_spread(self):
+        self.assertEqual(self.book.top(), ((181.77, 100), (181.90, 200)))
+        self.assertAlmostEqual(self.book.spread(), 0.13)
+
+    def test_empty_book(self):
+        book = OrderBook('GOOG')
+        self.assertEqual(book.top(), (None, None))
+        self.assertIsNone(book.spread())
+        self.assertEqual(book.bids.depth(5), [])
+        self.assertEqual(book.asks.cumulative_size(), 0)
+
+    def test_depth(self):
+        self.assertEqual(self.book.asks.depth(2),
+                         [(181.90, 200), (181.95, 100)])
+        self.assertEqual(self.book.bids.depth(10),
+                         [(181.77, 100), (181.75, 545)])
+
+    def test_cumulative_size(self):
+        self.assertEqual(self.book.asks.cumulative_size(2), 300)
+        self.assertEqual(self.book.asks.cumulative_size(), 600)
+        self.assertEqual(self.book.bids.cumulative_size(1), 100)
+
+    def test_size_at(self):
+        self.assertEqual(self.book.bids.size_at(181.75), 545)
+        self.assertEqual(self.book.asks.size_at(182.00), 300)
+        self.assertEqual(self.book.asks.size_at(181.00), 0)
+
+    def test_per_exchange(self):
+        self.assertEqual(self.book.bids.exchanges(1),
+                         {'NSDQ': 345, 'ARCX': 200})
+        self.assertEqual(self.book.bids.order_count(1), 2)
+        self.assertEqual(self.book.asks.exchange_size('NSDQ'), 200)
+        self.assertEqual(self.book.asks.exchange_size('NSDQ', 2), 100)
+        self.assertEqual(self.book.asks.exchange_size('BATS'), 0)
+
+    def test_update_applied_as_diff(self):
+        best_ask_exchanges = self.book.asks.exchanges(1)
+
+        self.book.apply(book_content('MSFT', 2000, [
+            bid(181.77, 300, ('edgx', 100), ('NSDQ', 200)),
+            bid(181.70, 50, ('ARCX', 50)),
+        ], [
+            ask(181.95, 150, ('NSDQ', 150)),
+            ask(181.85, 10, ('edgx', 10)),
+        ]))
+
+        self.assertEqual(self.book.bids.depth(5),
+                         [(181.77, 300), (181.70, 50)])
+        self.assertEqual(self.book.asks.depth(5),
+                         [(181.85, 10), (181.95, 150)])
+        self.assertEqual(self.book.bids.exchanges(0),
+                         {'edgx': 100, 'NSDQ': 200})
+        self.assertEqual(self.book.book_time, 2000)
+        self.assertEqual(self.book.version, 2)
+
+        # Unchanged price levels are updated in place
+        self.assertIs(self.book.asks.exchanges(1), best_ask_exchanges)
+        self.assertEqual(best_ask_exchanges, {'NSDQ': 150})
+
+    def test_side_emptied(self):
+        self.book.apply(book_content('MSFT', 2000, [], []))
+        self.assertEqual(len(self.book.bids), 0)
+        self.assertEqual(len(self.book.asks), 0)
+
+
+class OrderBooksTest(unittest.TestCase):
+
+    def test_register_all_services(self):
+        books = OrderBooks()
+        client = MagicMock()
+        books.register(client)
+
+        for method in (client.add_listed_book_handler,
+                       client.add_nasdaq_book_handler,
+                       client.add_options_book_handler):
+            method.assert_called_once_with(books.handle_message)
+
+    def test_register_unsupported_service(self):
+        with self.assertRaisesRegex(ValueError, 'unsupported service'):
+            OrderBooks().register(MagicMock(), services=['QUOTE'])
+
+    def test_books_per_service_and_symbol(self):
+        books = OrderBooks()
+        books.handle_message({
+            'service': 'NASDAQ_BOOK',
+            'timestamp': 1590532470149,
+            'command': 'SUBS',
+            'content': [
+                book_content('MSFT', 1000, [bid(181.77, 100)], []),
+                book_content('GOOG', 1000, [], [ask(1400.0, 5)]),
+            ],
+        })
+
+        self.assertEqual(books.get('MSFT').top(), ((181.77, 100), None))
+        self.assertEqual(books.get('GOOG').top(), (None, (1400.0, 5)))
+        self.assertIsNone(books.get('MSFT', service='LISTED_BOOK'))
+        self.assertIsNone(books.get('AAPL'))
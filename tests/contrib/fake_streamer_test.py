@@ -0,0 +1,114 @@
+import asyncio
+
+import asynctest
+
+from tda.contrib.fake_streamer import FakeStreamer, FakeStreamerProcess
+from tda.streaming import StreamClient
+
+
+class FakeStreamerTest(asynctest.TestCase):
+
+    async def handle_until(self, stream_client, predicate, max_messages=1000):
+        for _ in range(max_messages):
+            if predicate():
+                return
+            await stream_client.handle_message()
+        self.fail('condition never became true')
+
+    async def test_login_subscribe_and_receive(self):
+        async with FakeStreamer(messages_per_second=500) as streamer:
+            stream_client = streamer.stream_client()
+            await stream_client.login()
+            await stream_client.quality_of_service(
+                StreamClient.QOSLevel.EXPRESS)
+
+            messages = []
+            stream_client.add_level_one_equity_handler(messages.append)
+            await stream_client.level_one_equity_subs(
+                ['GOOG', 'MSFT'], fields=[
+                    StreamClient.LevelOneEquityFields.SYMBOL,
+                    StreamClient.LevelOneEquityFields.BID_PRICE])
+
+            await self.handle_until(stream_client, lambda: len(messages) >= 3)
+
+            self.assertEqual(messages[0]['service'], 'QUOTE')
+            self.assertEqual(
+                sorted(entry['key'] for entry in messages[0]['content']),
+                ['GOOG', 'MSFT'])
+            self.assertEqual(
+                set(messages[0]['content'][0]), {'key', 'BID_PRICE'})
+            self.assertEqual(streamer.requests_received, 3)
+            self.assertGreaterEqual(streamer.frames_sent, 3)
+
+    async def test_symbols_per_message_and_unsubscribe(self):
+        async with FakeStreamer(
+                messages_per_second=500, symbols_per_message=2,
+                compression=False) as streamer:
+            stream_client = streamer.stream_client()
+            await stream_client.login()
+
+            quotes = []
+            stream_client.add_level_one_equity_handler(quotes.append)
+            books = []
+            stream_client.add_nasdaq_book_handler(books.append)
+
+            await stream_client.level_one_equity_subs(['A', 'B', 'C'])
+            await stream_client.nasdaq_book_subs(['GOOG'])
+            await self.handle_until(
+                stream_client, lambda: len(quotes) >= 4 and books)
+
+            self.assertEqual(
+                [[entry['key'] for entry in msg['content']]
+                 for msg in quotes[:2]],
+                [['A', 'B'], ['C']])
+            self.assertEqual(books[0]['content'][0]['key'], 'GOOG')
+            self.assertEqual(len(books[0]['content'][0]['BIDS']), 5)
+
+            await stream_client.level_one_equity_unsubs(['A', 'B', 'C'])
+            del books[:]
+            del quotes[:]
+            await self.handle_until(stream_client, lambda: len(books) >= 3)
+            self.assertEqual(quotes, [])
+
+    async def test_heartbeats(self):
+        async with FakeStreamer(
+                heartbeat_interval_seconds=0.01) as streamer:
+            stream_client = streamer.stream_client()
+            await stream_client.login()
+
+            # Heartbeats are consumed without reaching any handler
+            await asyncio.wait_for(stream_client.handle_message(), 5)
+
+    async def test_reconnect_after_dropped_connection(self):
+        async with FakeStreamer(messages_per_second=500) as streamer:
+            stream_client = streamer.stream_client()
+            stream_client.enable_auto_reconnect(initial_delay_seconds=0.01)
+            await stream_client.login()
+
+            messages = []
+            stream_client.add_level_one_equity_handler(messages.append)
+            await stream_client.level_one_equity_subs(['GOOG'])
+            await self.handle_until(stream_client, lambda: messages)
+
+            await streamer.drop_connections()
+            del messages[:]
+            await self.handle_until(stream_client, lambda: messages)
+
+            self.assertEqual(stream_client.reconnect_metrics()['reconnects'], 1)
+            self.assertEqual(messages[0]['content'][0]['key'], 'GOOG')
+
+
+class FakeStreamerProcessTest(asynctest.TestCase):
+
+    async def test_serve_from_process(self):
+        with FakeStreamerProcess(messages_per_second=500) as streamer:
+            stream_client = streamer.stream_client()
+            await stream_client.login()
+
+            messages = []
+            stream_client.add_level_one_equity_handler(messages.append)
+            await stream_client.level_one_equity_subs(['GOOG'])
+            while not messages:
+                await stream_client.handle_message()
+
+            self.assertEqual(messages[0]['content'][0]['key'], 'GOOG')
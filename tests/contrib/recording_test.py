@@ -0,0 +1,168 @@
+import asyncio
+import json
+import os
+import tempfile
+import unittest
+from unittest.mock import MagicMock, Mock
+
+import asynctest
+
+from tda.contrib.recording import (
+    FrameLogReader, ReplayFinished, ReplaySocket, SegmentedFrameLog, replay)
+from tda.streaming import FastJsonStreamDecoder, StreamClient
+
+
+def quote_frame(symbol, bid):
+    return json.dumps({'data': [{
+        'service': 'QUOTE',
+        'command': 'SUBS',
+        'timestamp': 1590116673258,
+        'content': [{'key': symbol, '1': bid}],
+    }]})
+
+
+class SegmentedFrameLogTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = os.path.join(self.tmpdir.name, 'frames')
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def test_round_trip(self):
+        with SegmentedFrameLog(self.directory) as log:
+            log.record_frame('{"a": 1}', 100.5)
+            log.record_frame(b'{"b": "\xc3\xa9"}', 101.25)
+
+        self.assertEqual(list(FrameLogReader(self.directory)), [
+            (100.5, '{"a": 1}'),
+            (101.25, '{"b": "é"}'),
+        ])
+
+    def test_read_bytes(self):
+        with SegmentedFrameLog(self.directory) as log:
+            log.record_frame('{"a": 1}', 100.5)
+
+        self.assertEqual(list(FrameLogReader(self.directory, decode=False)),
+                         [(100.5, b'{"a": 1}')])
+
+    def test_segments_rotate(self):
+        with SegmentedFrameLog(self.directory, max_segment_bytes=64) as log:
+            for i in range(10):
+                log.record_frame('{"frame": %d}' % i, float(i))
+
+        self.assertGreater(len(os.listdir(self.directory)), 1)
+        self.assertEqual(
+            [raw for _, raw in FrameLogReader(self.directory)],
+            ['{"frame": %d}' % i for i in range(10)])
+
+    def test_new_recording_appends_segment(self):
+        with SegmentedFrameLog(self.directory) as log:
+            log.record_frame('first', 1.0)
+        with SegmentedFrameLog(self.directory) as log:
+            log.record_frame('second', 2.0)
+
+        self.assertEqual(sorted(os.listdir(self.directory)),
+                         ['frames-000001.log', 'frames-000002.log'])
+        self.assertEqual(
+            [raw for _, raw in FrameLogReader(self.directory)],
+            ['first', 'second'])
+
+    def test_truncated_record_ends_segment(self):
+        with SegmentedFrameLog(self.directory) as log:
+            log.record_frame('complete', 1.0)
+            log.record_frame('truncated', 2.0)
+
+        path = os.path.join(self.directory, 'frames-000001.log')
+        with open(path, 'r+b') as f:
+            f.truncate(os.path.getsize(path) - 3)
+
+        self.assertEqual(list(FrameLogReader(self.directory)),
+                         [(1.0, 'complete')])
+
+    def test_empty_segment(self):
+        SegmentedFrameLog(self.directory).close()
+        self.assertEqual(list(FrameLogReader(self.directory)), [])
+
+    def test_invalid_segment(self):
+        os.makedirs(self.directory)
+        with open(os.path.join(
+                self.directory, 'frames-000001.log'), 'wb') as f:
+            f.write(b'not a frame log segment')
+
+        with self.assertRaisesRegex(ValueError, 'not a frame log segment'):
+            list(FrameLogReader(self.directory))
+
+
+class ReplayTest(asynctest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.directory = self.tmpdir.name
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    async def test_replay_socket_max_speed(self):
+        socket = ReplaySocket([(1.0, 'a'), (1000.0, 'b')], speed=None)
+        self.assertEqual(await socket.recv(), 'a')
+        self.assertEqual(await socket.recv(), 'b')
+        with self.assertRaises(ReplayFinished):
+            await socket.recv()
+
+    @asynctest.patch('asyncio.sleep', new_callable=asynctest.CoroutineMock)
+    async def test_replay_socket_paced(self, sleep):
+        socket = ReplaySocket([(10.0, 'a'), (12.0, 'b')], speed=4.0)
+        self.assertEqual(await socket.recv(), 'a')
+        sleep.assert_not_awaited()
+        self.assertEqual(await socket.recv(), 'b')
+
+        sleep.assert_awaited_once()
+        self.assertAlmostEqual(sleep.await_args[0][0], 0.5, places=2)
+
+    def test_replay_socket_invalid_speed(self):
+        with self.assertRaisesRegex(ValueError, 'speed must be positive'):
+            ReplaySocket([], speed=0)
+
+    async def test_replay_socket_cannot_send(self):
+        with self.assertRaisesRegex(ValueError, 'replayed stream'):
+            await ReplaySocket([]).send('{}')
+
+    async def test_replay_through_stream_client(self):
+        login_response = json.dumps({'response': [{
+            'service': 'ADMIN',
+            'requestid': '0',
+            'command': 'LOGIN',
+            'timestamp': 1590116673258,
+            'content': {'code': 0, 'msg': 'success'},
+        }]})
+        with SegmentedFrameLog(self.directory) as log:
+            log.record_frame(login_response, 1.0)
+            log.record_frame(quote_frame('GOOG', 100.0), 2.0)
+            log.record_frame(quote_frame('MSFT', 200.0), 3.0)
+
+        client = StreamClient(MagicMock())
+        handler = Mock()
+        client.add_level_one_equity_handler(handler)
+
+        await replay(client, self.directory, speed=None)
+
+        self.assertEqual(
+            [c[0][0]['content'] for c in handler.call_args_list],
+            [[{'key': 'GOOG', 'BID_PRICE': 100.0}],
+             [{'key': 'MSFT', 'BID_PRICE': 200.0}]])
+
+    async def test_replay_with_fast_decoder(self):
+        with SegmentedFrameLog(self.directory) as log:
+            log.record_frame(quote_frame('GOOG', 100.0), 1.0)
+
+        client = StreamClient(MagicMock())
+        client.set_json_decoder(FastJsonStreamDecoder())
+        handler = Mock()
+        client.add_level_one_equity_handler(handler)
+
+        await replay(client, self.directory, speed=None)
+
+        self.assertEqual(handler.call_args[0][0]['content'],
+                         [{'key': 'GOOG', 'BID_PRICE': 100.0}])
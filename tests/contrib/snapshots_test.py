@@ -0,0 +1,138 @@
+import unittest
+from unittest.mock import MagicMock
+
+from tda.contrib.snapshots import QuoteSnapshots
+from tda.streaming import StreamClient
+
+
+def level_one_message(service, *content):
+    return {
+        'service': service,
+        'timestamp': 1590598398836,
+        'command': 'SUBS',
+        'content': list(content),
+    }
+
+
+class QuoteSnapshotsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.snapshots = QuoteSnapshots()
+
+    def test_register_all_services(self):
+        client = MagicMock()
+        self.snapshots.register(client)
+
+        for method, fields in (
+                (client.add_level_one_equity_handler,
+                 StreamClient.LevelOneEquityFields),
+                (client.add_level_one_option_handler,
+                 StreamClient.LevelOneOptionFields),
+                (client.add_level_one_futures_handler,
+                 StreamClient.LevelOneFuturesFields),
+                (client.add_level_one_forex_handler,
+                 StreamClient.LevelOneForexFields),
+                (client.add_level_one_futures_options_handler,
+                 StreamClient.LevelOneFuturesOptionsFields)):
+            method.assert_called_once_with(
+                self.snapshots.handle_message, fields=list(fields))
+
+    def test_register_selected_services(self):
+        client = MagicMock()
+        self.snapshots.register(client, services=['LEVELONE_FUTURES'])
+
+        client.add_level_one_futures_handler.assert_called_once_with(
+            self.snapshots.handle_message,
+            fields=list(StreamClient.LevelOneFuturesFields))
+        client.add_level_one_equity_handler.assert_not_called()
+
+    def test_register_unsupported_service(self):
+        with self.assertRaisesRegex(ValueError, 'unsupported service'):
+            self.snapshots.register(MagicMock(), services=['CHART_EQUITY'])
+
+    def test_deltas_are_merged(self):
+        self.snapshots.handle_message(level_one_message('QUOTE', {
+            'key': 'GOOG',
+            'delayed': False,
+            'BID_PRICE': 100.0,
+            'ASK_PRICE': 100.5,
+        }))
+        self.snapshots.handle_message(level_one_message('QUOTE', {
+            'key': 'GOOG',
+            'delayed': False,
+            'ASK_PRICE': 100.25,
+            'LAST_PRICE': 100.1,
+        }))
+
+        self.assertEqual(self.snapshots.get('GOOG'), {
+            'key': 'GOOG',
+            'BID_PRICE': 100.0,
+            'ASK_PRICE': 100.25,
+            'LAST_PRICE': 100.1,
+        })
+        self.assertEqual(
+            self.snapshots.get_field(
+                'GOOG', StreamClient.LevelOneEquityFields.ASK_PRICE),
+            100.25)
+
+    def test_services_are_separate(self):
+        self.snapshots.handle_message(level_one_message(
+            'LEVELONE_FUTURES', {'key': '/ES', 'BID_PRICE': 4000.0}))
+
+        self.assertIsNone(self.snapshots.get('/ES'))
+        self.assertEqual(
+            self.snapshots.get('/ES', service='LEVELONE_FUTURES'),
+            {'key': '/ES', 'BID_PRICE': 4000.0})
+        self.assertEqual(
+            self.snapshots.get_field(
+                '/ES', StreamClient.LevelOneFuturesFields.BID_PRICE),
+            4000.0)
+        self.assertIsNone(self.snapshots.get_field(
+            '/ES', StreamClient.LevelOneEquityFields.BID_PRICE))
+
+    def test_unknown_symbol_and_field(self):
+        self.snapshots.handle_message(level_one_message(
+            'QUOTE', {'key': 'GOOG', 'BID_PRICE': 100.0}))
+
+        self.assertIsNone(self.snapshots.get('MSFT'))
+        self.assertIsNone(self.snapshots.get_field(
+            'MSFT', StreamClient.LevelOneEquityFields.BID_PRICE))
+        self.assertIsNone(self.snapshots.get_field(
+            'GOOG', StreamClient.LevelOneEquityFields.ASK_PRICE))
+
+    def test_get_field_requires_level_one_field(self):
+        with self.assertRaisesRegex(ValueError, 'not a level one field'):
+            self.snapshots.get_field(
+                'GOOG', StreamClient.ChartEquityFields.CLOSE_PRICE)
+
+    def test_versions(self):
+        self.assertEqual(self.snapshots.version, 0)
+        self.assertEqual(self.snapshots.symbol_version('GOOG'), 0)
+
+        self.snapshots.handle_message(level_one_message(
+            'QUOTE',
+            {'key': 'GOOG', 'BID_PRICE': 100.0},
+            {'key': 'MSFT', 'BID_PRICE': 200.0}))
+        self.snapshots.handle_message(level_one_message(
+            'QUOTE', {'key': 'GOOG', 'BID_PRICE': 101.0}))
+
+        self.assertEqual(self.snapshots.version, 3)
+        self.assertEqual(self.snapshots.symbol_version('GOOG'), 2)
+        self.assertEqual(self.snapshots.symbol_version('MSFT'), 1)
+        self.assertEqual(
+            self.snapshots.symbol_version('GOOG', service='OPTION'), 0)
+        self.assertEqual(sorted(self.snapshots.symbols()), ['GOOG', 'MSFT'])
+        self.assertEqual(self.snapshots.symbols('OPTION'), [])
+
+    def test_labeled_stream_message(self):
+        raw = level_one_message('QUOTE', {
+            'key': 'GOOG', 'delayed': False, '1': 100.0, '2': 100.5})
+        labeled = StreamClient.LevelOneEquityFields.relabel_content(
+            raw['content'][0])
+        self.snapshots.handle_message(level_one_message('QUOTE', labeled))
+
+        # Matches the relabeled content, other than fields which aren't level
+        # one fields
+        del labeled['delayed']
+        self.assertEqual(self.snapshots.get('GOOG'), labeled)
+        self.assertEqual(list(self.snapshots.get('GOOG')), list(labeled))
@@ -10,6 +10,12 @@ class HeuristicJsonDecoderTest(unittest.TestCase):
             {r'\\\\': 'test'})
 
 
+    def test_raw_bytes_decode(self):
+        self.assertEqual(HeuristicJsonDecoder().decode_json_bytes(
+            rb'{"\\\\\\\\": "test"}'),
+            {r'\\\\': 'test'})
+
+
     def test_replace_backslashes(self):
         # TODO: Actually collect some failing use cases...
         pass
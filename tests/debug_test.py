@@ -55,6 +55,9 @@ class RegisterRedactionsTest(unittest.TestCase):
             output=self.captured, loggers=[self.logger])
         tda.LOG_REDACTOR = tda.debug.LogRedactor()
 
+    def tearDown(self):
+        tda.debug._bug_report_logging_enabled = False
+
     @no_duplicates
     def test_empty_string(self):
         tda.debug.register_redactions('')
@@ -131,6 +134,27 @@ class RegisterRedactionsTest(unittest.TestCase):
         tda.debug.register_redactions_from_response(resp)
         register_redactions.assert_called_with({'success': 1})
 
+    @no_duplicates
+    @patch('tda.debug.register_redactions', new_callable=Mock)
+    def test_register_from_request_logging_disabled(self, register_redactions):
+        tda.debug._bug_report_logging_enabled = False
+
+        resp = MockResponse({'success': 1}, 200)
+        tda.debug.register_redactions_from_response(resp)
+        register_redactions.assert_not_called()
+
+    @no_duplicates
+    def test_register_from_request_redacted_on_write(self):
+        resp = MockResponse({'accountId': '123456789'}, 200)
+        tda.debug.register_redactions_from_response(resp)
+
+        self.logger.info('Account: 123456789')
+
+        self.dump_logs()
+        self.assertRegex(
+            self.captured.getvalue(),
+            r'\[.*\] Account: <REDACTED accountId>\n')
+
     @no_duplicates
     @patch('tda.debug.register_redactions', new_callable=Mock)
     def test_register_from_request_not_okay(self, register_redactions):
@@ -0,0 +1,247 @@
+import multiprocessing
+import os
+import pickle
+import tempfile
+import time
+import unittest
+
+from tda.ratelimit import (
+    EndpointClass, FileTokenBucket, RateLimiter, TokenBucket, endpoint_class)
+from .utils import no_duplicates
+from unittest.mock import MagicMock
+
+
+def _reserve_from_file_bucket(bucket, count, queue):
+    bucket._clock = lambda: 1000.0
+    queue.put([bucket.reserve() for _ in range(count)])
+
+
+class EndpointClassTest(unittest.TestCase):
+
+    @no_duplicates
+    def test_order_writes(self):
+        for method in ('POST', 'PUT', 'DELETE'):
+            self.assertEqual(
+                EndpointClass.ORDERS,
+                endpoint_class(method, '/v1/accounts/123/orders'))
+            self.assertEqual(
+                EndpointClass.ORDERS,
+                endpoint_class(method, '/v1/accounts/123/orders/456'))
+            self.assertEqual(
+                EndpointClass.ORDERS,
+                endpoint_class(method, '/v1/accounts/123/savedorders/456'))
+
+    @no_duplicates
+    def test_order_reads_are_accounts(self):
+        self.assertEqual(
+            EndpointClass.ACCOUNTS,
+            endpoint_class('GET', '/v1/accounts/123/orders/456'))
+        self.assertEqual(
+            EndpointClass.ACCOUNTS, endpoint_class('GET', '/v1/orders'))
+
+    @no_duplicates
+    def test_market_data(self):
+        self.assertEqual(
+            EndpointClass.MARKET_DATA,
+            endpoint_class('GET', '/v1/marketdata/AAPL/pricehistory'))
+        self.assertEqual(
+            EndpointClass.MARKET_DATA,
+            endpoint_class('GET', '/v1/marketdata/quotes'))
+        self.assertEqual(
+            EndpointClass.MARKET_DATA,
+            endpoint_class('GET', '/v1/instruments'))
+
+    @no_duplicates
+    def test_accounts(self):
+        self.assertEqual(
+            EndpointClass.ACCOUNTS,
+            endpoint_class('GET', '/v1/accounts/123/transactions'))
+        self.assertEqual(
+            EndpointClass.ACCOUNTS,
+            endpoint_class('PUT', '/v1/accounts/123/watchlists/456'))
+        self.assertEqual(
+            EndpointClass.ACCOUNTS,
+            endpoint_class('GET', '/v1/userprincipals'))
+
+
+class TokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.now = 1000.0
+        self.bucket = TokenBucket(120, 60.0)
+        self.bucket._clock = lambda: self.now
+
+    @no_duplicates
+    def test_invalid_parameters(self):
+        with self.assertRaisesRegex(ValueError, 'rate must be positive'):
+            TokenBucket(0)
+        with self.assertRaisesRegex(ValueError, 'period must be positive'):
+            TokenBucket(1, 0)
+        with self.assertRaisesRegex(ValueError, 'capacity must be positive'):
+            TokenBucket(1, capacity=0)
+
+    @no_duplicates
+    def test_first_request_is_immediate(self):
+        self.assertEqual(0, self.bucket.reserve())
+
+    @no_duplicates
+    def test_requests_are_spaced_evenly(self):
+        self.assertEqual(0, self.bucket.reserve())
+        self.assertAlmostEqual(0.5, self.bucket.reserve())
+        self.assertAlmostEqual(1.0, self.bucket.reserve())
+        self.assertAlmostEqual(1.5, self.bucket.reserve())
+
+    @no_duplicates
+    def test_tokens_refill_over_time(self):
+        self.bucket.reserve()
+        self.assertAlmostEqual(0.5, self.bucket.reserve())
+
+        self.now += 1.0
+        self.assertEqual(0, self.bucket.reserve())
+
+    @no_duplicates
+    def test_idle_tokens_capped_at_capacity(self):
+        bucket = TokenBucket(60, 60.0, capacity=3)
+        bucket._clock = lambda: self.now
+
+        bucket.reserve()
+        self.now += 3600
+        self.assertEqual(
+            [0, 0, 0, 1.0, 2.0], [bucket.reserve() for _ in range(5)])
+
+    @no_duplicates
+    def test_reserve_multiple_tokens(self):
+        bucket = TokenBucket(60, 60.0, capacity=5)
+        bucket._clock = lambda: self.now
+
+        self.assertEqual(0, bucket.reserve(5))
+        self.assertAlmostEqual(2.0, bucket.reserve(2))
+
+
+class FileTokenBucketTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmpdir.name, 'bucket')
+        self.now = 1000.0
+
+    def tearDown(self):
+        self.tmpdir.cleanup()
+
+    def make_bucket(self, **kwargs):
+        bucket = FileTokenBucket(self.path, 120, 60.0, **kwargs)
+        bucket._clock = lambda: self.now
+        self.addCleanup(bucket.close)
+        return bucket
+
+    @no_duplicates
+    def test_creates_file(self):
+        bucket = self.make_bucket()
+        self.assertEqual(0, bucket.reserve())
+        self.assertTrue(os.path.exists(self.path))
+
+    @no_duplicates
+    def test_requests_are_spaced_evenly(self):
+        bucket = self.make_bucket()
+        self.assertEqual(0, bucket.reserve())
+        self.assertAlmostEqual(0.5, bucket.reserve())
+        self.now += 0.5
+        self.assertAlmostEqual(0.5, bucket.reserve())
+
+    @no_duplicates
+    def test_state_shared_between_buckets(self):
+        first = self.make_bucket()
+        second = self.make_bucket()
+
+        self.assertEqual(0, first.reserve())
+        self.assertAlmostEqual(0.5, second.reserve())
+        self.assertAlmostEqual(1.0, first.reserve())
+
+    @no_duplicates
+    def test_pickle_reopens_file(self):
+        bucket = self.make_bucket()
+        bucket.reserve()
+        bucket._clock = time.time
+
+        unpickled = pickle.loads(pickle.dumps(bucket))
+        unpickled._clock = lambda: self.now
+        self.addCleanup(unpickled.close)
+        self.assertIsNone(unpickled._fd)
+        self.assertAlmostEqual(0.5, unpickled.reserve())
+
+    @no_duplicates
+    def test_state_shared_between_processes(self):
+        bucket = self.make_bucket()
+        self.assertEqual(0, bucket.reserve())
+
+        context = multiprocessing.get_context('fork')
+        queue = context.Queue()
+        process = context.Process(
+            target=_reserve_from_file_bucket, args=(bucket, 2, queue))
+        process.start()
+        child_delays = queue.get(timeout=10)
+        process.join(10)
+
+        for delay, expected in zip(child_delays, (0.5, 1.0)):
+            self.assertAlmostEqual(expected, delay)
+        self.assertAlmostEqual(1.5, bucket.reserve())
+
+
+class RateLimiterTest(unittest.TestCase):
+
+    def bucket(self, delay):
+        bucket = MagicMock()
+        bucket.reserve.return_value = delay
+        return bucket
+
+    @no_duplicates
+    def test_default_buckets(self):
+        limiter = RateLimiter()
+        self.assertEqual(0, limiter.reserve('GET', '/v1/marketdata/quotes'))
+        self.assertAlmostEqual(
+            0.5, limiter.reserve('GET', '/v1/marketdata/quotes'), places=2)
+
+    @no_duplicates
+    def test_all_bucket_applies_to_every_request(self):
+        all_bucket = self.bucket(0)
+        limiter = RateLimiter({EndpointClass.ALL: all_bucket})
+
+        limiter.reserve('GET', '/v1/marketdata/quotes')
+        limiter.reserve('POST', '/v1/accounts/123/orders')
+        self.assertEqual(2, all_bucket.reserve.call_count)
+
+    @no_duplicates
+    def test_endpoint_bucket_only_applies_to_its_class(self):
+        orders_bucket = self.bucket(3.0)
+        limiter = RateLimiter({EndpointClass.ORDERS: orders_bucket})
+
+        self.assertEqual(0, limiter.reserve('GET', '/v1/marketdata/quotes'))
+        orders_bucket.reserve.assert_not_called()
+
+        self.assertEqual(3.0, limiter.reserve('POST', '/v1/accounts/1/orders'))
+        orders_bucket.reserve.assert_called_once_with()
+
+    @no_duplicates
+    def test_waits_for_slowest_bucket(self):
+        limiter = RateLimiter({
+            EndpointClass.ALL: self.bucket(1.0),
+            EndpointClass.ORDERS: self.bucket(4.0),
+        })
+        self.assertEqual(4.0, limiter.reserve('POST', '/v1/accounts/1/orders'))
+
+        limiter = RateLimiter({
+            EndpointClass.ALL: self.bucket(5.0),
+            EndpointClass.ORDERS: self.bucket(4.0),
+        })
+        self.assertEqual(5.0, limiter.reserve('POST', '/v1/accounts/1/orders'))
+
+    @no_duplicates
+    def test_string_endpoint_classes(self):
+        orders_bucket = self.bucket(2.0)
+        limiter = RateLimiter({'ORDERS': orders_bucket})
+        self.assertEqual(2.0, limiter.reserve('POST', '/v1/accounts/1/orders'))
+
+    @no_duplicates
+    def test_invalid_endpoint_class(self):
+        with self.assertRaises(ValueError):
+            RateLimiter({'QUOTES': self.bucket(0)})
@@ -1,16 +1,33 @@
+import asyncio
+import concurrent.futures
+import datetime
+import httpx
 import tda
 import urllib.parse
 import json
 import copy
+from collections import deque
+import math
+import pickle
+import threading
+import unittest
+import websockets.exceptions
 from .utils import (account_principals, has_diff, MockResponse,
                     no_duplicates, AsyncMagicMock)
 import asynctest
-from unittest.mock import ANY, call, MagicMock, Mock
+from unittest.mock import ANY, call, MagicMock, Mock, patch
 from tda import streaming
 
 StreamClient = streaming.StreamClient
 
 
+def raise_symbol_from_process(msg):
+    # Handlers run in a process pool must be picklable, so this lives at module
+    # level. Raising reports the labeled message back to the parent process.
+    content = msg['content'][0]
+    raise ValueError('{} {}'.format(content['key'], content['BID_PRICE']))
+
+
 ACCOUNT_ID = 1000
 TOKEN_TIMESTAMP = '2020-05-22T02:12:48+0000'
 REQUEST_TIMESTAMP = 1590116673258
@@ -142,6 +159,100 @@ class StreamClientTest(asynctest.TestCase):
             self.client.set_json_decoder('')
 
 
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_custom_parser_bytes_frame(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [b'invalid json']
+
+        class CustomJsonDecoder(tda.contrib.util.StreamJsonDecoder):
+            def decode_json_string(_, raw):
+                self.assertEqual(raw, 'invalid json')
+                return self.success_response(1, 'QUOTE', 'SUBS')
+
+        self.client.set_json_decoder(CustomJsonDecoder())
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+
+
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_custom_parser_bytes_decoder(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [b'invalid json']
+
+        class CustomJsonDecoder(tda.contrib.util.StreamJsonDecoder):
+            def decode_json_string(_, raw):
+                raise AssertionError('bytes frame decoded as string')
+
+            def decode_json_bytes(_, raw):
+                self.assertEqual(raw, b'invalid json')
+                return self.success_response(1, 'QUOTE', 'SUBS')
+
+        self.client.set_json_decoder(CustomJsonDecoder())
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+
+
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_bytes_frame_invalid_message(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [b'invalid \xff json']
+
+        msg = 'Full message text: invalid \ufffd json'
+        with self.assertRaisesRegex(tda.streaming.UnparsableMessage, msg):
+            await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_fast_decoder_bytes_frame(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        self.client.set_json_decoder(tda.streaming.FastJsonStreamDecoder())
+        socket.recv.side_effect = [json.dumps(
+            self.success_response(1, 'QUOTE', 'SUBS')).encode('utf-8')]
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+
+        stream_item = self.streaming_entry('QUOTE', 'SUBS')
+        stream_item['data'][0]['content'] = [{'key': 'GOOG', '1': 100.5}]
+        socket.recv.side_effect = [json.dumps(stream_item).encode('utf-8')]
+
+        handler = Mock()
+        self.client.add_level_one_equity_handler(handler)
+        await self.client.handle_message()
+        self.assertEqual(handler.call_args[0][0]['content'][0]['BID_PRICE'],
+                         100.5)
+
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_frame_recorder(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        recorded = []
+        class Recorder(tda.streaming.StreamFrameRecorder):
+            def record_frame(self, raw, received_at):
+                recorded.append((raw, received_at))
+
+        self.client.set_frame_recorder(Recorder())
+        stream_item = json.dumps(self.streaming_entry('CHART_EQUITY', 'SUBS'))
+        socket.recv.side_effect = [stream_item, stream_item]
+        await self.client.handle_message()
+
+        self.assertEqual(len(recorded), 1)
+        self.assertEqual(recorded[0][0], stream_item)
+        self.assertIsInstance(recorded[0][1], float)
+
+        self.client.set_frame_recorder(None)
+        await self.client.handle_message()
+        self.assertEqual(len(recorded), 1)
+
+    @no_duplicates
+    def test_frame_recorder_wrong_type(self):
+        with self.assertRaisesRegex(ValueError, 'StreamFrameRecorder'):
+            self.client.set_frame_recorder(Mock())
+
+
     ##########################################################################
     # Login
 
@@ -4575,6 +4686,168 @@ class StreamClientTest(asynctest.TestCase):
         async_handler.assert_has_calls(
             [call(stream_item['data'][0]), call(stream_item['data'][1])])
 
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_handlers_share_labeled_message(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        stream_item = self.streaming_entry(
+            'QUOTE', 'SUBS', [{'key': 'GOOG', '1': 1140.3, '2': 1141.0}])
+
+        socket.recv.side_effect = [json.dumps(stream_item)]
+
+        handler_1 = Mock()
+        handler_2 = Mock()
+        self.client.add_level_one_equity_handler(handler_1)
+        self.client.add_level_one_equity_handler(handler_2)
+        await self.client.handle_message()
+
+        msg = handler_1.call_args[0][0]
+        self.assertIs(msg, handler_2.call_args[0][0])
+        self.assertEqual(msg['content'], [
+            {'key': 'GOOG', 'BID_PRICE': 1140.3, 'ASK_PRICE': 1141.0}])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_level_one_equity_columnar_handler(self, ws_connect):
+        import numpy as np
+
+        socket = await self.login_and_get_socket(ws_connect)
+
+        stream_item = self.streaming_entry('QUOTE', 'SUBS', [
+            {'key': 'GOOG', 'delayed': False, '1': 1140.3, '4': 100,
+             '7': 'Q', '17': True},
+            {'key': 'MSFT', 'delayed': False, '1': 183.1, '2': 183.2},
+        ])
+        socket.recv.side_effect = [json.dumps(stream_item)]
+
+        columnar_handler_1 = Mock()
+        columnar_handler_2 = Mock()
+        dict_handler = Mock()
+        self.client.add_level_one_equity_handler(
+            columnar_handler_1, columnar=True)
+        self.client.add_level_one_equity_handler(
+            columnar_handler_2, columnar=True)
+        self.client.add_level_one_equity_handler(dict_handler)
+        await self.client.handle_message()
+
+        batch = columnar_handler_1.call_args[0][0]
+        self.assertIs(batch, columnar_handler_2.call_args[0][0])
+        self.assertIsInstance(batch, tda.streaming.ColumnarBatch)
+        dict_handler.assert_called_once()
+
+        Fields = StreamClient.LevelOneEquityFields
+        self.assertEqual(batch.service, 'QUOTE')
+        self.assertEqual(batch.timestamp, REQUEST_TIMESTAMP)
+        self.assertEqual(len(batch), 2)
+        self.assertEqual(list(batch.symbols), ['GOOG', 'MSFT'])
+        self.assertEqual(batch.symbol_index, {'GOOG': 0, 'MSFT': 1})
+        self.assertEqual(set(batch.columns), set([
+            Fields.BID_PRICE, Fields.ASK_PRICE, Fields.BID_SIZE,
+            Fields.BID_ID, Fields.MARGINABLE]))
+
+        self.assertEqual(batch.columns[Fields.BID_PRICE].dtype, np.float64)
+        self.assertEqual(
+            list(batch.columns[Fields.BID_PRICE]), [1140.3, 183.1])
+
+        ask = batch.columns[Fields.ASK_PRICE]
+        self.assertTrue(np.isnan(ask[0]))
+        self.assertEqual(ask[1], 183.2)
+        self.assertEqual(list(batch.masks[Fields.ASK_PRICE]), [False, True])
+
+        self.assertEqual(batch.columns[Fields.BID_ID].dtype, object)
+        self.assertEqual(list(batch.columns[Fields.BID_ID]), ['Q', None])
+
+        self.assertEqual(batch.columns[Fields.MARGINABLE].dtype, bool)
+        self.assertEqual(
+            list(batch.columns[Fields.MARGINABLE]), [True, False])
+        self.assertEqual(list(batch.masks[Fields.MARGINABLE]), [True, False])
+
+        self.assertEqual(batch.row('MSFT'), {
+            Fields.BID_PRICE: 183.1, Fields.ASK_PRICE: 183.2})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_level_one_futures_columnar_handler(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        stream_item = self.streaming_entry('LEVELONE_FUTURES', 'SUBS', [
+            {'key': '/ES', '1': 2996.25, '2': 2996.5}])
+        socket.recv.side_effect = [json.dumps(stream_item)]
+
+        handler = Mock()
+        self.client.add_level_one_futures_handler(handler, columnar=True)
+        await self.client.handle_message()
+
+        batch = handler.call_args[0][0]
+        Fields = StreamClient.LevelOneFuturesFields
+        self.assertEqual(list(batch.symbols), ['/ES'])
+        self.assertEqual(batch.row('/ES'), {
+            Fields.BID_PRICE: 2996.25, Fields.ASK_PRICE: 2996.5})
+
+    @no_duplicates
+    def test_relabel_content_keeps_unknown_keys(self):
+        content = {'key': 'GOOG', 'seq': 10, '1': 1140.3, '999': 'x'}
+        self.assertEqual(
+            StreamClient.LevelOneEquityFields.relabel_content(content),
+            {'key': 'GOOG', 'seq': 10, 'BID_PRICE': 1140.3, '999': 'x'})
+        self.assertEqual(
+            content, {'key': 'GOOG', 'seq': 10, '1': 1140.3, '999': 'x'})
+
+    @no_duplicates
+    def test_book_labeling_does_not_modify_message(self):
+        msg = {
+            'service': 'NASDAQ_BOOK',
+            'timestamp': REQUEST_TIMESTAMP,
+            'command': 'SUBS',
+            'content': [{
+                'key': 'GOOG',
+                '1': 1590532470149,
+                '2': [{
+                    '0': 1424.1,
+                    '1': 300,
+                    '2': 1,
+                    '3': [{'0': 'NSDQ', '1': 300, '2': 54000000}]
+                }],
+                '3': [{
+                    '0': 1424.9,
+                    '1': 100,
+                    '2': 1,
+                    '3': [{'0': 'ARCX', '1': 100, '2': 53600000}]
+                }]
+            }]
+        }
+        original = copy.deepcopy(msg)
+
+        handler = StreamClient._BookHandler(Mock(), StreamClient.BookFields)
+        labeled = handler.label_message(msg)
+
+        self.assertEqual(msg, original)
+        self.assertEqual(labeled['content'], [{
+            'key': 'GOOG',
+            'BOOK_TIME': 1590532470149,
+            'BIDS': [{
+                'BID_PRICE': 1424.1,
+                'TOTAL_VOLUME': 300,
+                'NUM_BIDS': 1,
+                'BIDS': [{
+                    'EXCHANGE': 'NSDQ',
+                    'BID_VOLUME': 300,
+                    'SEQUENCE': 54000000
+                }]
+            }],
+            'ASKS': [{
+                'ASK_PRICE': 1424.9,
+                'TOTAL_VOLUME': 100,
+                'NUM_ASKS': 1,
+                'ASKS': [{
+                    'EXCHANGE': 'ARCX',
+                    'ASK_VOLUME': 100,
+                    'SEQUENCE': 53600000
+                }]
+            }]
+        }])
+
     @no_duplicates
     @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
     async def test_handle_message_without_login(self, ws_connect):
@@ -4594,148 +4867,2093 @@ class StreamClientTest(asynctest.TestCase):
             await self.client.chart_equity_unsubs(['GOOG,MSFT'])
 
     ###########################################################################
-    # Private member _service_op
-    #
-    # Note: https://developer.tdameritrade.com/content/streaming-data#_Toc504640564
-    # parameters are optional and in the case of UNSUBS commands,
-    # fields should not be required since unsubscribing from a service
-    # will return no data on the service or symbol
+    # Background dispatch
+
+    def queue_backed_recv(self, socket):
+        '''
+        Makes socket.recv() block on a queue instead of failing when no more
+        messages are available, which is what background readers expect.
+        '''
+        queue = asyncio.Queue()
+
+        async def recv():
+            item = await queue.get()
+            if isinstance(item, Exception):
+                raise item
+            return item
+        socket.recv = recv
+        return queue
+
+    async def wait_for(self, predicate, iterations=100):
+        for _ in range(iterations):
+            if predicate():
+                return
+            await asyncio.sleep(0)
+        self.fail('condition never became true')
 
     @no_duplicates
     @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
-    async def test_service_op_sends_some_fields_with_field_type_and_fields(self, ws_connect):
+    async def test_background_dispatch_delivers_to_handlers(self, ws_connect):
         socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
 
-        socket.recv.side_effect = [json.dumps(self.success_response(
-            1, 'QUOTE', 'SUBS'))]
+        handler = Mock()
+        async_handler = asynctest.CoroutineMock()
+        self.client.add_chart_equity_handler(handler)
+        self.client.add_chart_equity_handler(async_handler)
 
-        await self.client._service_op(
-            symbols=['GOOG', 'MSFT'],
-            service='QUOTE',
-            command='SUBS',
-            field_type=StreamClient.LevelOneEquityFields,
-            fields=[
-            StreamClient.LevelOneEquityFields.CLOSE_PRICE,
-            StreamClient.LevelOneEquityFields.ASK_PRICE
-        ])
-        socket.recv.assert_awaited_once()
-        request = self.request_from_socket_mock(socket)
+        stream_item = self.streaming_entry('CHART_EQUITY', 'SUBS')
+        await self.client.start_background_dispatch()
+        queue.put_nowait(json.dumps(stream_item))
 
-        self.assertEqual(request, {
-            'account': '1001',
-            'service': 'QUOTE',
-            'command': 'SUBS',
-            'requestid': '1',
-            'source': 'streamerInfo-appId',
-            'parameters': {
-                'keys': 'GOOG,MSFT',
-                'fields': '2,15'
-            }
-        })
+        await self.wait_for(lambda: async_handler.await_count == 1)
+        handler.assert_called_once_with(stream_item['data'][0])
+        async_handler.assert_called_once_with(stream_item['data'][0])
+
+        await self.client.stop_background_dispatch()
 
     @no_duplicates
     @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
-    async def test_service_op_sends_no_fields_without_field_type(self, ws_connect):
+    async def test_background_dispatch_slow_handler_does_not_block_reads(
+            self, ws_connect):
         socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        release = asyncio.Event()
+        chart_calls = []
+        async def slow_handler(msg):
+            chart_calls.append(msg)
+            await release.wait()
+        self.client.add_chart_equity_handler(slow_handler)
+
+        quote_handler = Mock()
+        self.client.add_level_one_equity_handler(quote_handler)
+
+        await self.client.start_background_dispatch()
+        for i in range(3):
+            queue.put_nowait(json.dumps(self.streaming_entry(
+                'CHART_EQUITY', 'SUBS', [{'seq': i}])))
+        queue.put_nowait(json.dumps(self.streaming_entry(
+            'QUOTE', 'SUBS', [{'key': 'GOOG'}])))
+
+        # The quote is handled even though the chart handler is stuck
+        await self.wait_for(lambda: quote_handler.call_count == 1)
+        self.assertEqual(len(chart_calls), 1)
+        self.assertEqual(queue.qsize(), 0)
+
+        release.set()
+        await self.wait_for(lambda: len(chart_calls) == 3)
+        self.assertEqual(
+            [c['content'][0]['seq'] for c in chart_calls], [0, 1, 2])
 
-        socket.recv.side_effect = [json.dumps(self.success_response(
-            1, 'QUOTE', 'UNSUBS'))]
+        await self.client.stop_background_dispatch()
 
-        await self.client._service_op(
-            ['GOOG','MSFT'],
-            'QUOTE',
-            'UNSUBS'
-        )
-        socket.recv.assert_awaited_once()
-        request = self.request_from_socket_mock(socket)
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_background_dispatch_drops_oldest_when_full(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
 
-        self.assertFalse('fields' in request['parameters'])
+        release = asyncio.Event()
+        seen = []
+        async def slow_handler(msg):
+            seen.append(msg['content'][0]['seq'])
+            await release.wait()
+        self.client.add_chart_equity_handler(slow_handler)
+
+        await self.client.start_background_dispatch(max_queue_size=2)
+        queue.put_nowait(json.dumps(self.streaming_entry(
+            'CHART_EQUITY', 'SUBS', [{'seq': 0}])))
+        await self.wait_for(lambda: len(seen) == 1)
+        for i in range(1, 5):
+            queue.put_nowait(json.dumps(self.streaming_entry(
+                'CHART_EQUITY', 'SUBS', [{'seq': i}])))
+
+        await self.wait_for(lambda: queue.qsize() == 0 and
+            self.client.dropped_message_counts().get('CHART_EQUITY') == 2)
+
+        release.set()
+        await self.wait_for(lambda: len(seen) == 3)
+        self.assertEqual(seen, [0, 3, 4])
+
+        await self.client.stop_background_dispatch()
 
     @no_duplicates
     @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
-    async def test_service_op_sends_no_fields_for_sub_without_field_type(self, ws_connect):
-        """
-        There's no service's sub/add commands without field_type defined but this tests for fields=None behavior if field_type=None
-        Warning: Sub commands seems to fail if there's no fields parameters,
-        check logs : https://github.com/alexgolec/tda-api/pull/256#issuecomment-950406363
-
-        The streaming client will properly throw UnexpectedResponse
-        """
+    async def test_background_dispatch_subs_while_running(self, ws_connect):
         socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
 
-        resp = self.success_response(1, 'QUOTE', 'SUBS', msg="SUBS command failed")
-        resp['response'][0]['content']['code'] = 22
-        socket.recv.side_effect = [
-            json.dumps(resp)
-        ]
+        handler = Mock()
+        self.client.add_chart_equity_handler(handler)
+        await self.client.start_background_dispatch()
 
-        with self.assertRaises(tda.streaming.UnexpectedResponseCode) as e:
-            await self.client._service_op(
-                symbols=['GOOG','MSFT'],
-                service='QUOTE',
-                command='SUBS'
-            )
-        socket.recv.assert_awaited_once()
-        request = self.request_from_socket_mock(socket)
+        stream_item = self.streaming_entry('CHART_EQUITY', 'SUBS')
+        queue.put_nowait(json.dumps(stream_item))
+        queue.put_nowait(json.dumps(
+            self.success_response(1, 'CHART_EQUITY', 'SUBS')))
+        await self.client.chart_equity_subs(['GOOG,MSFT'])
 
-        self.assertFalse('fields' in request['parameters'])
+        await self.wait_for(lambda: handler.call_count == 1)
+        handler.assert_called_once_with(stream_item['data'][0])
+
+        await self.client.stop_background_dispatch()
 
     @no_duplicates
     @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
-    async def test_service_op_sends_no_fields_for_sub_with_fields(self, ws_connect):
-        """
-        There's no service's sub/add commands without field_type defined but this tests for fields=None behavior if field_type=None
-        Warning: Sub commands seems to fail if there's no fields parameters,
-        check logs : https://github.com/alexgolec/tda-api/pull/256#issuecomment-950406363
+    async def test_background_dispatch_stop_preserves_undispatched(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        release = asyncio.Event()
+        slow_handler = asynctest.CoroutineMock(
+            side_effect=lambda msg: release.wait())
+        self.client.add_chart_equity_handler(slow_handler)
+
+        await self.client.start_background_dispatch()
+        stream_items = [self.streaming_entry(
+            'CHART_EQUITY', 'SUBS', [{'seq': i}]) for i in range(3)]
+        for item in stream_items:
+            queue.put_nowait(json.dumps(item))
+        await self.wait_for(lambda: slow_handler.call_count == 1)
+        await self.wait_for(lambda: queue.qsize() == 0)
+        await self.client.stop_background_dispatch()
+
+        self.client._handlers['CHART_EQUITY'].clear()
+        handler = Mock()
+        self.client.add_chart_equity_handler(handler)
+        await self.client.handle_message()
+        await self.client.handle_message()
+        handler.assert_has_calls([
+            call(stream_items[1]['data'][0]),
+            call(stream_items[2]['data'][0])])
 
-        The streaming client will properly throw UnexpectedResponse
-        """
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_background_dispatch_handler_exception(self, ws_connect):
         socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
 
-        resp = self.success_response(1, 'QUOTE', 'SUBS', msg="SUBS command failed")
-        resp['response'][0]['content']['code'] = 22
-        socket.recv.side_effect = [
-            json.dumps(resp)
-        ]
+        handler = Mock(side_effect=ValueError('handler failed'))
+        self.client.add_chart_equity_handler(handler)
 
-        with self.assertRaises(tda.streaming.UnexpectedResponseCode) as e:
-            await self.client._service_op(
-                symbols=['GOOG','MSFT'],
-                service='QUOTE',
-                command='SUBS',
-                fields=[
-                    StreamClient.LevelOneEquityFields.CLOSE_PRICE,
-                    StreamClient.LevelOneEquityFields.ASK_PRICE
-                ]
-            )
-        socket.recv.assert_awaited_once()
-        request = self.request_from_socket_mock(socket)
+        await self.client.start_background_dispatch()
+        queue.put_nowait(json.dumps(
+            self.streaming_entry('CHART_EQUITY', 'SUBS')))
 
-        self.assertFalse('fields' in request['parameters'])
+        with self.assertRaisesRegex(ValueError, 'handler failed'):
+            await self.client.wait_background_dispatch()
+        self.assertIsNone(self.client._reader_task)
 
     @no_duplicates
     @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
-    async def test_service_op_sends_all_fields_with_field_type(self, ws_connect):
+    async def test_background_dispatch_read_failure(self, ws_connect):
         socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
 
-        socket.recv.side_effect = [json.dumps(self.success_response(
-            1, 'CHART_EQUITY', 'SUBS'))]
+        await self.client.start_background_dispatch()
+        queue.put_nowait('invalid json')
 
-        await self.client._service_op(
-            symbols=['GOOG','MSFT'],
-            service='CHART_EQUITY',
-            command='SUBS',
-            field_type=StreamClient.ChartEquityFields
-        )
-        socket.recv.assert_awaited_once()
-        request = self.request_from_socket_mock(socket)
+        with self.assertRaises(tda.streaming.UnparsableMessage):
+            await self.client.wait_background_dispatch()
 
-        self.assertEqual(request, {
-            'account': '1001',
-            'service': 'CHART_EQUITY',
-            'command': 'SUBS',
-            'requestid': '1',
-            'source': 'streamerInfo-appId',
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_background_dispatch_read_failure_during_subs(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        await self.client.start_background_dispatch()
+        queue.put_nowait('invalid json')
+
+        with self.assertRaises(tda.streaming.UnparsableMessage):
+            await self.client.chart_equity_subs(['GOOG,MSFT'])
+        await self.client.stop_background_dispatch()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_handle_message_during_background_dispatch(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.queue_backed_recv(socket)
+
+        await self.client.start_background_dispatch()
+        with self.assertRaisesRegex(ValueError, 'background dispatch'):
+            await self.client.handle_message()
+        with self.assertRaisesRegex(ValueError, 'already running'):
+            await self.client.start_background_dispatch()
+        await self.client.stop_background_dispatch()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_background_dispatch_without_login(self, ws_connect):
+        with self.assertRaisesRegex(ValueError, '.*Socket not open.*'):
+            await self.client.start_background_dispatch()
+
+    ###########################################################################
+    # Pipelined commands
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_commands_in_flight_concurrently(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        stream_item = self.streaming_entry('CHART_EQUITY', 'SUBS')
+        subs = asyncio.gather(
+            self.client.chart_equity_subs(['GOOG']),
+            self.client.level_one_equity_subs(['MSFT']),
+            self.client.nasdaq_book_subs(['INTC']))
+
+        # All requests are sent before any response arrives
+        await self.wait_for(lambda: socket.send.await_count == 3)
+        queue.put_nowait(json.dumps(
+            self.success_response(2, 'QUOTE', 'SUBS')))
+        queue.put_nowait(json.dumps(stream_item))
+        queue.put_nowait(json.dumps({'response': [
+            self.success_response(3, 'NASDAQ_BOOK', 'SUBS')['response'][0],
+            self.success_response(1, 'CHART_EQUITY', 'SUBS')['response'][0],
+        ]}))
+        await subs
+        self.assertEqual(self.client._pending_responses, {})
+
+        handler = Mock()
+        self.client.add_chart_equity_handler(handler)
+        await self.client.handle_message()
+        handler.assert_called_once_with(stream_item['data'][0])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_failed_command_in_flight_with_others(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        failed_response = self.success_response(1, 'CHART_EQUITY', 'SUBS')
+        failed_response['response'][0]['content']['code'] = 21
+
+        chart_subs = asyncio.ensure_future(
+            self.client.chart_equity_subs(['GOOG']))
+        quote_subs = asyncio.ensure_future(
+            self.client.level_one_equity_subs(['MSFT']))
+        await self.wait_for(lambda: socket.send.await_count == 2)
+
+        queue.put_nowait(json.dumps(failed_response))
+        queue.put_nowait(json.dumps(
+            self.success_response(2, 'QUOTE', 'SUBS')))
+
+        with self.assertRaises(tda.streaming.UnexpectedResponseCode):
+            await chart_subs
+        await quote_subs
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_handle_message_resolves_command_in_flight(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        handler = Mock()
+        self.client.add_chart_equity_handler(handler)
+
+        # handle_message() is waiting on the socket when the command is sent,
+        # so it reads the response on the command's behalf
+        handle = asyncio.ensure_future(self.client.handle_message())
+        await asyncio.sleep(0)
+        subs = asyncio.ensure_future(self.client.chart_equity_subs(['GOOG']))
+        await self.wait_for(lambda: socket.send.await_count == 1)
+
+        queue.put_nowait(json.dumps(
+            self.success_response(1, 'CHART_EQUITY', 'SUBS')))
+        await handle
+        await subs
+        handler.assert_not_called()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_data_handled_during_command_with_background_dispatch(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        handler = Mock()
+        self.client.add_chart_equity_handler(handler)
+        await self.client.start_background_dispatch()
+
+        subs = asyncio.ensure_future(self.client.chart_equity_subs(['GOOG']))
+        await self.wait_for(lambda: socket.send.await_count == 1)
+
+        stream_item = self.streaming_entry('CHART_EQUITY', 'SUBS')
+        queue.put_nowait(json.dumps(stream_item))
+        await self.wait_for(lambda: handler.call_count == 1)
+        self.assertFalse(subs.done())
+
+        queue.put_nowait(json.dumps(
+            self.success_response(1, 'CHART_EQUITY', 'SUBS')))
+        await subs
+
+        await self.client.stop_background_dispatch()
+
+    ###########################################################################
+    # Instrumentation
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_instrumentation_disabled_by_default(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('CHART_EQUITY', 'SUBS'))]
+        await self.client.handle_message()
+
+        self.assertIsNone(self.client.instrumentation_snapshot())
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_instrumentation_records_messages(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        handler = Mock()
+        self.client.add_level_one_equity_handler(handler)
+        self.client.add_level_one_equity_handler(Mock())
+        self.client.enable_instrumentation()
+
+        now_ms = datetime.datetime.now().timestamp() * 1000
+        stream_item = self.streaming_entry(
+            'QUOTE', 'SUBS', [{'key': 'GOOG', '1': 100.0}])
+        stream_item['data'][0]['timestamp'] = now_ms - 2500
+        raw = json.dumps(stream_item)
+        heartbeat = json.dumps({'notify': [{'heartbeat': '1591499624412'}]})
+        socket.recv.side_effect = [raw, heartbeat]
+
+        await self.client.handle_message()
+        await self.client.handle_message()
+
+        snapshot = self.client.instrumentation_snapshot()
+        quote = snapshot['services']['QUOTE']
+        self.assertEqual(quote['messages'], 1)
+        self.assertEqual(quote['bytes'], len(raw))
+        self.assertEqual(quote['socket_wait']['count'], 1)
+        self.assertEqual(quote['decode']['count'], 1)
+
+        # Both handlers share a single labeled message
+        self.assertEqual(quote['label']['count'], 1)
+        self.assertEqual(quote['handler']['count'], 2)
+
+        self.assertEqual(quote['server_latency']['count'], 1)
+        self.assertGreaterEqual(quote['server_latency']['min'], 2.5)
+        self.assertLess(quote['server_latency']['min'], 60)
+
+        notify = snapshot['services']['NOTIFY']
+        self.assertEqual(notify['messages'], 0)
+        self.assertEqual(notify['bytes'], len(heartbeat))
+        self.assertEqual(notify['label'], {'count': 0})
+
+        self.assertGreaterEqual(snapshot['elapsed_seconds'], 0)
+        self.assertEqual(snapshot['overflow_queue_depth'], 0)
+        self.assertEqual(snapshot['dispatch_queue_depths'], {})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_instrumentation_counts_encoded_bytes(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_instrumentation()
+
+        stream_item = self.streaming_entry(
+            'NEWS_HEADLINE', 'SUBS', [{'key': 'GOOG', '10': 'Société €'}])
+        raw = json.dumps(stream_item, ensure_ascii=False)
+        socket.recv.side_effect = [raw, raw.encode('utf-8')]
+
+        await self.client.handle_message()
+        await self.client.handle_message()
+
+        news = self.client.instrumentation_snapshot()['services'][
+            'NEWS_HEADLINE']
+        self.assertGreater(len(raw.encode('utf-8')), len(raw))
+        self.assertEqual(news['bytes'], 2 * len(raw.encode('utf-8')))
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_instrumentation_overflow_depth(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_instrumentation()
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('CHART_EQUITY', 'SUBS')),
+            json.dumps(self.streaming_entry('CHART_EQUITY', 'SUBS')),
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG'])
+
+        snapshot = self.client.instrumentation_snapshot()
+        self.assertEqual(snapshot['overflow_queue_depth'], 2)
+        self.assertEqual(snapshot['max_overflow_queue_depth'], 2)
+        self.assertEqual(snapshot['services']['QUOTE']['messages'], 0)
+        self.assertEqual(snapshot['services']['QUOTE']['decode']['count'], 1)
+
+        await self.client.handle_message()
+        snapshot = self.client.instrumentation_snapshot()
+        self.assertEqual(snapshot['overflow_queue_depth'], 1)
+        self.assertEqual(snapshot['max_overflow_queue_depth'], 2)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_instrumentation_reset_and_disable(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_instrumentation()
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('CHART_EQUITY', 'SUBS'))] * 2
+        await self.client.handle_message()
+
+        self.client.enable_instrumentation()
+        self.assertEqual(
+            self.client.instrumentation_snapshot()['services'], {})
+
+        self.client.disable_instrumentation()
+        await self.client.handle_message()
+        self.assertIsNone(self.client.instrumentation_snapshot())
+
+    @no_duplicates
+    def test_instrumentation_histogram(self):
+        histogram = streaming._Histogram()
+        self.assertEqual(histogram.snapshot(), {'count': 0})
+
+        for _ in range(98):
+            histogram.record(0.0001)
+        histogram.record(0.01)
+        histogram.record(2.0)
+
+        snapshot = histogram.snapshot()
+        self.assertEqual(snapshot['count'], 100)
+        self.assertEqual(snapshot['min'], 0.0001)
+        self.assertEqual(snapshot['max'], 2.0)
+        self.assertAlmostEqual(snapshot['mean'], (0.0098 + 0.01 + 2.0) / 100)
+
+        # Percentiles are the upper bound of their power-of-two bucket
+        self.assertEqual(snapshot['p50'], 128e-6)
+        self.assertEqual(snapshot['p90'], 128e-6)
+        self.assertEqual(snapshot['p99'], 16384e-6)
+
+        # Negative values, from unsynchronized clocks, are clamped
+        histogram.record(-1.0)
+        self.assertEqual(histogram.snapshot()['min'], 0.0)
+
+    ###########################################################################
+    # Message iteration
+
+    def quote_entry(self, *content):
+        stream_item = self.streaming_entry('QUOTE', 'SUBS')
+        stream_item['data'][0]['content'] = list(content)
+        return json.dumps(stream_item)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_yields_labeled_messages(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        quotes = self.client.messages('QUOTE')
+        socket.recv.side_effect = [
+            self.quote_entry({'key': 'GOOG', '1': 100.0}),
+            self.quote_entry({'key': 'MSFT', '1': 200.0})]
+        await self.client.handle_message()
+        await self.client.handle_message()
+
+        msg = await quotes.__anext__()
+        self.assertEqual(msg['content'], [{'key': 'GOOG', 'BID_PRICE': 100.0}])
+        msg = await quotes.__anext__()
+        self.assertEqual(msg['content'], [{'key': 'MSFT', 'BID_PRICE': 200.0}])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_filters_symbols(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        handler = Mock()
+        self.client.add_level_one_equity_handler(handler)
+        quotes = self.client.messages('QUOTE', symbols=['MSFT'])
+        socket.recv.side_effect = [
+            self.quote_entry({'key': 'GOOG', '1': 100.0}),
+            self.quote_entry({'key': 'GOOG', '1': 101.0},
+                             {'key': 'MSFT', '1': 200.0})]
+        await self.client.handle_message()
+        await self.client.handle_message()
+
+        msg = await quotes.__anext__()
+        self.assertEqual(msg['content'], [{'key': 'MSFT', 'BID_PRICE': 200.0}])
+        self.assertEqual(quotes._messages, deque())
+
+        # Other handlers still receive the unfiltered message
+        self.assertEqual(len(handler.call_args[0][0]['content']), 2)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_drop_oldest(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        quotes = self.client.messages(
+            'QUOTE', max_queue_size=2,
+            overflow=StreamClient.MessageOverflow.DROP_OLDEST)
+        socket.recv.side_effect = [
+            self.quote_entry({'key': 'GOOG', '1': float(i)})
+            for i in range(3)]
+        for _ in range(3):
+            await self.client.handle_message()
+
+        self.assertEqual(quotes.dropped_count, 1)
+        self.assertEqual(
+            (await quotes.__anext__())['content'][0]['BID_PRICE'], 1.0)
+        self.assertEqual(
+            (await quotes.__anext__())['content'][0]['BID_PRICE'], 2.0)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_conflate(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        quotes = self.client.messages(
+            'QUOTE', overflow=StreamClient.MessageOverflow.CONFLATE)
+        socket.recv.side_effect = [
+            self.quote_entry({'key': 'GOOG', '1': 100.0, '2': 100.5}),
+            self.quote_entry({'key': 'MSFT', '1': 200.0}),
+            self.quote_entry({'key': 'GOOG', '1': 100.25})]
+        for _ in range(3):
+            await self.client.handle_message()
+
+        msg = await quotes.__anext__()
+        self.assertEqual(msg['content'], [
+            {'key': 'GOOG', 'BID_PRICE': 100.25, 'ASK_PRICE': 100.5},
+            {'key': 'MSFT', 'BID_PRICE': 200.0}])
+        self.assertEqual(quotes.conflated_count, 1)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_block_applies_backpressure(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        quotes = self.client.messages('QUOTE', max_queue_size=1)
+        socket.recv.side_effect = [
+            self.quote_entry({'key': 'GOOG', '1': 100.0}),
+            self.quote_entry({'key': 'GOOG', '1': 101.0})]
+        await self.client.handle_message()
+
+        # The buffer is full, so handling the next message waits for the
+        # consumer
+        second = asyncio.ensure_future(self.client.handle_message())
+        for _ in range(10):
+            await asyncio.sleep(0)
+        self.assertFalse(second.done())
+
+        self.assertEqual(
+            (await quotes.__anext__())['content'][0]['BID_PRICE'], 100.0)
+        await second
+        self.assertEqual(
+            (await quotes.__anext__())['content'][0]['BID_PRICE'], 101.0)
+        self.assertEqual(quotes.dropped_count, 0)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_background_dispatch(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        quotes = self.client.messages('QUOTE', max_queue_size=1)
+        await self.client.start_background_dispatch()
+        for i in range(3):
+            queue.put_nowait(self.quote_entry({'key': 'GOOG', '1': float(i)}))
+
+        received = []
+        async for msg in quotes:
+            received.append(msg['content'][0]['BID_PRICE'])
+            if len(received) == 3:
+                break
+
+        self.assertEqual(received, [0.0, 1.0, 2.0])
+        await self.client.stop_background_dispatch()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_close(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        async with self.client.messages('QUOTE') as quotes:
+            self.assertEqual(len(self.client._handlers['QUOTE']), 1)
+            consumer = asyncio.ensure_future(quotes.__anext__())
+            await asyncio.sleep(0)
+
+        self.assertEqual(self.client._handlers['QUOTE'], [])
+        with self.assertRaises(StopAsyncIteration):
+            await consumer
+
+        # Closed streams don't buffer messages
+        socket.recv.side_effect = [
+            self.quote_entry({'key': 'GOOG', '1': 100.0})]
+        await self.client.handle_message()
+        quotes._put({'content': []})
+        self.assertEqual(quotes._messages, deque())
+        quotes.close()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_close_releases_blocked_producer(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        quotes = self.client.messages('QUOTE', max_queue_size=1)
+        socket.recv.side_effect = [
+            self.quote_entry({'key': 'GOOG', '1': 100.0}),
+            self.quote_entry({'key': 'GOOG', '1': 101.0})]
+        await self.client.handle_message()
+        second = asyncio.ensure_future(self.client.handle_message())
+        await asyncio.sleep(0)
+
+        quotes.close()
+        await second
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_messages_invalid_arguments(self, ws_connect):
+        with self.assertRaisesRegex(ValueError, 'unsupported service'):
+            self.client.messages('ADMIN')
+        with self.assertRaisesRegex(ValueError, 'must be positive'):
+            self.client.messages('QUOTE', max_queue_size=0)
+        with self.assertRaises(ValueError):
+            self.client.messages('QUOTE', overflow='BLOCK')
+        self.assertEqual(self.client._handlers['QUOTE'], [])
+
+    ###########################################################################
+    # Watchdog
+
+    def heartbeat(self):
+        return json.dumps({'notify': [{'heartbeat': '1591499624412'}]})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_watchdog_heartbeat_stall(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        on_stall = Mock()
+        await self.client.start_watchdog(
+            heartbeat_timeout_seconds=10, check_interval_seconds=0,
+            on_stall=on_stall)
+        socket.recv.side_effect = [self.heartbeat()]
+        await self.client.handle_message()
+        self.assertLess(self.client.staleness(), 10)
+
+        self.client._watchdog.last_heartbeat -= 20
+        await self.wait_for(lambda: on_stall.called)
+        service, age = on_stall.call_args[0]
+        self.assertIsNone(service)
+        self.assertGreaterEqual(age, 20)
+
+        # Stalls are only reported once
+        for _ in range(10):
+            await asyncio.sleep(0)
+        on_stall.assert_called_once()
+
+        # ... until the feed resumes and stalls again
+        socket.recv.side_effect = [self.heartbeat()]
+        await self.client.handle_message()
+        self.client._watchdog.last_heartbeat -= 20
+        await self.wait_for(lambda: on_stall.call_count == 2)
+
+        await self.client.stop_watchdog()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_watchdog_data_stall(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS')),
+            json.dumps(self.success_response(2, 'ACCT_ACTIVITY', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG'])
+        await self.client.account_activity_sub()
+
+        on_stall = Mock()
+        await self.client.start_watchdog(
+            heartbeat_timeout_seconds=None, data_timeout_seconds=5,
+            service_timeouts={'ACCT_ACTIVITY': None, 'CHART_EQUITY': 30},
+            check_interval_seconds=0, on_stall=on_stall)
+
+        self.client._watchdog.started_at -= 10
+        await self.wait_for(lambda: on_stall.called)
+        for _ in range(10):
+            await asyncio.sleep(0)
+
+        self.assertEqual([c[0][0] for c in on_stall.call_args_list],
+                         ['QUOTE'])
+
+        self.client._watchdog.started_at -= 30
+        await self.wait_for(lambda: on_stall.call_count == 2)
+        self.assertEqual(on_stall.call_args[0][0], 'CHART_EQUITY')
+
+        await self.client.stop_watchdog()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_watchdog_staleness(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        with self.assertRaisesRegex(ValueError, 'watchdog is not running'):
+            self.client.staleness()
+
+        await self.client.start_watchdog(heartbeat_timeout_seconds=None)
+        self.client._watchdog.started_at -= 100
+
+        stream_item = self.streaming_entry('QUOTE', 'SUBS')
+        stream_item['data'][0]['content'] = [{'key': 'GOOG', '1': 100.0}]
+        socket.recv.side_effect = [json.dumps(stream_item)]
+        self.client.add_level_one_equity_handler(Mock())
+        await self.client.handle_message()
+
+        self.assertLess(self.client.staleness('QUOTE'), 100)
+        self.assertLess(self.client.staleness('QUOTE', 'GOOG'), 100)
+        self.assertGreaterEqual(self.client.staleness('CHART_EQUITY'), 100)
+        self.assertIsNone(self.client.staleness('QUOTE', 'MSFT'))
+
+        await self.client.stop_watchdog()
+        await self.client.stop_watchdog()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_watchdog_reconnect_closes_socket(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        on_stall = asynctest.CoroutineMock(side_effect=ValueError('failed'))
+        await self.client.start_watchdog(
+            heartbeat_timeout_seconds=10, check_interval_seconds=0,
+            on_stall=on_stall, reconnect=True)
+        with self.assertRaisesRegex(ValueError, 'already running'):
+            await self.client.start_watchdog()
+
+        self.client._watchdog.last_heartbeat -= 20
+        await self.wait_for(lambda: socket.close.await_count == 1)
+
+        # Callback errors are logged and don't stop the watchdog
+        on_stall.assert_awaited_once()
+        self.assertFalse(self.client._watchdog_task.done())
+
+        await self.client.stop_watchdog()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_watchdog_reset_after_reconnect(self, ws_connect):
+        await self.login_and_get_socket(ws_connect)
+
+        await self.client.start_watchdog(check_interval_seconds=3600)
+        self.client._watchdog.last_heartbeat -= 100
+        self.client._watchdog.stalled.add(None)
+
+        with patch.object(self.client, '_connect_and_login',
+                          new_callable=asynctest.CoroutineMock), \
+                patch.object(self.client, '_replay_subscriptions',
+                             new_callable=asynctest.CoroutineMock):
+            self.client.enable_auto_reconnect()
+            await self.client._reconnect()
+
+        self.assertLess(self.client.staleness(), 100)
+        self.assertEqual(self.client._watchdog.stalled, set())
+
+        await self.client.stop_watchdog()
+
+    ###########################################################################
+    # Handler execution
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_thread_pool_execution(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        calls = []
+        def handler(msg):
+            calls.append((msg, threading.get_ident()))
+        self.client.add_chart_equity_handler(
+            handler, execution=streaming.ThreadPoolExecution())
+
+        stream_item = self.streaming_entry('CHART_EQUITY', 'SUBS')
+        socket.recv.side_effect = [json.dumps(stream_item)]
+        await self.client.handle_message()
+        await self.client.wait_for_handlers()
+
+        self.assertEqual(len(calls), 1)
+        msg, thread_id = calls[0]
+        self.assertEqual(msg, stream_item['data'][0])
+        self.assertNotEqual(thread_id, threading.get_ident())
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_process_pool_execution(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        exceptions = []
+        self.client.set_handler_exception_callback(exceptions.append)
+
+        with concurrent.futures.ProcessPoolExecutor(max_workers=1) as pool:
+            self.client.add_level_one_equity_handler(
+                raise_symbol_from_process,
+                execution=streaming.ProcessPoolExecution(pool))
+
+            socket.recv.side_effect = [json.dumps(self.streaming_entry(
+                'QUOTE', 'SUBS', [{'key': 'GOOG', '1': 100.0}]))]
+            await self.client.handle_message()
+            await self.client.wait_for_handlers()
+
+        self.assertEqual(len(exceptions), 1)
+        self.assertIsInstance(exceptions[0], ValueError)
+        self.assertEqual(str(exceptions[0]), 'GOOG 100.0')
+
+    @no_duplicates
+    def test_executor_rejects_async_handler(self):
+        async def handler(msg):
+            pass
+
+        with self.assertRaisesRegex(ValueError, 'ThreadPoolExecution'):
+            self.client.add_chart_equity_handler(
+                handler, execution=streaming.ThreadPoolExecution())
+        with self.assertRaisesRegex(ValueError, 'ProcessPoolExecution'):
+            self.client.add_level_one_equity_handler(
+                handler, columnar=False,
+                execution=streaming.ProcessPoolExecution(None))
+
+    @no_duplicates
+    def test_task_execution_requires_positive_concurrency(self):
+        with self.assertRaisesRegex(ValueError, 'at least 1'):
+            streaming.TaskExecution(0)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_task_execution_caps_concurrency(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        release = asyncio.Event()
+        running = []
+        max_running = []
+        async def handler(msg):
+            running.append(msg)
+            max_running.append(len(running))
+            await release.wait()
+            running.remove(msg)
+        self.client.add_chart_equity_handler(
+            handler, execution=streaming.TaskExecution(max_concurrency=2))
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry(
+                'CHART_EQUITY', 'SUBS', [{'seq': i}]))
+            for i in range(4)]
+        for _ in range(4):
+            await self.client.handle_message()
+
+        await self.wait_for(lambda: len(running) == 2)
+        for _ in range(10):
+            await asyncio.sleep(0)
+        self.assertEqual(len(running), 2)
+
+        release.set()
+        await self.client.wait_for_handlers()
+        self.assertEqual(len(max_running), 4)
+        self.assertEqual(max(max_running), 2)
+        self.assertEqual(len(self.client._handler_tasks), 0)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_async_handler_exception_callback(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        async def handler(msg):
+            raise ValueError('handler failed')
+        self.client.add_chart_equity_handler(handler)
+
+        callback = Mock()
+        self.client.set_handler_exception_callback(callback)
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('CHART_EQUITY', 'SUBS'))]
+        await self.client.handle_message()
+        await self.client.wait_for_handlers()
+
+        callback.assert_called_once()
+        self.assertEqual(str(callback.call_args[0][0]), 'handler failed')
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_async_handler_exception_logged_by_default(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        async def handler(msg):
+            raise ValueError('handler failed')
+        self.client.add_chart_equity_handler(handler)
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('CHART_EQUITY', 'SUBS'))]
+        with self.assertLogs('tda.streaming', level='ERROR') as logs:
+            await self.client.handle_message()
+            await self.client.wait_for_handlers()
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertEqual(
+            str(logs.records[0].exc_info[1]), 'handler failed')
+
+    ###########################################################################
+    # Typed rows
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_level_one_equity_typed_handler(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        stream_item = self.streaming_entry('QUOTE', 'SUBS')
+        stream_item['data'][0]['content'] = [
+            {'key': 'GOOG', 'delayed': False, '1': 100.0, '2': 100.5},
+            {'key': 'MSFT', 'delayed': False, '3': 200.0}]
+        socket.recv.side_effect = [json.dumps(stream_item)]
+
+        typed_handler = Mock()
+        dict_handler = Mock()
+        self.client.add_level_one_equity_handler(typed_handler, typed=True)
+        self.client.add_level_one_equity_handler(dict_handler)
+        await self.client.handle_message()
+
+        msg = typed_handler.call_args[0][0]
+        self.assertEqual(msg['service'], 'QUOTE')
+        goog, msft = msg['content']
+        self.assertIsInstance(goog, tda.streaming.StreamRow)
+        self.assertEqual(goog.key, 'GOOG')
+        self.assertEqual(goog.BID_PRICE, 100.0)
+        self.assertEqual(goog.ASK_PRICE, 100.5)
+        self.assertIs(goog.LAST_PRICE, tda.streaming.MISSING)
+        self.assertFalse(goog.LAST_PRICE)
+        self.assertEqual(msft.LAST_PRICE, 200.0)
+        self.assertEqual(goog.to_dict(), {
+            'key': 'GOOG', 'delayed': False,
+            'BID_PRICE': 100.0, 'ASK_PRICE': 100.5})
+
+        # Handlers without typed rows are unaffected
+        self.assertEqual(dict_handler.call_args[0][0]['content'][0], {
+            'key': 'GOOG', 'delayed': False,
+            'BID_PRICE': 100.0, 'ASK_PRICE': 100.5})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_chart_and_timesale_typed_handlers(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        chart_item = self.streaming_entry('CHART_EQUITY', 'SUBS')
+        chart_item['data'][0]['content'] = [
+            {'seq': 1, 'key': 'GOOG', '1': 10.0, '4': 12.0, '7': 1590598380000}]
+        timesale_item = self.streaming_entry('TIMESALE_EQUITY', 'SUBS')
+        timesale_item['data'][0]['content'] = [
+            {'seq': 2, 'key': 'GOOG', '1': 1590598398836, '2': 11.5, '3': 100}]
+        socket.recv.side_effect = [
+            json.dumps(chart_item), json.dumps(timesale_item)]
+
+        chart_handler = Mock()
+        timesale_handler = Mock()
+        self.client.add_chart_equity_handler(chart_handler, typed=True)
+        self.client.add_timesale_equity_handler(timesale_handler, typed=True)
+        await self.client.handle_message()
+        await self.client.handle_message()
+
+        bar = chart_handler.call_args[0][0]['content'][0]
+        self.assertEqual((bar.seq, bar.key, bar.OPEN_PRICE, bar.CLOSE_PRICE),
+                         (1, 'GOOG', 10.0, 12.0))
+        self.assertEqual(bar.CHART_TIME, 1590598380000)
+
+        trade = timesale_handler.call_args[0][0]['content'][0]
+        self.assertEqual((trade.LAST_PRICE, trade.LAST_SIZE), (11.5, 100))
+
+    def test_typed_handler_incompatible_options(self):
+        with self.assertRaisesRegex(ValueError, 'cannot be columnar'):
+            self.client.add_level_one_equity_handler(
+                Mock(), typed=True, conflate=True)
+        with self.assertRaisesRegex(ValueError, 'cannot be conflated'):
+            self.client.add_chart_equity_handler(
+                Mock(), typed=True, conflate=True)
+
+    def test_row_class(self):
+        row_class = StreamClient.LevelOneEquityFields.row_class()
+        self.assertIs(row_class, StreamClient.LevelOneEquityFields.row_class())
+        self.assertEqual(row_class.__name__, 'LevelOneEquityRow')
+
+        row = row_class.from_content(
+            {'key': 'GOOG', '1': 100.0, 'unknown': 'value'})
+        self.assertFalse(hasattr(row, '__dict__'))
+        self.assertEqual(row.extra, {'unknown': 'value'})
+        self.assertEqual(
+            repr(row),
+            "LevelOneEquityRow(key='GOOG', extra={'unknown': 'value'}, " +
+            "BID_PRICE=100.0)")
+        with self.assertRaises(AttributeError):
+            row.NOT_A_FIELD
+
+        self.assertEqual(row, row_class.from_content(
+            {'key': 'GOOG', '1': 100.0, 'unknown': 'value'}))
+        self.assertNotEqual(row, row_class.from_content({'key': 'GOOG'}))
+
+        # Rows can be sent to process pools
+        unpickled = pickle.loads(pickle.dumps(row))
+        self.assertEqual(unpickled, row)
+        self.assertIs(pickle.loads(pickle.dumps(tda.streaming.MISSING)),
+                      tda.streaming.MISSING)
+
+    ###########################################################################
+    # Conflation
+
+    def blocking_handler(self):
+        '''
+        Returns an async handler which records its messages and blocks until
+        the returned event is set, along with the list of messages.
+        '''
+        release = asyncio.Event()
+        calls = []
+        async def handler(msg):
+            calls.append(msg)
+            await release.wait()
+        return handler, release, calls
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_conflation_merges_level_one_updates(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        handler, release, calls = self.blocking_handler()
+        self.client.add_level_one_equity_handler(handler, conflate=True)
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('QUOTE', 'SUBS', [
+                {'key': 'GOOG', '1': 100.0}])),
+            json.dumps(self.streaming_entry('QUOTE', 'SUBS', [
+                {'key': 'GOOG', '1': 101.0, '2': 101.5},
+                {'key': 'MSFT', '1': 200.0}])),
+            json.dumps(self.streaming_entry('QUOTE', 'SUBS', [
+                {'key': 'GOOG', '1': 102.0}])),
+        ]
+        for _ in range(3):
+            await self.client.handle_message()
+        await self.wait_for(lambda: len(calls) == 1)
+
+        release.set()
+        await self.client.wait_for_handlers()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(calls[0]['content'], [
+            {'key': 'GOOG', 'BID_PRICE': 100.0}])
+        self.assertEqual(calls[1]['content'], [
+            {'key': 'GOOG', 'BID_PRICE': 102.0, 'ASK_PRICE': 101.5},
+            {'key': 'MSFT', 'BID_PRICE': 200.0}])
+        self.assertEqual(self.client.conflation_counts(), {
+            'QUOTE': {'conflated': 1, 'dropped': 0}})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_conflation_keeps_latest_chart_bar(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        handler, release, calls = self.blocking_handler()
+        self.client.add_chart_equity_handler(handler, conflate=True)
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('CHART_EQUITY', 'SUBS', [
+                {'key': 'GOOG', '7': chart_time}]))
+            for chart_time in range(1, 5)]
+        for _ in range(4):
+            await self.client.handle_message()
+        await self.wait_for(lambda: len(calls) == 1)
+
+        release.set()
+        await self.client.wait_for_handlers()
+
+        self.assertEqual(len(calls), 2)
+        self.assertEqual(
+            calls[1]['content'], [{'key': 'GOOG', 'CHART_TIME': 4}])
+        self.assertEqual(self.client.conflation_counts(), {
+            'CHART_EQUITY': {'conflated': 0, 'dropped': 2}})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_conflation_does_not_modify_shared_messages(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        handler, release, calls = self.blocking_handler()
+        self.client.add_level_one_equity_handler(handler, conflate=True)
+        plain_handler = Mock()
+        self.client.add_level_one_equity_handler(plain_handler)
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('QUOTE', 'SUBS', [
+                {'key': 'GOOG', '1': price}]))
+            for price in (100.0, 101.0, 102.0)]
+        for _ in range(3):
+            await self.client.handle_message()
+
+        release.set()
+        await self.client.wait_for_handlers()
+
+        self.assertEqual(
+            [c[0][0]['content'] for c in plain_handler.call_args_list],
+            [[{'key': 'GOOG', 'BID_PRICE': price}]
+             for price in (100.0, 101.0, 102.0)])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_conflation_sync_handler_sees_every_update(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        handler = Mock()
+        self.client.add_level_one_equity_handler(handler, conflate=True)
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('QUOTE', 'SUBS', [
+                {'key': 'GOOG', '1': price}]))
+            for price in (100.0, 101.0)]
+        for _ in range(2):
+            await self.client.handle_message()
+
+        self.assertEqual(handler.call_count, 2)
+        self.assertEqual(self.client.conflation_counts(), {
+            'QUOTE': {'conflated': 0, 'dropped': 0}})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_conflation_failed_call_keeps_held_updates(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        release = asyncio.Event()
+        calls = []
+        async def handler(msg):
+            calls.append(msg)
+            if len(calls) == 1:
+                await release.wait()
+                raise ValueError('handler failed')
+        self.client.add_level_one_equity_handler(handler, conflate=True)
+        exceptions = []
+        self.client.set_handler_exception_callback(exceptions.append)
+
+        socket.recv.side_effect = [
+            json.dumps(self.streaming_entry('QUOTE', 'SUBS', [
+                {'key': 'GOOG', '1': 100.0}])),
+            json.dumps(self.streaming_entry('QUOTE', 'SUBS', [
+                {'key': 'GOOG', '2': 100.5}])),
+            json.dumps(self.streaming_entry('QUOTE', 'SUBS', [
+                {'key': 'GOOG', '1': 101.0}])),
+        ]
+        await self.client.handle_message()
+        await self.client.handle_message()
+        await self.wait_for(lambda: len(calls) == 1)
+
+        release.set()
+        await self.client.wait_for_handlers()
+        self.assertEqual(len(exceptions), 1)
+        self.assertEqual(len(calls), 1)
+
+        await self.client.handle_message()
+        await self.client.wait_for_handlers()
+        self.assertEqual(calls[1]['content'], [
+            {'key': 'GOOG', 'ASK_PRICE': 100.5, 'BID_PRICE': 101.0}])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_conflation_in_background_dispatch(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        queue = self.queue_backed_recv(socket)
+
+        handler, release, calls = self.blocking_handler()
+        self.client.add_level_one_equity_handler(handler, conflate=True)
+        plain_handler = Mock()
+        self.client.add_level_one_equity_handler(plain_handler)
+
+        await self.client.start_background_dispatch()
+        for price in (100.0, 101.0, 102.0):
+            queue.put_nowait(json.dumps(self.streaming_entry(
+                'QUOTE', 'SUBS', [{'key': 'GOOG', '1': price}])))
+
+        # The dispatcher keeps going while the conflating handler is busy
+        await self.wait_for(lambda: plain_handler.call_count == 3)
+        self.assertEqual(len(calls), 1)
+
+        release.set()
+        await self.wait_for(lambda: len(calls) == 2)
+        self.assertEqual(calls[1]['content'], [
+            {'key': 'GOOG', 'BID_PRICE': 102.0}])
+
+        await self.client.stop_background_dispatch()
+        await self.client.wait_for_handlers()
+
+    @no_duplicates
+    def test_conflation_not_supported_for_columnar(self):
+        with self.assertRaisesRegex(ValueError, 'cannot be conflated'):
+            self.client.add_level_one_equity_handler(
+                Mock(), columnar=True, conflate=True)
+
+    ###########################################################################
+    # Batching
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_batch_sends_single_message(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [json.dumps({'response': [
+            self.success_response(1, 'ADMIN', 'QOS')['response'][0],
+            self.success_response(2, 'QUOTE', 'SUBS')['response'][0],
+            self.success_response(3, 'CHART_EQUITY', 'UNSUBS')['response'][0],
+        ]})]
+
+        async with self.client.batch():
+            await self.client.quality_of_service(
+                StreamClient.QOSLevel.EXPRESS)
+            await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+            await self.client.chart_equity_unsubs(['GOOG'])
+            socket.send.assert_not_awaited()
+
+        socket.send.assert_awaited_once()
+        requests = json.loads(socket.send.call_args[0][0])['requests']
+        self.assertEqual(
+            [(r['requestid'], r['service'], r['command']) for r in requests],
+            [('1', 'ADMIN', 'QOS'),
+             ('2', 'QUOTE', 'SUBS'),
+             ('3', 'CHART_EQUITY', 'UNSUBS')])
+
+        self.assertEqual(self.client._qos_level, '0')
+        self.assertEqual(
+            list(self.client._subscriptions['QUOTE']['keys']),
+            ['GOOG', 'MSFT'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_batch_responses_in_separate_messages(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        stream_item = self.streaming_entry('CHART_EQUITY', 'SUBS')
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(2, 'CHART_EQUITY', 'SUBS')),
+            json.dumps(stream_item),
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+
+        async with self.client.batch():
+            await self.client.level_one_equity_subs(['GOOG'])
+            await self.client.chart_equity_subs(['GOOG'])
+
+        handler = Mock()
+        self.client.add_chart_equity_handler(handler)
+        await self.client.handle_message()
+        handler.assert_called_once_with(stream_item['data'][0])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_batch_partial_failure(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        failed_response = self.success_response(1, 'QUOTE', 'SUBS')
+        failed_response['response'][0]['content']['code'] = 21
+        socket.recv.side_effect = [json.dumps({'response': [
+            failed_response['response'][0],
+            self.success_response(2, 'CHART_EQUITY', 'SUBS')['response'][0],
+        ]})]
+
+        with self.assertRaises(tda.streaming.UnexpectedResponseCode):
+            async with self.client.batch():
+                await self.client.level_one_equity_subs(['GOOG'])
+                await self.client.chart_equity_subs(['MSFT'])
+
+        self.assertNotIn('QUOTE', self.client._subscriptions)
+        self.assertIn('CHART_EQUITY', self.client._subscriptions)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_batch_not_sent_on_exception(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        with self.assertRaisesRegex(ValueError, 'in batch'):
+            async with self.client.batch():
+                await self.client.level_one_equity_subs(['GOOG'])
+                raise ValueError('in batch')
+
+        socket.send.assert_not_awaited()
+        self.assertIsNone(self.client._batch)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_batch_empty_and_nested(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        async with self.client.batch():
+            with self.assertRaisesRegex(ValueError, 'nested'):
+                async with self.client.batch():
+                    pass
+
+        socket.send.assert_not_awaited()
+
+    ###########################################################################
+    # Subscription management
+
+    def batch_success_response(self, *requests):
+        return json.dumps({'response': [
+            self.success_response(request_id, service, command)['response'][0]
+            for request_id, service, command in requests]})
+
+    def sent_requests(self, socket):
+        requests = json.loads(socket.send.call_args[0][0])['requests']
+        return [(r['command'], r['parameters']['keys'],
+                 r['parameters'].get('fields')) for r in requests]
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_initial(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            self.batch_success_response((1, 'QUOTE', 'SUBS'))]
+        await self.client.update_subscriptions(
+            'QUOTE', ['GOOG', 'MSFT'],
+            fields=[StreamClient.LevelOneEquityFields.BID_PRICE])
+
+        self.assertEqual(self.sent_requests(socket),
+                         [('SUBS', 'GOOG,MSFT', '0,1')])
+        self.assertEqual(self.client.active_subscriptions(), {
+            'QUOTE': {'keys': ['GOOG', 'MSFT'], 'fields': [0, 1]}})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_all_fields_by_default(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            self.batch_success_response((1, 'TIMESALE_EQUITY', 'SUBS'))]
+        await self.client.update_subscriptions('TIMESALE_EQUITY', ['GOOG'])
+
+        self.assertEqual(self.sent_requests(socket),
+                         [('SUBS', 'GOOG', '0,1,2,3,4')])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_add_and_unsubs(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'CHART_EQUITY', 'SUBS'))]
+        await self.client.chart_equity_subs(['GOOG', 'MSFT', 'AAPL'])
+
+        socket.reset_mock()
+        socket.recv.side_effect = [self.batch_success_response(
+            (2, 'CHART_EQUITY', 'UNSUBS'),
+            (3, 'CHART_EQUITY', 'ADD'),
+            (4, 'CHART_EQUITY', 'ADD'))]
+        await self.client.update_subscriptions(
+            'CHART_EQUITY', ['GOOG', 'AAPL', 'IBM', 'INTC', 'AMD'],
+            max_keys_per_request=2)
+
+        socket.send.assert_awaited_once()
+        self.assertEqual(self.sent_requests(socket), [
+            ('UNSUBS', 'MSFT', None),
+            ('ADD', 'IBM,INTC', '0,1,2,3,4,5,6,7,8'),
+            ('ADD', 'AMD', '0,1,2,3,4,5,6,7,8')])
+        self.assertEqual(
+            self.client.active_subscriptions()['CHART_EQUITY']['keys'],
+            ['GOOG', 'AAPL', 'IBM', 'INTC', 'AMD'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_initial_chunks_with_add(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [self.batch_success_response(
+            (1, 'CHART_EQUITY', 'SUBS'), (2, 'CHART_EQUITY', 'ADD'))]
+        await self.client.update_subscriptions(
+            'CHART_EQUITY', ['GOOG', 'MSFT', 'AAPL'], max_keys_per_request=2)
+
+        self.assertEqual(
+            [command for command, _, _ in self.sent_requests(socket)],
+            ['SUBS', 'ADD'])
+        self.assertEqual(
+            self.client.active_subscriptions()['CHART_EQUITY']['keys'],
+            ['GOOG', 'MSFT', 'AAPL'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_adds_one_quote(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(
+            ['GOOG', 'MSFT', 'AAPL'],
+            fields=[StreamClient.LevelOneEquityFields.BID_PRICE])
+
+        socket.reset_mock()
+        socket.recv.side_effect = [
+            self.batch_success_response((2, 'QUOTE', 'ADD'))]
+        await self.client.update_subscriptions(
+            'QUOTE', ['GOOG', 'MSFT', 'AAPL', 'IBM'])
+
+        # Only the new symbol is sent, keeping the active fields
+        self.assertEqual(self.sent_requests(socket), [('ADD', 'IBM', '0,1')])
+        self.assertEqual(
+            self.client.active_subscriptions()['QUOTE']['keys'],
+            ['GOOG', 'MSFT', 'AAPL', 'IBM'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_resubscribe_is_chunked(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+
+        socket.reset_mock()
+        socket.recv.side_effect = [self.batch_success_response(
+            (2, 'QUOTE', 'SUBS'), (3, 'QUOTE', 'ADD'))]
+        await self.client.update_subscriptions(
+            'QUOTE', ['GOOG', 'MSFT', 'AAPL'],
+            fields=[StreamClient.LevelOneEquityFields.BID_PRICE],
+            max_keys_per_request=2)
+
+        self.assertEqual(self.sent_requests(socket), [
+            ('SUBS', 'GOOG,MSFT', '0,1'), ('ADD', 'AAPL', '0,1')])
+        self.assertEqual(self.client.active_subscriptions()['QUOTE'], {
+            'keys': ['GOOG', 'MSFT', 'AAPL'], 'fields': [0, 1]})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_removal_only(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT', 'AAPL'])
+
+        socket.reset_mock()
+        socket.recv.side_effect = [
+            self.batch_success_response((2, 'QUOTE', 'UNSUBS'))]
+        await self.client.update_subscriptions('QUOTE', ['MSFT'])
+
+        self.assertEqual(self.sent_requests(socket),
+                         [('UNSUBS', 'GOOG,AAPL', None)])
+        self.assertEqual(
+            self.client.active_subscriptions()['QUOTE']['keys'], ['MSFT'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_field_change(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'CHART_EQUITY', 'SUBS'))]
+        await self.client.chart_equity_subs(['GOOG', 'MSFT'])
+
+        socket.reset_mock()
+        socket.recv.side_effect = [
+            self.batch_success_response((2, 'CHART_EQUITY', 'SUBS'))]
+        await self.client.update_subscriptions(
+            'CHART_EQUITY', ['GOOG', 'MSFT'],
+            fields=[StreamClient.ChartEquityFields.CLOSE_PRICE])
+
+        self.assertEqual(self.sent_requests(socket),
+                         [('SUBS', 'GOOG,MSFT', '0,4')])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_unchanged(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+
+        socket.reset_mock()
+        await self.client.update_subscriptions('QUOTE', ['MSFT', 'GOOG'])
+        socket.send.assert_not_awaited()
+
+        # Nothing to unsubscribe from
+        await self.client.update_subscriptions('OPTION', [])
+        socket.send.assert_not_awaited()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_unsubscribe_all(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT', 'AAPL'])
+
+        socket.reset_mock()
+        socket.recv.side_effect = [self.batch_success_response(
+            (2, 'QUOTE', 'UNSUBS'), (3, 'QUOTE', 'UNSUBS'))]
+        await self.client.update_subscriptions(
+            'QUOTE', [], max_keys_per_request=2)
+
+        self.assertEqual(self.sent_requests(socket), [
+            ('UNSUBS', 'GOOG,MSFT', None), ('UNSUBS', 'AAPL', None)])
+        self.assertEqual(self.client.active_subscriptions(), {})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_in_batch(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [self.batch_success_response(
+            (1, 'ADMIN', 'QOS'), (2, 'QUOTE', 'SUBS'))]
+        async with self.client.batch():
+            await self.client.quality_of_service(
+                StreamClient.QOSLevel.EXPRESS)
+            await self.client.update_subscriptions('QUOTE', ['GOOG'])
+            socket.send.assert_not_awaited()
+
+        socket.send.assert_awaited_once()
+        self.assertEqual(
+            self.client.active_subscriptions()['QUOTE']['keys'], ['GOOG'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_invalid_arguments(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        with self.assertRaisesRegex(ValueError, 'unsupported service'):
+            await self.client.update_subscriptions('ACCT_ACTIVITY', ['GOOG'])
+        with self.assertRaisesRegex(ValueError, 'must be positive'):
+            await self.client.update_subscriptions(
+                'QUOTE', ['GOOG'], max_keys_per_request=0)
+        socket.send.assert_not_awaited()
+
+    ###########################################################################
+    # Handler fields
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_subs_uses_union_of_handler_fields(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        self.client.add_level_one_equity_handler(Mock(), fields=[
+            StreamClient.LevelOneEquityFields.BID_PRICE,
+            StreamClient.LevelOneEquityFields.ASK_PRICE])
+        self.client.add_level_one_equity_handler(Mock(), fields=[
+            StreamClient.LevelOneEquityFields.LAST_PRICE,
+            StreamClient.LevelOneEquityFields.BID_PRICE])
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+
+        request = self.request_from_socket_mock(socket)
+        self.assertEqual(request['parameters']['fields'], '0,1,2,3')
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_subs_all_fields_if_any_handler_undeclared(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        self.client.add_timesale_equity_handler(Mock(), fields=[
+            StreamClient.TimesaleFields.LAST_PRICE])
+        self.client.add_timesale_equity_handler(Mock())
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'TIMESALE_EQUITY', 'SUBS'))]
+        await self.client.timesale_equity_subs(['GOOG'])
+
+        request = self.request_from_socket_mock(socket)
+        self.assertEqual(request['parameters']['fields'], '0,1,2,3,4')
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_subs_explicit_fields_override_handler_fields(
+            self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        self.client.add_level_one_equity_handler(Mock(), fields=[
+            StreamClient.LevelOneEquityFields.BID_PRICE])
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG'], fields=[
+            StreamClient.LevelOneEquityFields.ASK_PRICE])
+
+        request = self.request_from_socket_mock(socket)
+        self.assertEqual(request['parameters']['fields'], '0,2')
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_handler_fields_wrong_type(self, ws_connect):
+        with self.assertRaises(ValueError):
+            self.client.add_level_one_option_handler(Mock(), fields=[
+                StreamClient.LevelOneEquityFields.BID_PRICE])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscription_fields(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        self.client.add_level_one_equity_handler(Mock(), fields=[
+            StreamClient.LevelOneEquityFields.BID_PRICE])
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS')),
+            json.dumps(self.success_response(2, 'CHART_EQUITY', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT'])
+        await self.client.chart_equity_subs(['GOOG'])
+
+        # Unchanged fields are not resubscribed
+        socket.reset_mock()
+        await self.client.update_subscription_fields()
+        socket.send.assert_not_awaited()
+
+        self.client.add_level_one_equity_handler(Mock(), fields=[
+            StreamClient.LevelOneEquityFields.ASK_PRICE])
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(3, 'QUOTE', 'SUBS'))]
+        await self.client.update_subscription_fields()
+
+        self.assertEqual(self.sent_requests(socket),
+                         [('SUBS', 'GOOG,MSFT', '0,1,2')])
+        self.assertEqual(self.client.active_subscriptions()['QUOTE'],
+                         {'keys': ['GOOG', 'MSFT'], 'fields': [0, 1, 2]})
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscription_fields_is_chunked(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT', 'AAPL'])
+
+        self.client.add_level_one_equity_handler(Mock(), fields=[
+            StreamClient.LevelOneEquityFields.BID_PRICE])
+        socket.reset_mock()
+        socket.recv.side_effect = [self.batch_success_response(
+            (2, 'QUOTE', 'SUBS'), (3, 'QUOTE', 'ADD'))]
+        await self.client.update_subscription_fields(max_keys_per_request=2)
+
+        self.assertEqual(self.sent_requests(socket), [
+            ('SUBS', 'GOOG,MSFT', '0,1'), ('ADD', 'AAPL', '0,1')])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_update_subscriptions_uses_handler_fields(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG'])
+
+        self.client.add_level_one_equity_handler(Mock(), fields=[
+            StreamClient.LevelOneEquityFields.BID_PRICE])
+        socket.reset_mock()
+        socket.recv.side_effect = [
+            self.batch_success_response((2, 'QUOTE', 'SUBS'))]
+        await self.client.update_subscriptions('QUOTE', ['GOOG'])
+
+        self.assertEqual(self.sent_requests(socket),
+                         [('SUBS', 'GOOG', '0,1')])
+
+    ###########################################################################
+    # Reconnecting
+
+    def connection_closed(self):
+        return websockets.exceptions.ConnectionClosedError(None, None)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_disabled_by_default(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        socket.recv.side_effect = [self.connection_closed()]
+
+        with self.assertRaises(websockets.exceptions.ConnectionClosed):
+            await self.client.handle_message()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_replays_subscriptions(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_auto_reconnect()
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'ADMIN', 'QOS')),
+            json.dumps(self.success_response(2, 'QUOTE', 'SUBS')),
+            json.dumps(self.success_response(3, 'CHART_EQUITY', 'SUBS')),
+            json.dumps(self.success_response(4, 'CHART_EQUITY', 'ADD')),
+            json.dumps(self.success_response(5, 'CHART_EQUITY', 'UNSUBS')),
+            json.dumps(self.success_response(6, 'NASDAQ_BOOK', 'SUBS')),
+            json.dumps(self.success_response(7, 'NASDAQ_BOOK', 'UNSUBS')),
+            self.connection_closed()]
+
+        await self.client.quality_of_service(StreamClient.QOSLevel.EXPRESS)
+        await self.client.level_one_equity_subs(['GOOG', 'MSFT'], fields=[
+            StreamClient.LevelOneEquityFields.SYMBOL,
+            StreamClient.LevelOneEquityFields.BID_PRICE])
+        await self.client.chart_equity_subs(['GOOG', 'MSFT'])
+        await self.client.chart_equity_add(['INTC'])
+        await self.client.chart_equity_unsubs(['MSFT'])
+        await self.client.nasdaq_book_subs(['GOOG'])
+        await self.client.nasdaq_book_unsubs(['GOOG'])
+
+        new_socket = AsyncMagicMock()
+        ws_connect.return_value = new_socket
+        stream_item = self.streaming_entry('QUOTE', 'SUBS')
+        new_socket.recv.side_effect = [
+            json.dumps(self.success_response(8, 'ADMIN', 'LOGIN')),
+            json.dumps({'response': [
+                self.success_response(9, 'ADMIN', 'QOS')['response'][0],
+                self.success_response(10, 'QUOTE', 'SUBS')['response'][0]]}),
+            json.dumps(stream_item),
+            json.dumps(self.success_response(
+                11, 'CHART_EQUITY', 'SUBS')),
+            json.dumps(stream_item)]
+
+        handler = Mock()
+        self.client.add_level_one_equity_handler(handler)
+
+        await self.client.handle_message()
+        socket.close.assert_awaited_once()
+        self.assertEqual(self.http_client.get_user_principals.call_count, 2)
+
+        self.assertEqual(len(new_socket.send.call_args_list), 2)
+        login = json.loads(new_socket.send.call_args_list[0][0][0])
+        self.assertEqual(login['requests'][0]['command'], 'LOGIN')
+
+        replay = json.loads(new_socket.send.call_args_list[1][0][0])
+        self.assertEqual(replay['requests'], [{
+            'account': '1001',
+            'service': 'ADMIN',
+            'command': 'QOS',
+            'requestid': '9',
+            'source': 'streamerInfo-appId',
+            'parameters': {'qoslevel': '0'}
+        }, {
+            'account': '1001',
+            'service': 'QUOTE',
+            'command': 'SUBS',
+            'requestid': '10',
+            'source': 'streamerInfo-appId',
+            'parameters': {'keys': 'GOOG,MSFT', 'fields': '0,1'}
+        }, {
+            'account': '1001',
+            'service': 'CHART_EQUITY',
+            'command': 'SUBS',
+            'requestid': '11',
+            'source': 'streamerInfo-appId',
+            'parameters': {
+                'keys': 'GOOG,INTC', 'fields': '0,1,2,3,4,5,6,7,8'}
+        }])
+
+        # Data received during the replay is delivered afterwards
+        await self.client.handle_message()
+        await self.client.handle_message()
+        self.assertEqual(handler.call_count, 2)
+
+        metrics = self.client.reconnect_metrics()
+        self.assertEqual(metrics['reconnects'], 1)
+        self.assertEqual(metrics['failed_attempts'], 0)
+        self.assertGreaterEqual(metrics['last_reconnect_seconds'], 0)
+        self.assertEqual(metrics['total_reconnect_seconds'],
+                         metrics['last_reconnect_seconds'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_reuses_valid_principals(self, ws_connect):
+        principals = account_principals()
+        principals['tokenExpirationTime'] = (
+            datetime.datetime.now(datetime.timezone.utc) +
+            datetime.timedelta(hours=1)).strftime('%Y-%m-%dT%H:%M:%S%z')
+        self.http_client.get_user_principals.return_value = MockResponse(
+            principals, 200)
+
+        socket = AsyncMagicMock()
+        ws_connect.return_value = socket
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(0, 'ADMIN', 'LOGIN')),
+            self.connection_closed()]
+        await self.client.login()
+        self.client.enable_auto_reconnect()
+
+        new_socket = AsyncMagicMock()
+        ws_connect.return_value = new_socket
+        new_socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'ADMIN', 'LOGIN'))]
+
+        await self.client.handle_message()
+        self.http_client.get_user_principals.assert_called_once()
+
+        # Nothing was subscribed, so nothing is replayed
+        new_socket.send.assert_awaited_once()
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_retries_with_backoff(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_auto_reconnect(
+            max_attempts=3, initial_delay_seconds=0.001)
+        socket.recv.side_effect = [self.connection_closed()]
+
+        new_socket = AsyncMagicMock()
+        new_socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'ADMIN', 'LOGIN'))]
+        ws_connect.side_effect = [
+            OSError('connection refused'),
+            OSError('connection refused'),
+            new_socket]
+
+        await self.client.handle_message()
+
+        self.assertEqual(ws_connect.await_count, 4)
+        metrics = self.client.reconnect_metrics()
+        self.assertEqual(metrics['reconnects'], 1)
+        self.assertEqual(metrics['failed_attempts'], 2)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_gives_up(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_auto_reconnect(
+            max_attempts=2, initial_delay_seconds=0.001)
+        socket.recv.side_effect = [self.connection_closed()]
+        ws_connect.side_effect = OSError('connection refused')
+
+        with self.assertRaisesRegex(OSError, 'connection refused'):
+            await self.client.handle_message()
+        self.assertEqual(self.client.reconnect_metrics()['failed_attempts'], 2)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_retries_principals_failure(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_auto_reconnect(
+            max_attempts=10, initial_delay_seconds=0.001)
+        socket.recv.side_effect = [self.connection_closed()]
+
+        principals = account_principals()
+        self.http_client.get_user_principals.side_effect = [
+            MockResponse(principals, 200),
+            httpx.ConnectError('connection refused'),
+            MockResponse(principals, 200)]
+
+        new_socket = AsyncMagicMock()
+        new_socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'ADMIN', 'LOGIN'))]
+        ws_connect.side_effect = [OSError('connection refused'), new_socket]
+
+        await self.client.handle_message()
+
+        metrics = self.client.reconnect_metrics()
+        self.assertEqual(metrics['reconnects'], 1)
+        self.assertEqual(metrics['failed_attempts'], 2)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_retries_principals_bad_status(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_auto_reconnect(
+            max_attempts=2, initial_delay_seconds=0.001)
+        socket.recv.side_effect = [self.connection_closed()]
+        self.http_client.get_user_principals.return_value = MockResponse(
+            {}, 500)
+
+        with self.assertRaises(tda.streaming.UnexpectedResponseCode):
+            await self.client.handle_message()
+        self.assertEqual(self.client.reconnect_metrics()['failed_attempts'], 2)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_fails_concurrent_command(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_auto_reconnect()
+        queue = self.queue_backed_recv(socket)
+
+        new_socket = AsyncMagicMock()
+        ws_connect.return_value = new_socket
+        new_socket.recv.side_effect = [
+            json.dumps(self.success_response(2, 'ADMIN', 'LOGIN'))]
+
+        # Wait for handle_message() to start reading before sending the
+        # command, so the command waits for the read to finish
+        reader = asyncio.ensure_future(self.client.handle_message())
+        await asyncio.sleep(0)
+        subs = asyncio.ensure_future(
+            self.client.level_one_equity_subs(['GOOG']))
+        await self.wait_for(lambda: socket.send.await_count == 1)
+
+        queue.put_nowait(self.connection_closed())
+        await reader
+
+        with self.assertRaises(websockets.exceptions.ConnectionClosed):
+            await subs
+        self.assertEqual(self.client.reconnect_metrics()['reconnects'], 1)
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_reconnect_during_background_dispatch(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+        self.client.enable_auto_reconnect()
+
+        socket.recv.side_effect = [
+            json.dumps(self.success_response(1, 'QUOTE', 'SUBS'))]
+        await self.client.level_one_equity_subs(['GOOG'])
+
+        new_socket = AsyncMagicMock()
+        ws_connect.return_value = new_socket
+        queue = self.queue_backed_recv(new_socket)
+        queue.put_nowait(json.dumps(self.success_response(2, 'ADMIN', 'LOGIN')))
+        queue.put_nowait(json.dumps(self.success_response(3, 'QUOTE', 'SUBS')))
+
+        handler = Mock()
+        self.client.add_level_one_equity_handler(handler)
+
+        socket.recv.side_effect = [self.connection_closed()]
+        await self.client.start_background_dispatch()
+
+        await self.wait_for(
+            lambda: self.client.reconnect_metrics()['reconnects'] == 1)
+        queue.put_nowait(json.dumps(self.streaming_entry('QUOTE', 'SUBS')))
+        await self.wait_for(lambda: handler.call_count == 1)
+
+        await self.client.stop_background_dispatch()
+
+    ###########################################################################
+    # Private member _service_op
+    #
+    # Note: https://developer.tdameritrade.com/content/streaming-data#_Toc504640564
+    # parameters are optional and in the case of UNSUBS commands,
+    # fields should not be required since unsubscribing from a service
+    # will return no data on the service or symbol
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_service_op_sends_some_fields_with_field_type_and_fields(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [json.dumps(self.success_response(
+            1, 'QUOTE', 'SUBS'))]
+
+        await self.client._service_op(
+            symbols=['GOOG', 'MSFT'],
+            service='QUOTE',
+            command='SUBS',
+            field_type=StreamClient.LevelOneEquityFields,
+            fields=[
+            StreamClient.LevelOneEquityFields.CLOSE_PRICE,
+            StreamClient.LevelOneEquityFields.ASK_PRICE
+        ])
+        socket.recv.assert_awaited_once()
+        request = self.request_from_socket_mock(socket)
+
+        self.assertEqual(request, {
+            'account': '1001',
+            'service': 'QUOTE',
+            'command': 'SUBS',
+            'requestid': '1',
+            'source': 'streamerInfo-appId',
+            'parameters': {
+                'keys': 'GOOG,MSFT',
+                'fields': '2,15'
+            }
+        })
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_service_op_sends_no_fields_without_field_type(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [json.dumps(self.success_response(
+            1, 'QUOTE', 'UNSUBS'))]
+
+        await self.client._service_op(
+            ['GOOG','MSFT'],
+            'QUOTE',
+            'UNSUBS'
+        )
+        socket.recv.assert_awaited_once()
+        request = self.request_from_socket_mock(socket)
+
+        self.assertFalse('fields' in request['parameters'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_service_op_sends_no_fields_for_sub_without_field_type(self, ws_connect):
+        """
+        There's no service's sub/add commands without field_type defined but this tests for fields=None behavior if field_type=None
+        Warning: Sub commands seems to fail if there's no fields parameters,
+        check logs : https://github.com/alexgolec/tda-api/pull/256#issuecomment-950406363
+
+        The streaming client will properly throw UnexpectedResponse
+        """
+        socket = await self.login_and_get_socket(ws_connect)
+
+        resp = self.success_response(1, 'QUOTE', 'SUBS', msg="SUBS command failed")
+        resp['response'][0]['content']['code'] = 22
+        socket.recv.side_effect = [
+            json.dumps(resp)
+        ]
+
+        with self.assertRaises(tda.streaming.UnexpectedResponseCode) as e:
+            await self.client._service_op(
+                symbols=['GOOG','MSFT'],
+                service='QUOTE',
+                command='SUBS'
+            )
+        socket.recv.assert_awaited_once()
+        request = self.request_from_socket_mock(socket)
+
+        self.assertFalse('fields' in request['parameters'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_service_op_sends_no_fields_for_sub_with_fields(self, ws_connect):
+        """
+        There's no service's sub/add commands without field_type defined but this tests for fields=None behavior if field_type=None
+        Warning: Sub commands seems to fail if there's no fields parameters,
+        check logs : https://github.com/alexgolec/tda-api/pull/256#issuecomment-950406363
+
+        The streaming client will properly throw UnexpectedResponse
+        """
+        socket = await self.login_and_get_socket(ws_connect)
+
+        resp = self.success_response(1, 'QUOTE', 'SUBS', msg="SUBS command failed")
+        resp['response'][0]['content']['code'] = 22
+        socket.recv.side_effect = [
+            json.dumps(resp)
+        ]
+
+        with self.assertRaises(tda.streaming.UnexpectedResponseCode) as e:
+            await self.client._service_op(
+                symbols=['GOOG','MSFT'],
+                service='QUOTE',
+                command='SUBS',
+                fields=[
+                    StreamClient.LevelOneEquityFields.CLOSE_PRICE,
+                    StreamClient.LevelOneEquityFields.ASK_PRICE
+                ]
+            )
+        socket.recv.assert_awaited_once()
+        request = self.request_from_socket_mock(socket)
+
+        self.assertFalse('fields' in request['parameters'])
+
+    @no_duplicates
+    @asynctest.patch('tda.streaming.ws_client.connect', new_callable=asynctest.CoroutineMock)
+    async def test_service_op_sends_all_fields_with_field_type(self, ws_connect):
+        socket = await self.login_and_get_socket(ws_connect)
+
+        socket.recv.side_effect = [json.dumps(self.success_response(
+            1, 'CHART_EQUITY', 'SUBS'))]
+
+        await self.client._service_op(
+            symbols=['GOOG','MSFT'],
+            service='CHART_EQUITY',
+            command='SUBS',
+            field_type=StreamClient.ChartEquityFields
+        )
+        socket.recv.assert_awaited_once()
+        request = self.request_from_socket_mock(socket)
+
+        self.assertEqual(request, {
+            'account': '1001',
+            'service': 'CHART_EQUITY',
+            'command': 'SUBS',
+            'requestid': '1',
+            'source': 'streamerInfo-appId',
             'parameters': {
                 'keys': 'GOOG,MSFT',
                 'fields': '0,1,2,3,4,5,6,7,8'
@@ -4766,4 +6984,33 @@ class StreamClientTest(asynctest.TestCase):
                 'keys': 'GOOG,MSFT',
                 'fields': '0,1,2,3,4,5,6,7,8'
             }
-        })
\ No newline at end of file
+        })
+
+
+class FastJsonStreamDecoderTest(unittest.TestCase):
+
+    def setUp(self):
+        self.decoder = tda.streaming.FastJsonStreamDecoder()
+
+    def test_decode_string_and_bytes(self):
+        self.assertEqual(self.decoder.decode_json_string('{"a": [1, 2.5]}'),
+                         {'a': [1, 2.5]})
+        self.assertEqual(self.decoder.decode_json_bytes(b'{"a": "\xc3\xa9"}'),
+                         {'a': '\u00e9'})
+
+    def test_falls_back_for_nan(self):
+        result = self.decoder.decode_json_bytes(b'{"a": NaN}')
+        self.assertTrue(math.isnan(result['a']))
+
+    def test_invalid_json(self):
+        with self.assertRaises(json.decoder.JSONDecodeError):
+            self.decoder.decode_json_string('invalid json')
+        with self.assertRaises(json.decoder.JSONDecodeError):
+            self.decoder.decode_json_bytes(b'invalid json')
+
+    @patch('tda.streaming.orjson', None)
+    def test_without_orjson(self):
+        self.assertEqual(self.decoder.decode_json_bytes(b'{"a": 1}'),
+                         {'a': 1})
+        with self.assertRaises(json.decoder.JSONDecodeError):
+            self.decoder.decode_json_string('invalid json')
@@ -4,9 +4,13 @@ plus legacy vs. new formats, plus refresh token updating, etc. This test suite
 exercises the combinatorial explosion of possibilities.
 '''
 
-from .utils import no_duplicates, MockOAuthClient, MockAsyncOAuthClient
-from unittest.mock import patch, MagicMock
+from .utils import (
+        AsyncMagicMock, no_duplicates, MockOAuthClient, MockAsyncOAuthClient,
+        MockResponse)
+from unittest.mock import patch, ANY, AsyncMock, MagicMock
 
+import asyncio
+import asynctest
 import copy
 import json
 import os
@@ -305,7 +309,240 @@ class TokenLifecycleTest(unittest.TestCase):
         self.verify_not_updated_token()
 
 
+    # Refresh checks made before requests
+
+    def get_quote(self, client):
+        if self.asyncio():
+            client.session = AsyncMagicMock()
+            client.ensure_updated_refresh_token_async = AsyncMock()
+            asyncio.run(client.get_quote('AAPL'))
+            return client.ensure_updated_refresh_token_async
+        else:
+            client.session = MagicMock()
+            client.ensure_updated_refresh_token = MagicMock()
+            client.get_quote('AAPL')
+            return client.ensure_updated_refresh_token
+
+    @no_duplicates
+    @patch('tda.auth.OAuth2Client', new_callable=MockOAuthClient)
+    @patch('tda.auth.AsyncOAuth2Client', new_callable=MockAsyncOAuthClient)
+    @patch('time.time', MagicMock(return_value=MOCK_NOW))
+    def test_request_checks_refresh_for_old_token(
+            self, mock_AsyncOAuth2Client, mock_OAuth2Client):
+        self.write_old_metadata_token()
+        client = self.client_from_token_file()
+
+        self.get_quote(client).assert_called_once_with()
+
+    @no_duplicates
+    @patch('tda.auth.OAuth2Client', new_callable=MockOAuthClient)
+    @patch('tda.auth.AsyncOAuth2Client', new_callable=MockAsyncOAuthClient)
+    @patch('time.time', MagicMock(return_value=MOCK_NOW))
+    def test_request_skips_refresh_for_recent_token(
+            self, mock_AsyncOAuth2Client, mock_OAuth2Client):
+        self.write_recent_metadata_token()
+        client = self.client_from_token_file()
+
+        self.get_quote(client).assert_not_called()
+
+
 # Same as above, except async
 class TokenLifecycleTestAsync(TokenLifecycleTest):
     def asyncio(self):
         return True
+
+    def mock_async_oauth(self, mock_AsyncOAuth2Client):
+        mock_oauth = MagicMock()
+        mock_oauth.fetch_token = AsyncMock(return_value=self.updated_token)
+        mock_oauth.aclose = AsyncMock()
+        mock_AsyncOAuth2Client.return_value = mock_oauth
+        return mock_oauth
+
+    @no_duplicates
+    @patch('tda.auth.OAuth2Client', new_callable=MockOAuthClient)
+    @patch('tda.auth.AsyncOAuth2Client', new_callable=MockAsyncOAuthClient)
+    @patch('time.time', MagicMock(return_value=MOCK_NOW))
+    def test_async_refresh_old_token(
+            self, mock_AsyncOAuth2Client, mock_OAuth2Client):
+        self.write_old_metadata_token()
+        client = self.client_from_token_file()
+        mock_oauth = self.mock_async_oauth(mock_AsyncOAuth2Client)
+
+        self.assertTrue(
+            asyncio.run(client.ensure_updated_refresh_token_async()))
+
+        self.verify_updated_token()
+        mock_oauth.fetch_token.assert_awaited_once_with(
+            tda.auth.TOKEN_ENDPOINT,
+            grant_type='refresh_token',
+            refresh_token=ANY,
+            access_type='offline')
+        mock_oauth.aclose.assert_awaited_once_with()
+        mock_OAuth2Client.assert_not_called()
+        self.assertIsNone(client._refresh_token_update)
+
+    @no_duplicates
+    @patch('tda.auth.OAuth2Client', new_callable=MockOAuthClient)
+    @patch('tda.auth.AsyncOAuth2Client', new_callable=MockAsyncOAuthClient)
+    @patch('time.time', MagicMock(return_value=MOCK_NOW))
+    def test_async_refresh_recent_token(
+            self, mock_AsyncOAuth2Client, mock_OAuth2Client):
+        self.write_recent_metadata_token()
+        client = self.client_from_token_file()
+        mock_oauth = self.mock_async_oauth(mock_AsyncOAuth2Client)
+
+        self.assertFalse(
+            asyncio.run(client.ensure_updated_refresh_token_async()))
+
+        self.verify_not_updated_token()
+        mock_oauth.fetch_token.assert_not_awaited()
+
+    @no_duplicates
+    @patch('tda.auth.OAuth2Client', new_callable=MockOAuthClient)
+    @patch('tda.auth.AsyncOAuth2Client', new_callable=MockAsyncOAuthClient)
+    @patch('time.time', MagicMock(return_value=MOCK_NOW))
+    def test_async_refresh_single_flight(
+            self, mock_AsyncOAuth2Client, mock_OAuth2Client):
+        self.write_old_metadata_token()
+        client = self.client_from_token_file()
+        mock_oauth = self.mock_async_oauth(mock_AsyncOAuth2Client)
+
+        async def refresh_concurrently():
+            return await asyncio.gather(*[
+                client.ensure_updated_refresh_token_async()
+                for _ in range(5)])
+
+        self.assertEqual([True] * 5, asyncio.run(refresh_concurrently()))
+
+        self.verify_updated_token()
+        mock_oauth.fetch_token.assert_awaited_once()
+
+    @no_duplicates
+    @patch('tda.auth.OAuth2Client', new_callable=MockOAuthClient)
+    @patch('tda.auth.AsyncOAuth2Client', new_callable=MockAsyncOAuthClient)
+    @patch('time.time', MagicMock(return_value=MOCK_NOW))
+    def test_async_refresh_failure_propagates(
+            self, mock_AsyncOAuth2Client, mock_OAuth2Client):
+        self.write_old_metadata_token()
+        client = self.client_from_token_file()
+        mock_oauth = self.mock_async_oauth(mock_AsyncOAuth2Client)
+        mock_oauth.fetch_token.side_effect = ValueError('refresh failed')
+
+        async def refresh_concurrently():
+            return await asyncio.gather(*[
+                client.ensure_updated_refresh_token_async()
+                for _ in range(2)], return_exceptions=True)
+
+        results = asyncio.run(refresh_concurrently())
+        self.assertEqual(2, len(results))
+        for result in results:
+            self.assertIsInstance(result, ValueError)
+
+        mock_oauth.fetch_token.assert_awaited_once()
+        mock_oauth.aclose.assert_awaited_once_with()
+        self.assertIsNone(client._refresh_token_update)
+        self.assertEqual(
+            CREATION_TIMESTAMP, client.token_metadata.creation_timestamp)
+
+
+class FakeAsyncSession:
+    '''
+    Stands in for an AsyncOAuth2Client session. Refreshed sessions are created
+    by calling the class of the current one, so this can't be a mock.
+    '''
+    def __init__(self, api_key, token=None, token_endpoint=None,
+                 update_token=None):
+        self.token = token
+        self.update_token = update_token
+        self.get = AsyncMock(return_value=MockResponse({}, 200))
+
+
+class AsyncRefreshOnRequestTest(asynctest.TestCase):
+
+    def setUp(self):
+        self.old_token = {
+                'access_token': 'access_token_123',
+                'refresh_token': 'refresh_token_123',
+                'expires_at': CREATION_TIMESTAMP + 1,
+        }
+        self.updated_token = copy.deepcopy(self.old_token)
+        self.updated_token['refresh_token'] = 'refresh_token_123_updated'
+
+        self.token_write_func = MagicMock()
+
+        # Yield to the event loop while fetching, as a real fetch would, so
+        # that concurrent requests overlap with the refresh
+        async def fetch_token(*args, **kwargs):
+            await asyncio.sleep(0)
+            return self.updated_token
+
+        self.oauth = MagicMock()
+        self.oauth.fetch_token = AsyncMock(side_effect=fetch_token)
+        self.oauth.aclose = AsyncMock()
+
+    def async_oauth_client(self, api_key, **kwargs):
+        # Sessions are created with a token, while the client which fetches
+        # the refreshed token is not
+        if 'token' in kwargs:
+            return FakeAsyncSession(api_key, **kwargs)
+        return self.oauth
+
+    def client(self):
+        return tda.auth.client_from_access_functions(
+                API_KEY,
+                lambda: {
+                    'creation_timestamp': CREATION_TIMESTAMP,
+                    'token': self.old_token,
+                },
+                self.token_write_func,
+                asyncio=True)
+
+    @no_duplicates
+    @patch('tda.auth.AsyncOAuth2Client')
+    @patch('time.time', MagicMock(return_value=MOCK_NOW))
+    async def test_concurrent_requests_refresh_once(
+            self, mock_AsyncOAuth2Client):
+        mock_AsyncOAuth2Client.side_effect = self.async_oauth_client
+        client = self.client()
+        old_session = client.session
+        self.assertLess(
+            client.token_metadata.refresh_token_update_due_at, MOCK_NOW)
+
+        await asyncio.gather(client.get_quote('AAPL'), client.get_quote('MSFT'))
+
+        self.oauth.fetch_token.assert_awaited_once()
+        self.token_write_func.assert_called_once_with({
+            'creation_timestamp': MOCK_NOW,
+            'token': self.updated_token,
+        })
+
+        # Both requests were sent using the refreshed session
+        self.assertIsNot(old_session, client.session)
+        self.assertEqual(self.updated_token, client.session.token)
+        self.assertEqual(2, client.session.get.await_count)
+        old_session.get.assert_not_awaited()
+
+    @no_duplicates
+    @patch('tda.auth.AsyncOAuth2Client')
+    @patch('time.time', MagicMock(return_value=MOCK_NOW))
+    async def test_session_token_updates_are_written(
+            self, mock_AsyncOAuth2Client):
+        mock_AsyncOAuth2Client.side_effect = self.async_oauth_client
+        client = self.client()
+
+        await client.session.update_token(self.old_token)
+        self.token_write_func.assert_called_once_with({
+            'creation_timestamp': CREATION_TIMESTAMP,
+            'token': self.old_token,
+        })
+
+        await client.ensure_updated_refresh_token_async()
+        self.token_write_func.reset_mock()
+
+        # Access token refreshes made by the refreshed session are written
+        # too
+        await client.session.update_token(self.updated_token)
+        self.token_write_func.assert_called_once_with({
+            'creation_timestamp': MOCK_NOW,
+            'token': self.updated_token,
+        })
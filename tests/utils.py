@@ -81,6 +81,10 @@ class AsyncResync:
     NOTE: Every method runs on a new loop
     """
 
+    # Coroutine methods which the object awaits internally, and so must be
+    # left as they are
+    _NO_RESYNC = frozenset(('_send_request',))
+
     class _AsyncResyncMethod:
         def __init__(self, func):
             self.func = func
@@ -93,7 +97,8 @@ class AsyncResync:
 
     def __getattr__(self, attr):
         retval = super().__getattribute__(attr)
-        if inspect.iscoroutinefunction(retval):
+        if (inspect.iscoroutinefunction(retval)
+                and attr not in AsyncResync._NO_RESYNC):
             return self._AsyncResyncMethod(retval)
         return retval
     __getattribute__ = __getattr__